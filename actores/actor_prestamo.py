@@ -12,6 +12,11 @@ import signal
 import sys
 import os
 from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ga"))
+
+from ruteo import TablaRuteo   # noqa: E402  (GA particionado por book_code)
 
 # ---------- Configuración ----------
 DIRECCION_GC_PUB = "tcp://127.0.0.1:5556"
@@ -20,6 +25,7 @@ ARCHIVO_LOG = "log_actor_prestamo.txt"
 FILE_GA_ACTIVO = "gc/ga_activo.txt"
 GA_PRIMARY = "tcp://localhost:6000"
 GA_SECONDARY = "tcp://localhost:6001"
+RUTEO = TablaRuteo(GA_PRIMARY, GA_SECONDARY, FILE_GA_ACTIVO)
 REQ_TIMEOUT_MS = 5000
 
 # ---------- Inicialización ZeroMQ ----------
@@ -54,11 +60,13 @@ def leer_ga_activo():
     except Exception:
         return "primary"
 
-def ga_addr_actual():
-    return GA_PRIMARY if leer_ga_activo() == "primary" else GA_SECONDARY
+def ga_addr_actual(book_code=None):
+    # GA activo de la partición del libro (gc/ga_shards.json); sin tabla,
+    # GA_PRIMARY/GA_SECONDARY según FILE_GA_ACTIVO
+    return RUTEO.direccion(book_code)
 
 def contactar_ga(payload: dict):
-    addr = ga_addr_actual()
+    addr = ga_addr_actual(payload.get("book_code"))
     sock = None
     try:
         sock = contexto.socket(zmq.REQ)
@@ -156,6 +164,7 @@ while EJECUTANDO:
                 "recv_ts": datos.get("recv_ts"),
                 "published_ts": datos.get("published_ts"),
                 "origen": "actor_prestamo",
+                "request_id": datos.get("request_id"),   # idempotencia en el GA
                 "procesado_ts": iso(),
             }
 
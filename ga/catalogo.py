@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# archivo: ga/catalogo.py
+#
+# Modelo compacto en memoria del catálogo del GA.
+#
+# Con un dict por libro y un dict por préstamo, cada registro cuesta cientos
+# de bytes solo en cabeceras de dict. Catalogo guarda lo mismo en columnas:
+#   - por libro: código y título internados (sys.intern) en listas,
+#     available y el primer préstamo en array('i');
+#   - préstamos: tabla aparte en arrays (usuario internado, vencimiento en
+#     epoch us, renovaciones, flags) encadenada por libro, con lista libre
+#     para reutilizar las filas de préstamos devueltos.
+# Los registros con otra forma (claves extra, tipos inesperados) se guardan
+# tal cual en _extra, así que el modelo no pierde información.
+#
+# Índices secundarios de los préstamos vigentes: user_id -> {book_code} y
+# vencimientos ordenados (ga/vencimientos.py), actualizados en cada put()
+# (apply_op_to_db pasa por ahí) y reconstruidos al cargar/reproducir el
+# catálogo, que también entra por put().
+#
+# Se usa como un dict {book_code: registro}: db[code] arma el registro
+# (dict) a partir de las columnas y db[code] = registro / put() lo vuelve a
+# guardar; apply_op_to_db (ga/db_ops.py) ya hace ese ida y vuelta. En disco
+# (pickles, shards) se sigue usando dict-of-dicts para las herramientas.
+
+import sys
+from array import array
+from collections.abc import MutableMapping
+
+from wal_format import iso_to_us, us_to_iso
+from vencimientos import IndiceVencimientos, vencimientos_de
+
+F_RENOVATIONS = 0x01   # préstamo con clave "renovations" (generate_db.py) en vez de "renovaciones"
+F_DUE_TEXTO = 0x02     # vencimiento no representable en epoch us: texto en _l_due_txt
+
+CLAVES_LIBRO = frozenset(("code", "title", "available", "loans"))
+CLAVES_PRESTAMO = frozenset(("due", "renovaciones"))
+CLAVES_PRESTAMO_GEN = frozenset(("due", "renovations"))
+
+def usuarios_de(record):
+    # usuarios con préstamo en un registro (cualquier forma)
+    loans = record.get("loans") if isinstance(record, dict) else None
+    if not isinstance(loans, dict):
+        return set()
+    return {u for u in loans if type(u) is str}
+
+def indexar_usuarios(indice, code, antes, despues):
+    # actualiza user_id -> {book_code} con el cambio de usuarios de un libro
+    for u in antes - despues:
+        libros = indice.get(u)
+        if libros is not None:
+            libros.discard(code)
+            if not libros:
+                del indice[u]
+    for u in despues - antes:
+        indice.setdefault(u, set()).add(code)
+
+def forma_compacta(code, record):
+    """
+    Préstamos del registro como [(user, due, renov, flags)] si el registro
+    tiene la forma estándar (code, title, available, loans); None si no.
+    También lo usa ga/sqlite_store.py para decidir entre columnas y blob.
+    """
+    if (type(record) is not dict or record.keys() != CLAVES_LIBRO or record["code"] != code
+            or type(record["title"]) is not str or type(record["available"]) is not int
+            or not -2**31 <= record["available"] < 2**31 or type(record["loans"]) is not dict):
+        return None
+    out = []
+    for user, loan in record["loans"].items():
+        if type(user) is not str or type(loan) is not dict:
+            return None
+        claves = loan.keys()
+        if claves == CLAVES_PRESTAMO:
+            renov, flags = loan["renovaciones"], 0
+        elif claves == CLAVES_PRESTAMO_GEN:
+            renov, flags = loan["renovations"], F_RENOVATIONS
+        else:
+            return None
+        due = loan["due"]
+        if type(due) is not str or type(renov) is not int or not 0 <= renov < 65536:
+            return None
+        out.append((user, due, renov, flags))
+    return out
+
+class Catalogo(MutableMapping):
+    """
+    Catálogo {book_code: registro} en columnas.
+
+    db[code]            -> registro armado como dict (copia)
+    db[code] = registro -> lo guarda en las columnas
+    put(code, reg, lsn) -> igual que db[code] = reg (misma interfaz que el
+                           motor mmap; el LSN no se guarda en memoria)
+    libros_de_usuario(u) -> book_codes con préstamo del usuario (índice)
+    indice_vencimientos() -> préstamos ordenados por vencimiento
+    resumen(code)       -> (title, available, préstamos) sin armar el registro
+    """
+
+    def __init__(self, items=None):
+        self._fila = {}                  # code -> fila
+        self._codes = []                 # fila -> code
+        self._titulos = []               # fila -> título
+        self._available = array("i")     # fila -> ejemplares disponibles
+        self._cabeza = array("i")        # fila -> primer préstamo (-1: sin préstamos)
+        self._extra = {}                 # fila -> registro con forma no compacta
+
+        # tabla de préstamos
+        self._l_user = []
+        self._l_due = array("q")
+        self._l_renov = array("H")
+        self._l_flags = array("B")
+        self._l_sig = array("i")         # siguiente préstamo del mismo libro / de la lista libre
+        self._l_due_txt = {}
+        self._libre = -1
+        self.prestamos = 0
+        self._por_usuario = {}           # user_id -> {book_code}
+        self._vencimientos = None        # IndiceVencimientos (None durante la carga inicial)
+
+        if items:
+            self.update(items)
+        # carga en bloque: el índice se arma una vez desde las columnas
+        self._vencimientos = IndiceVencimientos.desde_entradas(
+            (due, code, user) for fila, code in enumerate(self._codes)
+            for user, due in self._vencimientos_fila(fila).items())
+
+    # ----------------- préstamos -----------------
+    def _nuevo_prestamo(self, user, due, renov, flags):
+        due_us = iso_to_us(due)
+        if due_us is None:
+            flags |= F_DUE_TEXTO
+            due_us = 0
+        i = self._libre
+        if i >= 0:
+            self._libre = self._l_sig[i]
+            self._l_user[i] = sys.intern(user)
+            self._l_due[i] = due_us
+            self._l_renov[i] = renov
+            self._l_flags[i] = flags
+            self._l_sig[i] = -1
+        else:
+            i = len(self._l_user)
+            self._l_user.append(sys.intern(user))
+            self._l_due.append(due_us)
+            self._l_renov.append(renov)
+            self._l_flags.append(flags)
+            self._l_sig.append(-1)
+        if flags & F_DUE_TEXTO:
+            self._l_due_txt[i] = due
+        self.prestamos += 1
+        return i
+
+    def _usuarios_fila(self, fila):
+        extra = self._extra.get(fila)
+        if extra is not None:
+            return usuarios_de(extra)
+        out = set()
+        i = self._cabeza[fila]
+        while i >= 0:
+            out.add(self._l_user[i])
+            i = self._l_sig[i]
+        return out
+
+    def _vencimientos_fila(self, fila):
+        extra = self._extra.get(fila)
+        if extra is not None:
+            return vencimientos_de(extra)
+        out = {}
+        i = self._cabeza[fila]
+        while i >= 0:
+            if not self._l_flags[i] & F_DUE_TEXTO:
+                out[self._l_user[i]] = self._l_due[i]
+            i = self._l_sig[i]
+        return out
+
+    def _liberar_prestamos(self, fila):
+        i = self._cabeza[fila]
+        while i >= 0:
+            sig = self._l_sig[i]
+            self._l_user[i] = None
+            self._l_due_txt.pop(i, None)
+            self._l_sig[i] = self._libre
+            self._libre = i
+            self.prestamos -= 1
+            i = sig
+        self._cabeza[fila] = -1
+
+    # ----------------- API -----------------
+    def put(self, code, record, lsn=None):
+        fila = self._fila.get(code)
+        antes = set() if fila is None else self._usuarios_fila(fila)
+        indexar_usuarios(self._por_usuario, code, antes, usuarios_de(record))
+        if self._vencimientos is not None:
+            vence_antes = {} if fila is None else self._vencimientos_fila(fila)
+        if fila is None:
+            fila = len(self._codes)
+            if type(code) is str:
+                code = sys.intern(code)
+            self._fila[code] = fila
+            self._codes.append(code)
+            self._titulos.append("")
+            self._available.append(0)
+            self._cabeza.append(-1)
+        else:
+            self._liberar_prestamos(fila)
+            self._extra.pop(fila, None)
+
+        prestamos = forma_compacta(code, record)
+        if prestamos is None:
+            self._extra[fila] = record
+            self._titulos[fila] = ""
+            self._available[fila] = 0
+        else:
+            self._titulos[fila] = sys.intern(record["title"])
+            self._available[fila] = record["available"]
+            cola = -1
+            for user, due, renov, flags in prestamos:
+                i = self._nuevo_prestamo(user, due, renov, flags)
+                if cola < 0:
+                    self._cabeza[fila] = i
+                else:
+                    self._l_sig[cola] = i
+                cola = i
+        if self._vencimientos is not None:
+            # vencimientos ya convertidos a epoch us en las columnas
+            self._vencimientos.actualizar(code, vence_antes, self._vencimientos_fila(fila))
+
+    def _registro(self, fila):
+        extra = self._extra.get(fila)
+        if extra is not None:
+            return extra
+        loans = {}
+        i = self._cabeza[fila]
+        while i >= 0:
+            flags = self._l_flags[i]
+            due = self._l_due_txt[i] if flags & F_DUE_TEXTO else us_to_iso(self._l_due[i])
+            clave = "renovations" if flags & F_RENOVATIONS else "renovaciones"
+            loans[self._l_user[i]] = {"due": due, clave: self._l_renov[i]}
+            i = self._l_sig[i]
+        return {"code": self._codes[fila], "title": self._titulos[fila],
+                "available": self._available[fila], "loans": loans}
+
+    def get(self, code, default=None):
+        fila = self._fila.get(code)
+        return default if fila is None else self._registro(fila)
+
+    def __getitem__(self, code):
+        return self._registro(self._fila[code])
+
+    def resumen(self, code):
+        fila = self._fila.get(code)
+        if fila is None:
+            return None
+        extra = self._extra.get(fila)
+        if extra is not None:
+            if not isinstance(extra, dict):
+                return None
+            return extra.get("title", ""), extra.get("available", 0), len(extra.get("loans") or {})
+        n = 0
+        i = self._cabeza[fila]
+        while i >= 0:
+            n += 1
+            i = self._l_sig[i]
+        return self._titulos[fila], self._available[fila], n
+
+    def __setitem__(self, code, record):
+        self.put(code, record)
+
+    def libros_de_usuario(self, user):
+        return self._por_usuario.get(user, ())
+
+    def indice_vencimientos(self):
+        return self._vencimientos
+
+    def __delitem__(self, code):
+        fila = self._fila.pop(code)
+        indexar_usuarios(self._por_usuario, code, self._usuarios_fila(fila), set())
+        self._vencimientos.actualizar(code, self._vencimientos_fila(fila), {})
+        self._liberar_prestamos(fila)
+        self._extra.pop(fila, None)
+        # la última fila ocupa el hueco para que las columnas sigan densas
+        ultima = len(self._codes) - 1
+        if fila != ultima:
+            movido = self._codes[ultima]
+            self._fila[movido] = fila
+            self._codes[fila] = movido
+            self._titulos[fila] = self._titulos[ultima]
+            self._available[fila] = self._available[ultima]
+            self._cabeza[fila] = self._cabeza[ultima]
+            if ultima in self._extra:
+                self._extra[fila] = self._extra.pop(ultima)
+        self._codes.pop()
+        self._titulos.pop()
+        self._available.pop()
+        self._cabeza.pop()
+
+    def __contains__(self, code):
+        return code in self._fila
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __iter__(self):
+        return iter(self._fila)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# archivo: ga/db_ops.py
+#
+# Aplicación de operaciones sobre el catálogo del GA. Se usa desde el bucle
+# del GA, el replay del WAL y los procesos de replay en paralelo
+# (ga/replay.py), por eso vive en un módulo importable y sin efectos al
+# importarse.
+
+import time
+from datetime import datetime
+
+from vencimientos import indice_de
+from wal_format import iso_to_us, us_to_iso
+
+def iso():
+    return datetime.utcnow().isoformat() + "Z"
+
+def store_record(db, code, record, lsn=None):
+    # los motores con LSN por registro (ga/mmap_store.py) exponen put();
+    # con el dict en memoria el registro ya está en db
+    put = getattr(db, "put", None)
+    if put is None:
+        db[code] = record
+    else:
+        put(code, record, lsn)
+
+def apply_op_to_db(db, op, lsn=None):
+    """
+    op: dict with fields at least:
+    - operacion: 'prestamo'|'renovacion'|'devolucion'
+- book_code, user_id, (nueva_fecha) ...
+    lsn: LSN del WAL de la operación (lo guardan los motores que lo llevan por libro)
+    This function mutates db in place. DB schema (simple):
+        db[book_code] = {
+        "code": book_code,
+        "title": ... optional,
+        "available": int,
+        "loans": { user_id: {"due": iso_ts, "renovaciones": n } }
+        }
+    """
+    code = op.get("book_code")
+
+    # ensure book record (copia decodificada si el motor no es un dict)
+    record = db.get(code)
+    if record is None:
+        # create a minimal record (if WAL contains operations for nonexistent items)
+        record = {"code": code, "title": op.get("title", ""), "available": 0, "loans": {}}
+
+    res = apply_op_to_record(record, op)
+    store_record(db, code, record, lsn)
+    return res
+
+def apply_op_to_record(record, op):
+    oper = op.get("operacion")
+    user = str(op.get("user_id")) if op.get("user_id") is not None else None
+
+    if oper == "prestamo":
+        # create loan entry if available
+        if record.get("available", 0) > 0:
+            record["available"] = record.get("available", 0) - 1
+            # set due date
+            # el GA sella "due" antes del WAL (sellar_vencimiento); el resto
+            # es para registros viejos que llegaron sin él
+            due = op.get("due") or op.get("nueva_fecha") or vencimiento_prestamo(op.get("recv_ts"))
+            record["loans"][user] = {"due": due, "renovaciones": 0}
+            return {"estado": "ok", "mensaje": "prestamo aplicado (replay)"}
+        else:
+            # if replay and not available, still keep consistency: mark as failed
+            return {"estado": "error", "mensaje": "no hay ejemplares (replay)"}
+
+    elif oper == "renovacion":
+        loan = record.get("loans", {}).get(user)
+        if not loan:
+            return {"estado": "error", "mensaje": "prestamo no encontrado (replay)"}
+        renov = loan.get("renovaciones", 0)
+        if renov >= 2:
+            return {"estado": "error", "mensaje": "max renovaciones (replay)"}
+        # set nueva fecha if provided
+        nueva = op.get("nueva_fecha") or iso()
+        loan["due"] = nueva
+        loan["renovaciones"] = renov + 1
+        return {"estado": "ok", "mensaje": "renovacion aplicada (replay)", "nueva_fecha": nueva}
+
+    elif oper == "devolucion":
+        # remove loan if existed, increment available
+        loan = record.get("loans", {}).pop(user, None)
+        record["available"] = record.get("available", 0) + 1
+        return {"estado": "ok", "mensaje": "devolucion aplicada (replay)"}
+
+    else:
+        return {"estado": "error", "mensaje": f"operacion desconocida en replay: {oper}"}
+
+# ----------------- consultas (solo lectura, no pasan por el WAL) -----------------
+MAX_LIBROS_CONSULTA = 1000   # libros por consulta en lote
+
+def resumen_libro(db, code):
+    # (title, available, préstamos) sin armar el registro si el catálogo lo permite
+    resumen = getattr(db, "resumen", None)
+    if resumen is not None:
+        return resumen(code)
+    record = db.get(code)
+    if not isinstance(record, dict):
+        return None
+    return record.get("title", ""), record.get("available", 0), len(record.get("loans") or {})
+
+def consulta(db, op):
+    """
+    Disponibilidad de uno o varios libros, desde memoria:
+      {"operacion":"consulta","book_code":"BOOK-1"}
+      {"operacion":"consulta","book_codes":["BOOK-1","BOOK-2",...]}
+    -> {"estado":"ok","total":n,"libros":[{"book_code","title","available","prestados","disponible"}],
+        "no_encontrados":[...]}
+    """
+    codes = op.get("book_codes")
+    if codes is None:
+        codes = [] if op.get("book_code") is None else [op.get("book_code")]
+    if not isinstance(codes, list) or not codes:
+        return {"estado": "error", "mensaje": "book_code/book_codes faltante"}
+    if len(codes) > MAX_LIBROS_CONSULTA:
+        return {"estado": "error", "mensaje": f"maximo {MAX_LIBROS_CONSULTA} libros por consulta"}
+    libros, no_encontrados = [], []
+    for code in codes:
+        datos = resumen_libro(db, code) if isinstance(code, str) else None
+        if datos is None:
+            no_encontrados.append(code)
+            continue
+        title, available, prestados = datos
+        libros.append({"book_code": code, "title": title, "available": available,
+                       "prestados": prestados, "disponible": available > 0})
+    return {"estado": "ok", "total": len(libros), "libros": libros, "no_encontrados": no_encontrados}
+
+def libros_de_usuario(db, user):
+    # índice user_id -> {book_code} del catálogo; recorrido completo si no lo tiene
+    indice = getattr(db, "libros_de_usuario", None)
+    if indice is not None:
+        return indice(user)
+    return [code for code, rec in db.items() if user in (rec.get("loans") or {})]
+
+def consulta_usuario(db, op):
+    """
+    Préstamos vigentes de un usuario:
+    {"estado":"ok","user_id":u,"total":n,"prestamos":[{"book_code","title","due","renovaciones"}]}
+    Cuesta O(préstamos del usuario) con el índice del catálogo.
+    """
+    if op.get("user_id") is None:
+        return {"estado": "error", "mensaje": "user_id faltante"}
+    user = str(op.get("user_id"))
+    prestamos = []
+    for code in sorted(libros_de_usuario(db, user)):
+        record = db.get(code) or {}
+        loan = (record.get("loans") or {}).get(user) or {}
+        prestamos.append({
+            "book_code": code,
+            "title": record.get("title", ""),
+            "due": loan.get("due"),
+            "renovaciones": loan.get("renovaciones", loan.get("renovations", 0)),
+        })
+    return {"estado": "ok", "user_id": user, "total": len(prestamos), "prestamos": prestamos}
+
+def ahora_us():
+    return int(time.time() * 1000000)
+
+DIAS_PRESTAMO = 14   # plazo de un préstamo, como la renovación (actor_renovacion)
+
+def vencimiento_prestamo(desde=None, dias=DIAS_PRESTAMO):
+    # desde (ISO, la recepción en el GC) + dias; sin fecha válida, desde ahora
+    base = iso_to_us(desde) if desde else None
+    if base is None:
+        base = ahora_us()
+    return us_to_iso(base + int(dias * 86400 * 1000000))
+
+def sellar_vencimiento(op, dias=DIAS_PRESTAMO):
+    # Fija el vencimiento de un préstamo una sola vez, antes de escribirlo en
+    # el WAL: el replay y el secondary aplican la misma fecha que el primary.
+    if op.get("operacion") == "prestamo" and not op.get("due"):
+        op["due"] = vencimiento_prestamo(op.get("recv_ts"), dias)
+    return op
+
+def _instante(valor):
+    us = iso_to_us(valor)
+    if us is None:
+        raise ValueError(valor)
+    return us
+
+def consulta_vencimientos(db, op):
+    """
+    Préstamos por vencimiento, sin recorrer el catálogo (índice ordenado):
+      {"operacion":"consulta_vencimientos"}              -> vencidos a la fecha
+      {"operacion":"consulta_vencimientos","horas":24}   -> vencen en las próximas 24 h
+      {"operacion":"consulta_vencimientos","desde":iso,"hasta":iso}
+    "limite" (default 1000) acota la lista; "total" cuenta todo el rango.
+    """
+    ahora = ahora_us()
+    try:
+        if op.get("horas") is not None:
+            desde, hasta = ahora, ahora + int(float(op["horas"]) * 3600 * 1000000)
+        else:
+            desde, hasta = None, ahora
+        if op.get("desde") is not None:
+            desde = _instante(op["desde"])
+        if op.get("hasta") is not None:
+            hasta = _instante(op["hasta"])
+        limite = int(op.get("limite", 1000))
+        if limite < 0:
+            raise ValueError(limite)
+    except (TypeError, ValueError):
+        return {"estado": "error", "mensaje": "rango invalido (desde/hasta ISO-8601 'Z', horas, limite)"}
+    indice = indice_de(db)
+    return {
+        "estado": "ok",
+        "desde": None if desde is None else us_to_iso(desde),
+        "hasta": us_to_iso(hasta),
+        "total": indice.contar(desde, hasta),
+        "vencimientos": [{"book_code": code, "user_id": user, "due": us_to_iso(due)}
+                         for due, code, user in indice.rango(desde, hasta, limite)],
+    }
+
+OPERACIONES_LECTURA = {
+    "consulta": consulta,
+    "consulta_usuario": consulta_usuario,
+    "consulta_vencimientos": consulta_vencimientos,
+}
@@ -1,19 +1,90 @@
 #!/usr/bin/env python3
 # 
 # Gestor Administrador (GA) simple:
-# - REQ/REP para atender solicitudes de actores/monitor ("ping" -> "pong")
-# - Persistencia via pickle (db file)
-# - WAL (jsonlines) + replay al inicio
-# - Si role==primary -> envía replicación asíncrona (PUSH) a secondary
-# - Si role==secondary -> escucha replicación (PULL) y aplica
+# - ROUTER para atender solicitudes de actores/monitor ("ping" -> "pong") y
+#   consultas de solo lectura del GC (consulta, consulta_usuario, consulta_vencimientos),
+#   respondidas desde memoria sin WAL ni fsync; "consulta" admite varios libros
+# - Lotes: {"operacion":"lote","operaciones":[op, ...]} aplica las operaciones en
+#   orden con un solo lote del WAL (un fsync) y responde una sola vez
+#   {"estado":"ok","resultados":[resultado de cada op]}; una operación suelta es
+#   el caso de un lote de uno
+# - Idempotencia: una escritura con request_id ya aplicado se responde con el
+#   resultado guardado, sin WAL ni catálogo (ga/idempotencia.py)
+# - Muchas solicitudes en vuelo (los clientes siguen usando REQ): cada escritura
+#   se agrega al WAL sin esperar, se aplica en memoria en orden de llegada y su
+#   respuesta (y su replicación) sale cuando el hilo del WAL confirma el lote
+# - Barrido periódico de préstamos vencidos (ga/vencimientos.py) -> PUB "Vencidos"
+# - Persistencia via pickle (db file); en memoria el catálogo es compacto (ga/catalogo.py)
+# - WAL (jsonlines con LSN, segmentado) + replay de la cola posterior al checkpoint
+# - Replicación asíncrona por LSN (ga/replicacion.py): el primary envía en lotes
+#   los registros durables de su WAL y el secondary los escribe en el suyo con
+#   el mismo LSN, confirma con acks y al reconectarse pide la continuación, que
+#   sale de la memoria o de los segmentos del WAL; {"operacion":"estado_replicacion"}
+#   responde la posición y el lag (operaciones y ms). En el primary envía un
+#   hilo propio: el bucle solo encola y no depende del estado del secondary.
+#   En el secondary recibe y confirma otro hilo; el bucle aplica lo recibido
+#   de a GA_REPL_APLICAR_MAX registros por vuelta (un lote del WAL cada vez)
+#   entre solicitudes, sin que una ráfaga de replicación lo acapare
+# - Snapshot por el canal de replicación: un secondary nuevo, muy atrasado o
+#   sin el WAL que necesita pide el catálogo; el primary lo arma de a trozos
+#   comprimidos sin dejar de atender y después sigue el flujo desde su LSN
+# - Failback: el primary que vuelve no atiende (ping -> "failback") hasta
+#   incorporar como escrituras nuevas el tramo del WAL que el secondary atendió
+#   solo; el secondary después trae solo los libros que cambiaron desde que
+#   dejaron de coincidir (costo proporcional a la caída, no al catálogo)
 #
 # Config via env:
 #  GA_ROLE (primary|secondary) default primary
-#  GA_BIND (REQ/REP bind)   default tcp://0.0.0.0:6000
+#  GA_SHARDS / GA_SHARD     particiones por hash de book_code y la de este proceso
+#                           (ver ga/ruteo.py, scripts/particionar_db.py) default 1 / 0;
+#                           con más de una, archivos con sufijo _s{k} y puertos por defecto +10*k
+#  GA_BIND (ROUTER bind)    default tcp://0.0.0.0:6000
+#  GA_MAX_EN_VUELO          respuestas pendientes de durabilidad antes de dejar de leer default 4096
+#  GA_LOTE_MAX              operaciones max por lote          default 1000
+#  GA_IDEM_MAX              claves request_id recordadas (0: apagado) default 10000
+#  GA_IDEM_TTL_S            segundos que vale una clave       default 300
 #  GA_DB_FILE               default gc/ga_db_{role}.pkl
+#  GA_STORAGE               dict|mmap|sqlite (ga/mmap_store.py, ga/sqlite_store.py) default dict
+#  GA_MMAP_FILE             (si mmap) default GA_DB_FILE con extensión .mmap
+#  GA_MMAP_SLOT_BYTES       (si mmap) tamaño de slot por libro default 512
+#  GA_EXPORT_PICKLE         1: escribe el pickle completo GA_DB_FILE al cerrar
+#                           default 1 con dict, 0 con mmap/sqlite (O(catálogo))
+#  GA_SQLITE_FILE           (si sqlite) default GA_DB_FILE con extensión .sqlite
+#  GA_SQLITE_TX_OPS         (si sqlite) operaciones max por transacción default 100
+#  GA_SQLITE_TX_MS          (si sqlite) ms max de una transacción abierta default 50
 #  GA_WAL_FILE              default gc/ga_wal_{role}.log
-#  GA_REPL_PUSH_ADDR        (si primary) default tcp://localhost:7001
-#  GA_REPL_PULL_BIND        (si secondary) default tcp://0.0.0.0:7001
+#  GA_REPL_PUSH_ADDR        (si primary) secondary al que conectarse default tcp://localhost:7001
+#  GA_REPL_PULL_BIND        (si secondary) bind del canal de replicación default tcp://0.0.0.0:7001
+#  GA_REPL_LOTE             registros max por mensaje de replicación default 500
+#  GA_REPL_MEMORIA          registros por enviar en memoria (el resto, del WAL) default 50000
+#  GA_REPL_TIMEOUT_S        silencio del otro nodo que cuenta como desconexión default 5
+#  GA_REPL_RETENER_MB       WAL rotado retenido hasta el ack del secondary default 256
+#  GA_REPL_SNAPSHOT_OPS     atraso del secondary (ops) que se resuelve con un snapshot
+#                           (0: tantas como libros tiene el catálogo) default 0
+#  GA_REPL_SNAPSHOT_LIBROS  libros por trozo del snapshot     default 2000
+#  GA_REPL_APLICAR_MAX      (si secondary) registros replicados aplicados por vuelta del bucle default 2000
+#  GA_REPL_PENDIENTES       (si secondary) registros recibidos sin aplicar antes de dejar de leer default 50000
+#  GA_FAILBACK_ESPERA_S     (si primary) espera al secondary al arrancar antes de atender (0: no espera) default 5
+#  GA_WAL_SYNC_MODE         always|group|interval  default group (ver ga/wal.py)
+#  GA_WAL_GROUP_WINDOW_MS   ventana de group commit  default 2
+#  GA_WAL_GROUP_MAX         entradas max por lote    default 256
+#  GA_WAL_SYNC_INTERVAL_MS  periodo fsync (interval) default 50
+#  GA_CKPT_SHARDS           shards base del checkpoint (0: según el catálogo) default 0
+#  GA_CKPT_LIBROS_SHARD     libros por shard base con GA_CKPT_SHARDS=0 default 4096
+#  GA_CKPT_COMPACTAR        fracción del catálogo en deltas que dispara la compactación default 0.25
+#  GA_CKPT_OPS              operaciones entre checkpoints     default 1000
+#  GA_CKPT_INTERVAL_S       segundos max entre checkpoints    default 5
+#  GA_WAL_SEGMENT_BYTES     tamaño de segmento del WAL        default 16 MiB
+#  GA_WAL_FORMAT            json|binary (ver ga/wal_format.py) default json
+#  GA_REPLAY_WORKERS        procesos del replay paralelo (ver ga/replay.py) default núcleos
+#  GA_REPLAY_PARALLEL_BYTES cola mínima para replay paralelo   default 4 MiB
+#  GA_PRESTAMO_DIAS         plazo de un préstamo nuevo (due = recepción en el GC + días) default 14
+#  GA_VENCIDOS_INTERVAL_S   segundos entre barridos de vencidos (0: apagado) default 60
+#  GA_VENCIDOS_PUB_BIND     PUB de notificaciones de vencidos ("" : solo log)
+#                           default tcp://0.0.0.0:6100 (primary) / 6101 (secondary)
+#  GA_VENCIDOS_LOTE         préstamos por mensaje de notificación default 500
+#  GA_STATUS_FILE           rol que atiende según el monitor; solo ese rol barre vencidos
+#                           default gc/ga_activo.txt (partición k: gc/ga_activo_k.txt)
 #
 import os
 import sys
@@ -21,21 +92,57 @@ import json
 import zmq
 import time
 import signal
-import pickle
+from collections import deque
 from datetime import datetime
 
+from db_ops import apply_op_to_db, store_record, ahora_us, sellar_vencimiento, OPERACIONES_LECTURA
+from catalogo import Catalogo
+from wal import writer_from_env, iter_wal, migrate_legacy, apartar
+from checkpoint import checkpointer_from_env, marcar_lsn_pickle
+from replay import replay_tail
+from vencimientos import Barrido, indice_de
+from ruteo import shard_de, SALTO_PUERTOS, archivo_estado, leer_activo
+from idempotencia import cache_from_env, clave_de
+from replicacion import emisor_from_env, receptor_from_env
+
 # ----------------- Configuración por defecto (se pueden override con env) -----------------
 ROLE = os.getenv("GA_ROLE", "primary").lower()   # 'primary' or 'secondary'
+# particionado por hash de book_code (ga/ruteo.py): este proceso es la partición SHARD de SHARDS
+SHARDS = max(int(os.getenv("GA_SHARDS", "1")), 1)
+SHARD = int(os.getenv("GA_SHARD", "0"))
+if not 0 <= SHARD < SHARDS:
+    # con un índice fuera de rango ningún libro sería de esta partición y el
+    # GA rechazaría todas las escrituras con shard_incorrecto
+    print(f"GA_SHARD={SHARD} fuera de rango: debe estar entre 0 y GA_SHARDS-1={SHARDS - 1}", file=sys.stderr)
+    sys.exit(2)
+SUFIJO = f"_s{SHARD}" if SHARDS > 1 else ""
+P = SALTO_PUERTOS * SHARD          # desplazamiento de los puertos por defecto
 # Determinar bind según rol: primary usa 6000, secondary usa 6001
 if ROLE == "secondary":
-    GA_BIND = os.getenv("GA_SECONDARY_BIND", os.getenv("GA_BIND", "tcp://0.0.0.0:6001"))
+    GA_BIND = os.getenv("GA_SECONDARY_BIND", os.getenv("GA_BIND", f"tcp://0.0.0.0:{6001 + P}"))
 else:
-    GA_BIND = os.getenv("GA_PRIMARY_BIND", os.getenv("GA_BIND", "tcp://0.0.0.0:6000"))
-DB_FILE = os.getenv("GA_DB_FILE", f"gc/ga_db_{ROLE}.pkl")
-WAL_FILE = os.getenv("GA_WAL_FILE", f"gc/ga_wal_{ROLE}.log")
-REPL_PUSH_ADDR = os.getenv("GA_REPL_PUSH_ADDR", "tcp://localhost:7001")   # uso en primary
-REPL_PULL_BIND = os.getenv("GA_REPL_PULL_BIND", "tcp://0.0.0.0:7001")     # uso en secondary
+    GA_BIND = os.getenv("GA_PRIMARY_BIND", os.getenv("GA_BIND", f"tcp://0.0.0.0:{6000 + P}"))
+DB_FILE = os.getenv("GA_DB_FILE", f"gc/ga_db_{ROLE}{SUFIJO}.pkl")
+STORAGE = os.getenv("GA_STORAGE", "dict").lower()          # 'dict', 'mmap' or 'sqlite'
+WAL_FILE = os.getenv("GA_WAL_FILE", f"gc/ga_wal_{ROLE}{SUFIJO}.log")
+REPL_PUSH_ADDR = os.getenv("GA_REPL_PUSH_ADDR", f"tcp://localhost:{7001 + P}")   # uso en primary
+REPL_PULL_BIND = os.getenv("GA_REPL_PULL_BIND", f"tcp://0.0.0.0:{7001 + P}")     # uso en secondary
 REQ_TIMEOUT_MS = int(os.getenv("GA_REQ_TIMEOUT_MS", "5000"))
+VENCIDOS_PUB_BIND = os.getenv("GA_VENCIDOS_PUB_BIND",
+                              f"tcp://0.0.0.0:{6101 + P}" if ROLE == "secondary" else f"tcp://0.0.0.0:{6100 + P}")
+VENCIDOS_LOTE = max(int(os.getenv("GA_VENCIDOS_LOTE", "500")), 1)
+DIAS_PRESTAMO = float(os.getenv("GA_PRESTAMO_DIAS", "14"))   # plazo de un préstamo nuevo
+STATUS_FILE = os.getenv("GA_STATUS_FILE", archivo_estado(SHARD))   # escrito por el monitor
+MAX_EN_VUELO = max(int(os.getenv("GA_MAX_EN_VUELO", "4096")), 1)   # respuestas esperando el WAL
+LOTE_RECV = 256     # mensajes leídos por vuelta del bucle
+LOTE_MAX = max(int(os.getenv("GA_LOTE_MAX", "1000")), 1)          # operaciones por lote
+REPL_APLICAR_MAX = max(int(os.getenv("GA_REPL_APLICAR_MAX", "2000")), 1)  # replicados por vuelta
+
+# checkpoints incrementales por shards (ver ga/checkpoint.py)
+ckpt = checkpointer_from_env(DB_FILE)
+# request_id ya aplicados -> resultado (ver ga/idempotencia.py)
+idem = cache_from_env()
+IDEM_FILE = DB_FILE + ".idem"
 
 # ----------------- Helpers -----------------
 def iso():
@@ -46,119 +153,72 @@ def ensure_dirs():
     os.makedirs(os.path.dirname(WAL_FILE) or ".", exist_ok=True)
     os.makedirs("logs", exist_ok=True)
 
-def atomic_append(path, text):
-    # append text + newline and fsync to ensure durability for WAL
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(text + "\n")
-        f.flush()
-        try:
-            os.fsync(f.fileno())
-        except Exception:
-            pass
-
 def load_db():
     try:
-        with open(DB_FILE, "rb") as f:
-            db = pickle.load(f)
-            print(f"[{iso()}] DB cargada desde {DB_FILE} ({len(db)} libros)")
+        db = ckpt.load()
+        if db is not None:
+            return db
+    except Exception as e:
+        if STORAGE != "dict":
+            # los motores en disco no pueden seguir sobre un catálogo en memoria
+            raise
+        print(f"[{iso()}] Error cargando shards ({ckpt.dir}): {e}; se intenta {DB_FILE}", file=sys.stderr)
+    try:
+        # pickle completo: con su LSN si lo escribió export_full
+        db = ckpt.cargar_pickle()
+        if db is not None:
             return db
-    except FileNotFoundError:
         print(f"[{iso()}] No existe DB, inicializando vacía ({DB_FILE})")
-        return {}
+        return Catalogo()
     except Exception as e:
         print(f"[{iso()}] Error cargando DB: {e}", file=sys.stderr)
-        return {}
-
-def save_db(db):
-    tmp = DB_FILE + ".tmp"
-    with open(tmp, "wb") as f:
-        pickle.dump(db, f)
-        f.flush()
-        try:
-            os.fsync(f.fileno())
-        except Exception:
-            pass
-    os.replace(tmp, DB_FILE)
+        return Catalogo()
 
 # ----------------- WAL replay -----------------
-def apply_op_to_db(db, op):
+def replay_wal(db):
     """
-    op: dict with fields at least:
-    - operacion: 'prestamo'|'renovacion'|'devolucion'
-- book_code, user_id, (nueva_fecha) ...
-    This function mutates db in place. DB schema (simple):
-        db[book_code] = {
-        "code": book_code,
-        "title": ... optional,
-        "available": int,
-        "loans": { user_id: {"due": iso_ts, "renovaciones": n } }
-        }
+    Reproduce solo la cola del WAL posterior al checkpoint (LSN > ckpt.lsn)
+    y omite, por shard, las operaciones que el snapshot ya incluye.
+    Devuelve el último LSN aplicado (o el del checkpoint si no hubo cola).
     """
-    oper = op.get("operacion")
-    code = op.get("book_code")
-    user = str(op.get("user_id")) if op.get("user_id") is not None else None
-
-    # ensure book record
-    if code not in db:
-        # create a minimal record (if WAL contains operations for nonexistent items)
-        db[code] = {"code": code, "title": op.get("title", ""), "available": 0, "loans": {}}
-
-    record = db[code]
-
-    if oper == "prestamo":
-        # create loan entry if available
-        if record.get("available", 0) > 0:
-            record["available"] = record.get("available", 0) - 1
-            # set due date
-            due = op.get("due") or op.get("nueva_fecha") or op.get("recv_ts") or iso()
-            record["loans"][user] = {"due": due, "renovaciones": 0}
-            return {"estado": "ok", "mensaje": "prestamo aplicado (replay)"}
-        else:
-            # if replay and not available, still keep consistency: mark as failed
-            return {"estado": "error", "mensaje": "no hay ejemplares (replay)"}
-
-    elif oper == "renovacion":
-        loan = record.get("loans", {}).get(user)
-        if not loan:
-            return {"estado": "error", "mensaje": "prestamo no encontrado (replay)"}
-        renov = loan.get("renovaciones", 0)
-        if renov >= 2:
-            return {"estado": "error", "mensaje": "max renovaciones (replay)"}
-        # set nueva fecha if provided
-        nueva = op.get("nueva_fecha") or iso()
-        loan["due"] = nueva
-        loan["renovaciones"] = renov + 1
-        return {"estado": "ok", "mensaje": "renovacion aplicada (replay)", "nueva_fecha": nueva}
-
-    elif oper == "devolucion":
-        # remove loan if existed, increment available
-        loan = record.get("loans", {}).pop(user, None)
-        record["available"] = record.get("available", 0) + 1
-        return {"estado": "ok", "mensaje": "devolucion aplicada (replay)"}
-
-    else:
-        return {"estado": "error", "mensaje": f"operacion desconocida en replay: {oper}"}
-
-def replay_wal(db):
-    if not os.path.exists(WAL_FILE):
-        print(f"[{iso()}] WAL no existe ({WAL_FILE}) — nada que reproducir")
-        return
-    print(f"[{iso()}] Reproduciendo WAL desde {WAL_FILE} ...")
-    applied = 0
-    with open(WAL_FILE, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
+    vacia = not db
+    legacy = migrate_legacy(WAL_FILE) or (WAL_FILE + ".pre-lsn")
+    if vacia and os.path.exists(legacy):
+        # sin snapshot usable: el WAL previo a los LSN es la única fuente
+        print(f"[{iso()}] DB vacía: reproduciendo WAL sin LSN ({legacy}) ...")
+        legacy_applied = 0
+        for _, entry in iter_wal(legacy):
+            op = entry.get("op") if isinstance(entry, dict) and "op" in entry else entry
             try:
-                entry = json.loads(line)
-                # 'entry' expected to have 'op' field or be op directly; support both
-                op = entry.get("op") if isinstance(entry, dict) and "op" in entry else entry
                 apply_op_to_db(db, op)
-                applied += 1
+                legacy_applied += 1
             except Exception as e:
-                print(f"[{iso()}] Error replay linea WAL: {e} | linea: {line}", file=sys.stderr)
-    print(f"[{iso()}] WAL replay finalizado. Operaciones aplicadas: {applied}")
+                print(f"[{iso()}] Error replay linea WAL: {e} | entrada: {entry}", file=sys.stderr)
+        print(f"[{iso()}] WAL sin LSN reproducido: {legacy_applied} operaciones")
+
+    start = ckpt.lsn
+    print(f"[{iso()}] Reproduciendo WAL desde {WAL_FILE} (lsn > {start}) ...")
+    st = replay_tail(WAL_FILE, db, start, ckpt.coverage())
+    if st["primer_lsn"] is not None and st["primer_lsn"] > start + 1:
+        print(f"[{iso()}] Aviso: hueco en el WAL (checkpoint lsn={start}, primer lsn disponible={st['primer_lsn']})", file=sys.stderr)
+    for code in st["libros"]:
+        ckpt.mark(code)
+    # claves de idempotencia: las del último checkpoint + las de la cola
+    if idem.activa():
+        desde_ckpt = 0 if ckpt.externo else idem.cargar_archivo(IDEM_FILE)
+        for clave, (lsn, res) in st["idem"].items():
+            idem.guardar(clave, lsn, res)
+        print(f"[{iso()}] Claves de idempotencia: {len(idem)} ({desde_ckpt} del checkpoint, "
+              f"{len(st['idem'])} de la cola del WAL)")
+    detalle = ""
+    if st["modo"] == "paralelo":
+        detalle = (f", decodificación {st['decodificacion_s'] * 1000:.0f} ms"
+                   f", aplicación {st['aplicacion_s'] * 1000:.0f} ms")
+    print(f"[{iso()}] WAL replay finalizado ({st['modo']}, {st['workers']} proceso(s)). "
+          f"Operaciones aplicadas: {st['aplicadas']} (omitidas por checkpoint: {st['omitidas']}, "
+          f"último lsn: {st['ultimo_lsn']}) en {st['segundos'] * 1000:.0f} ms "
+          f"= {st['ops_s']:.0f} ops/s{detalle}")
+    return st["ultimo_lsn"]
 
 # ----------------- GA main -----------------
 running = True
@@ -176,143 +236,549 @@ def main():
     print(" GESTOR ADMINISTRADOR (GA) ".center(72))
     print("-"*72)
     print(f" Role        : {ROLE}")
-    print(f" REQ/REP bind: {GA_BIND}")
-    print(f" DB file     : {DB_FILE}")
+    if SHARDS > 1:
+        print(f" Partición   : {SHARD} de {SHARDS} (blake2b(book_code) % {SHARDS}, ver ga/ruteo.py)")
+    print(f" ROUTER bind : {GA_BIND}")
+    print(f" DB file     : {DB_FILE} (storage: {STORAGE})")
     print(f" WAL file    : {WAL_FILE}")
+    print(f" WAL sync    : {os.getenv('GA_WAL_SYNC_MODE', 'group').lower()}"
+          f" ({os.getenv('GA_WAL_FORMAT', 'json').lower()})")
     if ROLE == "primary":
-        print(f" Replicacion -> PUSH to: {REPL_PUSH_ADDR}")
+        print(f" Replicacion -> secondary: {REPL_PUSH_ADDR}")
     else:
-        print(f" Replicacion PULL bind : {REPL_PULL_BIND}")
+        print(f" Replicacion bind      : {REPL_PULL_BIND}")
+    print(f" Vencidos PUB: {VENCIDOS_PUB_BIND or '(solo log)'} (si {STATUS_FILE} = {ROLE})")
     print("="*72 + "\n")
 
+    # DB + WAL replay (solo la cola posterior al checkpoint); antes de abrir
+    # los sockets porque el replay paralelo hace fork de procesos
+    db = load_db()
+    if ckpt.externo:
+        # pickle sin LSN (generado o copiado de otro nodo): el WAL local no
+        # corresponde a ese contenido y reproducirlo duplicaría operaciones
+        apartar(WAL_FILE)
+        # desde ahora el pickle es el origen del WAL nuevo (lsn 0)
+        marcar_lsn_pickle(DB_FILE, 0)
+    if SHARDS > 1:
+        ajenos = sum(1 for code in db if shard_de(code, SHARDS) != SHARD)
+        if ajenos:
+            print(f"[{iso()}] Aviso: {ajenos} libros de {DB_FILE} no son de la partición {SHARD} "
+                  f"(¿falta scripts/particionar_db.py?)", file=sys.stderr)
+    # si la DB no viene de los shards (pickle completo o vacía) todo se reescribe
+    ckpt.track(db, dirty=not ckpt.from_shards)
+    applied_lsn = replay_wal(db)
+    lsn_slots = getattr(ckpt, "lsn_max", 0)
+    if lsn_slots > applied_lsn:
+        # slots del motor mmap por delante del WAL: esos LSN ya figuran como
+        # aplicados, reutilizarlos haría que el próximo replay omitiera
+        # operaciones nuevas
+        print(f"[{iso()}] Aviso: el catálogo tiene slots con lsn hasta {lsn_slots} y el WAL llega a "
+              f"{applied_lsn}; el WAL continúa en {lsn_slots}", file=sys.stderr)
+        applied_lsn = lsn_slots
+    # after replay, persist current db snapshot (solo libros modificados);
+    # se espera para no atender con el catálogo sin copia propia en disco
+    ckpt.checkpoint(db, applied_lsn)
+    ckpt.sincronizar()
+    if idem.activa():
+        # la cola del WAL se trunca al abrir el escritor: sus claves van al snapshot
+        idem.escribir_foto(IDEM_FILE, idem.foto(applied_lsn))
+
     # ZMQ sockets
     ctx = zmq.Context.instance()
-    rep = ctx.socket(zmq.REP)
-    rep.bind(GA_BIND)
-
-    # replication sockets
-    repl_push = None
-    repl_pull = None
+    # ROUTER en lugar de REP: muchas solicitudes en vuelo a la vez. Los REQ
+    # de actores/monitor no cambian: llegan como [identidad, b"", payload] y
+    # la respuesta vuelve con el mismo sobre.
+    router = ctx.socket(zmq.ROUTER)
+    router.bind(GA_BIND)
+
+    # canal de replicación (DEALER en ambos extremos, ver ga/replicacion.py)
+    repl = ctx.socket(zmq.DEALER)
+    repl.setsockopt(zmq.LINGER, 0)
+    if ROLE == "primary":
+        # sin secondary conectado los envíos fallan en vez de encolarse:
+        # al volver pide la continuación desde su LSN
+        repl.setsockopt(zmq.IMMEDIATE, 1)
+        repl.connect(REPL_PUSH_ADDR)
+    else:
+        repl.bind(REPL_PULL_BIND)
+
+    # notificaciones de préstamos vencidos
+    vencidos_pub = None
+    if VENCIDOS_PUB_BIND:
+        vencidos_pub = ctx.socket(zmq.PUB)
+        vencidos_pub.bind(VENCIDOS_PUB_BIND)
+    barrido = Barrido(float(os.getenv("GA_VENCIDOS_INTERVAL_S", "60")))
+
+    # escritor del WAL (group commit); se abre después del replay
+    wal = writer_from_env(WAL_FILE, start_lsn=applied_lsn)
+    emisor = receptor = None
     if ROLE == "primary":
-        repl_push = ctx.socket(zmq.PUSH)
-        # connect to secondary's pull (may fail now, but will retry on send)
+        emisor = emisor_from_env(repl, wal)
+    else:
+        receptor = receptor_from_env(repl, WAL_FILE + ".repl")
+        if receptor.divergido is not None:
+            print(f"[{iso()}] Aviso: WAL divergido del primary desde lsn={receptor.divergido} "
+                  f"({WAL_FILE}.repl); no se aplica replicación", file=sys.stderr)
+        elif receptor.pide_snapshot:
+            print(f"[{iso()}] Aviso: snapshot del primary sin terminar ({WAL_FILE}.repl); "
+                  f"se vuelve a pedir", file=sys.stderr)
+        elif not db:
+            # secondary nuevo: el flujo desde lsn 0 supone el catálogo inicial del primary
+            print(f"[{iso()}] Catálogo vacío: se pide un snapshot al primary")
+            receptor.solicitar_snapshot()
+    # segmentos cubiertos por el checkpoint (y ya recibidos por el secondary)
+    wal.truncate((emisor or receptor).retener(ckpt.lsn))
+    print(f"[{iso()}] WAL listo en lsn={wal.lsn} (checkpoint lsn={ckpt.lsn})")
+    state = {"applied_lsn": applied_lsn, "wal_roto": False}
+    # motor mmap: los slots solo reciben operaciones ya durables en el WAL
+    volcar = getattr(db, "volcar", None)
+    if volcar:
+        volcar(wal.durable_lsn)
+
+    # respuestas retenidas hasta que su LSN sea durable, en orden de LSN:
+    # (lsn, sobre, respuesta)
+    pendientes = deque()
+    # el hilo escritor del WAL despierta al bucle por un pipe al confirmar un lote
+    aviso_r, aviso_w = os.pipe()
+    os.set_blocking(aviso_r, False)
+    os.set_blocking(aviso_w, False)
+
+    def despertar():
         try:
-            repl_push.connect(REPL_PUSH_ADDR)
-        except Exception:
-            print(f"[{iso()}] Aviso: no se pudo conectar a {REPL_PUSH_ADDR} (se reintentará en cada envío)")
-
+            os.write(aviso_w, b"\0")
+        except OSError:
+            pass    # pipe lleno: el bucle ya tiene un aviso pendiente
+
+    def avisar(_lsn):
+        despertar()
+        (emisor or receptor).avisar()   # acks en el secondary
+    wal.on_durable = avisar
+    # emisor: hay lugar para otro trozo del snapshot; receptor: hay registros para aplicar
+    (emisor or receptor).despertar = despertar
+
+    # poller: ROUTER + aviso (WAL o hilos de replicación); el socket de
+    # replicación es del hilo emisor (primary) o receptor (secondary)
+    poller = zmq.Poller()
+    poller.register(router, zmq.POLLIN)
+    poller.register(aviso_r, zmq.POLLIN)
+    if receptor is not None:
+        receptor.iniciar(wal)
     else:
-        repl_pull = ctx.socket(zmq.PULL)
-        repl_pull.bind(REPL_PULL_BIND)
+        emisor.iniciar()
 
-    # DB + WAL replay
-    db = load_db()
-    replay_wal(db)
-    # after replay, persist current db snapshot
-    save_db(db)
-
-    # poller: REP + (si secondary) PULL
-    poller = zmq.Poller()
-    poller.register(rep, zmq.POLLIN)
-    if repl_pull:
-        poller.register(repl_pull, zmq.POLLIN)
-
-    # auxiliar: apply and persist (with WAL)
-    def process_and_persist(op_payload):
-        # 1) write wal line (op)
-        wal_entry = {"ts": iso(), "op": op_payload}
+    # auxiliar: WAL (sin esperar el fsync) + aplicación en memoria, en orden
+    def aplicar(op_payload):
+        # 1) write wal line (op); la durabilidad la confirma entregar()
         try:
-            atomic_append(WAL_FILE, json.dumps(wal_entry))
+            lsn = escribir_wal([op_payload])[0]
         except Exception as e:
             print(f"[{iso()}] ERROR escribiendo WAL: {e}", file=sys.stderr)
-            return {"estado":"error","mensaje":"error_wal","detalle":str(e)}
+            return None, {"estado":"error","mensaje":"error_wal","detalle":str(e)}
+        return lsn, aplicar_en_db(op_payload, lsn)
+
+    def escribir_wal(ops):
+        # escrituras de clientes: en el primary van al flujo de replicación;
+        # en el secondary (atiende sin primary) su WAL deja de ser el del primary
+        if receptor is not None:
+            receptor.divergir(wal.lsn)
+        for op in ops:
+            sellar_vencimiento(op, DIAS_PRESTAMO)
+        lsns = wal.append_many(ops)
+        if emisor is not None:
+            emisor.registrar(lsns, ops)
+        return lsns
+
+    def aplicar_replicados(registros):
+        # registros [lsn, ts, op] contiguos desde wal.lsn + 1: un lote del WAL
+        # con los mismos LSN del primary
+        ops = [r[2] for r in registros]
+        lsns = wal.append_many(ops)
+        if lsns[0] != registros[0][0]:
+            raise RuntimeError(f"replicación fuera de orden: lsn {registros[0][0]} en WAL lsn {lsns[0]}")
+        print(f"[{iso()}] REPL RECV -> lote lsn {lsns[0]}..{lsns[-1]} ({len(ops)} ops)")
+        for lsn, op in zip(lsns, ops):
+            if receptor.cubierto(op.get("book_code"), lsn):
+                # el trozo del snapshot de ese libro ya la incluye
+                state["applied_lsn"] = lsn
+                idem.guardar(clave_de(op), lsn, None)
+                continue
+            aplicar_en_db(op, lsn)
+        print(f"[{iso()}] REPL APPLY -> lsn {lsns[-1]}")
+
+    def instalar_snapshot(snap):
+        # reemplaza el catálogo por el del primary; el WAL local (de otro
+        # historial) se aparta y sigue vacío desde el LSN del snapshot
+        inicio = time.perf_counter()
+        libros_antes = len(db)
+        vistos = set()
+        for lsn, code, rec in snap["libros"]:
+            store_record(db, code, rec, lsn)
+            ckpt.mark(code)
+            vistos.add(code)
+        if not snap["parcial"]:
+            sobran = [code for code in db if code not in vistos]
+            try:
+                for code in sobran:
+                    del db[code]
+                    ckpt.mark(code)
+            except TypeError as e:
+                print(f"[{iso()}] Aviso: {len(sobran)} libros locales que no están en el primary "
+                      f"se conservan ({e})", file=sys.stderr)
+        # parcial (failback): el resto del catálogo ya es el del primary y el
+        # checkpoint incremental solo reescribe los libros marcados
+        ckpt.track(db, dirty=not snap["parcial"] or len(db) != libros_antes)
+        if idem.activa():
+            idem.cargar_foto(snap["idem"] or {})
+        wal.reiniciar(snap["lsn"])
+        state["applied_lsn"] = snap["lsn"]
+        receptor.instalado(snap)
+        print(f"[{iso()}] REPL SNAPSHOT <- instalado: {len(vistos)} libros en {snap['trozos']} trozos "
+              f"(lsn {snap['lsn']}..{snap['hasta']}), recepción {snap['segundos']:.2f} s, "
+              f"instalación {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+    def aplicar_en_db(op_payload, lsn):
+        # 2) apply to local db y marcar el libro como modificado
+        state["applied_lsn"] = lsn
+        try:
+            res = apply_op_to_db(db, op_payload, lsn)
+        except Exception as e:
+            print(f"[{iso()}] ERROR aplicando operación lsn={lsn}: {e}", file=sys.stderr)
+            return {"estado":"error","mensaje":"error_aplicando","detalle":str(e)}
+        ckpt.mark(op_payload.get("book_code"))
+        idem.guardar(clave_de(op_payload), lsn, res)
+        return res
 
-        # 2) apply to local db
-        res = apply_op_to_db(db, op_payload)
-        # 3) persist snapshot (pickle)
+    def duplicado(payload):
+        # (lsn, resultado) si la clave de idempotencia ya se aplicó
+        clave = clave_de(payload)
+        if clave is None or not idem.activa():
+            return None
+        previo = idem.buscar(clave)
+        if previo is None:
+            return None
+        lsn, res = previo
+        print(f"[{iso()}] Duplicado request_id={clave} (lsn={lsn}): se responde el resultado guardado")
+        if res is None:
+            res = {"estado":"ok","mensaje":"operacion ya aplicada","lsn":lsn}
+        return lsn, res
+
+    def leer(payload):
+        oper = payload.get("operacion")
         try:
-            save_db(db)
+            return OPERACIONES_LECTURA[oper](db, payload)
         except Exception as e:
-            print(f"[{iso()}] ERROR guardando DB: {e}", file=sys.stderr)
+            print(f"[{iso()}] ERROR en consulta {oper}: {e}", file=sys.stderr)
+            return {"estado":"error","mensaje":"error_consulta","detalle":str(e)}
+
+    def rechazo(payload):
+        # None si este GA puede aplicar la escritura; si no, el error a responder.
+        # Con particiones, cada libro tiene un solo dueño: un error de ruteo
+        # no puede partir el estado de un libro entre dos GA
+        if SHARDS > 1 and shard_de(payload.get("book_code"), SHARDS) != SHARD:
+            return {"estado":"error","mensaje":"shard_incorrecto",
+                    "shard": shard_de(payload.get("book_code"), SHARDS)}
+        if (emisor is not None and emisor.bloquea()) or (receptor is not None and receptor.cediendo is not None):
+            # failback: el primary todavía no tiene las escrituras del secondary
+            return {"estado":"error","mensaje":"failback"}
+        if receptor is not None and receptor.resincronizando() is not None:
+            # catálogo a medio copiar del primary: no se escribe encima
+            return {"estado":"error","mensaje":"resincronizando"}
+        return None
+
+    def responder(sobre, result):
+        router.send_multipart(sobre + [json.dumps(result).encode("utf-8")])
+
+    def encolar(lsn, sobre, result):
+        # la respuesta sale cuando lsn es durable (las lecturas esperan a las
+        # escrituras previas para no mostrar estado que podría perderse)
+        if lsn is None or (not pendientes and lsn <= wal.durable_lsn):
+            responder(sobre, result)
+            return
+        pendientes.append((lsn, sobre, result))
+
+    def entregar():
+        # responde en orden todo lo que ya es durable (la replicación lo
+        # toma del WAL por su cuenta: replicar())
+        durable = wal.durable_lsn
+        if volcar:
+            volcar(durable)
+        while pendientes and pendientes[0][0] <= durable:
+            _, sobre, result = pendientes.popleft()
+            responder(sobre, result)
+        if wal.error is not None and not state["wal_roto"]:
+            # también sin respuestas retenidas (replicación en el secondary)
+            fallo_wal(wal.error)
+
+    def fallo_wal(e):
+        # el catálogo en memoria ya tiene operaciones que no llegaron al WAL:
+        # se responde error a las pendientes y se detiene el GA sin
+        # checkpoint, para que el arranque lo reconstruya desde el WAL
+        global running
+        print(f"[{iso()}] ERROR: el WAL no confirma escrituras ({e}); deteniendo GA", file=sys.stderr)
+        while pendientes:
+            _, sobre, _ = pendientes.popleft()
+            responder(sobre, {"estado":"error","mensaje":"error_wal","detalle":str(e)})
+        state["wal_roto"] = True
+        running = False
+
+    def esperar_wal(lsn):
+        # el snapshot no puede adelantarse al WAL durable
+        wal.wait(lsn, timeout=REQ_TIMEOUT_MS / 1000.0)
+
+    def maybe_checkpoint(force=False):
+        if state["wal_roto"] or not (force or ckpt.due()):
+            return
+        try:
+            if force:
+                ckpt.sincronizar()
+            # copia de las claves en el bucle; a disco cuando el WAL cubra su lsn
+            foto = idem.foto(state["applied_lsn"]) if idem.activa() else None
+
+            def antes(lsn):
+                esperar_wal(lsn)
+                if foto is not None:
+                    idem.escribir_foto(IDEM_FILE, foto)
+            # se escribe en segundo plano (motor dict); mmap/sqlite, en línea
+            ckpt.checkpoint(db, state["applied_lsn"], antes=antes)
+            if force:
+                ckpt.sincronizar()
+            # segmentos del WAL ya cubiertos por el checkpoint en disco
+            # (el primary retiene los que el secondary aún no confirmó y el
+            # secondary, sus escrituras propias hasta el failback)
+            wal.truncate((emisor or receptor).retener(ckpt.lsn))
+        except Exception as e:
+            print(f"[{iso()}] ERROR en checkpoint: {e}", file=sys.stderr)
 
-        return res
+    def maybe_barrido():
+        # préstamos vencidos desde el barrido anterior, por rango del índice
+        if not barrido.due():
+            return
+        try:
+            if leer_activo(STATUS_FILE) != ROLE:
+                # no atiende: el activo notifica; solo se sigue su marca
+                barrido.avanzar(indice_de(db), ahora_us() - int(barrido.intervalo_s * 1e6))
+                return
+            inicio = time.perf_counter()
+            vencidos = barrido.ejecutar(indice_de(db), ahora_us())
+            for i in range(0, len(vencidos), VENCIDOS_LOTE):
+                lote = vencidos[i:i + VENCIDOS_LOTE]
+                if vencidos_pub:
+                    vencidos_pub.send_string("Vencidos " + json.dumps({"ts": iso(), "rol": ROLE, "prestamos": lote}))
+            if vencidos:
+                print(f"[{iso()}] Barrido de vencidos: {len(vencidos)} préstamo(s) notificados "
+                      f"en {(len(vencidos) + VENCIDOS_LOTE - 1) // VENCIDOS_LOTE} lote(s) "
+                      f"({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+        except Exception as e:
+            print(f"[{iso()}] ERROR en barrido de vencidos: {e}", file=sys.stderr)
 
-    # main loop
-    while running:
+    def atender(sobre, raw):
         try:
-            events = dict(poller.poll(500))
-            # --------------- replication messages (secondary) ---------------
-            if repl_pull and repl_pull in events:
-                try:
-                    raw = repl_pull.recv_string(flags=zmq.NOBLOCK)
-                    try:
-                        payload = json.loads(raw)
-                    except Exception:
-                        print(f"[{iso()}] Replicacion: payload no JSON: {raw}", file=sys.stderr)
+            print(f"[{iso()}] Solicitud recibida: {raw[:120]}")
+        except Exception:
+            pass
+        # ping from monitor
+        if raw.strip().lower() == "ping":
+            # "failback": vivo, pero sin las escrituras del secondary (el monitor no conmuta)
+            respuesta = "failback" if emisor is not None and emisor.bloquea() else "pong"
+            router.send_multipart(sobre + [respuesta.encode()])
+            print(f"[{iso()}] RESPUESTA PING -> {respuesta}")
+            return
+
+        # otherwise expect JSON payload for operation
+        try:
+            payload = json.loads(raw)
+        except Exception:
+            responder(sobre, {"estado":"error","mensaje":"payload no JSON"})
+            return
+
+        oper = payload.get("operacion") if isinstance(payload, dict) else None
+        # basic validation
+        if not oper:
+            responder(sobre, {"estado":"error","mensaje":"operacion faltante"})
+            return
+
+        if oper == "lote":
+            atender_lote(sobre, payload)
+            return
+
+        if oper == "estado_replicacion":
+            responder(sobre, emisor.estado() if emisor else receptor.estado(wal.lsn))
+            return
+
+        # consultas de solo lectura: se responden desde el catálogo
+        # sin WAL ni replicación (ambos roles)
+        if oper in OPERACIONES_LECTURA:
+            encolar(wal.lsn, sobre, leer(payload))
+            return
+
+        error = rechazo(payload)
+        if error is not None:
+            responder(sobre, error)
+            return
+
+        # reintento de una escritura ya aplicada: sale cuando la original es durable
+        previo = duplicado(payload)
+        if previo is not None:
+            encolar(previo[0], sobre, previo[1])
+            return
+
+        # primary: aplicar localmente; la replicación la toma cuando es durable.
+        # secondary: actúa cuando el primario no está (monitor lo marca en
+        # gc/ga_activo.txt); aplica localmente y no replica.
+        lsn, result = aplicar(payload)
+        encolar(lsn, sobre, result)
+
+    def atender_lote(sobre, payload):
+        ops = payload.get("operaciones")
+        if not isinstance(ops, list) or not ops:
+            responder(sobre, {"estado":"error","mensaje":"operaciones faltante"})
+            return
+        if len(ops) > LOTE_MAX:
+            responder(sobre, {"estado":"error","mensaje":"lote_demasiado_grande","maximo":LOTE_MAX})
+            return
+
+        # 1) clasificar: las escrituras válidas van juntas al WAL; lecturas y
+        # rechazos se resuelven en su posición en el paso 2
+        plan = []
+        escrituras = []
+        claves = {}         # request_id -> posición en el lote (repetidos dentro del lote)
+        for i, op in enumerate(ops):
+            oper = op.get("operacion") if isinstance(op, dict) else None
+            if not oper or oper == "lote":
+                plan.append({"estado":"error","mensaje":"operacion faltante" if not oper else "lote anidado"})
+            elif oper in OPERACIONES_LECTURA:
+                plan.append(leer)
+            else:
+                error = rechazo(op)
+                clave = clave_de(op)
+                if error is not None:
+                    plan.append(error)
+                elif clave in claves:
+                    plan.append(claves[clave])
+                else:
+                    previo = duplicado(op)
+                    if previo is not None:
+                        plan.append(previo[1])
                         continue
-                    # apply op directly (we also write to WAL and save DB)
-                    print(f"[{iso()}] REPL RECV raw -> {raw[:120]}")
-                    op = payload.get("op") if isinstance(payload, dict) and "op" in payload else payload
-                    print(f"[{iso()}] REPL APPLY -> {op.get('operacion')} book={op.get('book_code')} user={op.get('user_id')}")
-                    res = process_and_persist(op)
-                except zmq.Again:
-                    pass
-                except Exception as e:
-                    print(f"[{iso()}] Error procesando replicacion: {e}", file=sys.stderr)
+                    plan.append(None)
+                    escrituras.append(op)
+                    if clave is not None:
+                        claves[clave] = i
+        try:
+            lsns = iter(escribir_wal(escrituras) if escrituras else ())
+        except Exception as e:
+            print(f"[{iso()}] ERROR escribiendo WAL: {e}", file=sys.stderr)
+            responder(sobre, {"estado":"error","mensaje":"error_wal","detalle":str(e)})
+            return
+
+        # 2) aplicar en orden: una lectura ve las escrituras anteriores del lote
+        resultados = []
+        for op, paso in zip(ops, plan):
+            if paso is None:
+                resultados.append(aplicar_en_db(op, next(lsns)))
+            elif paso is leer:
+                resultados.append(leer(op))
+            elif isinstance(paso, int):
+                resultados.append(resultados[paso])     # misma clave antes en el lote
+            else:
+                resultados.append(paso)
+        # una sola respuesta cuando el lote completo es durable
+        encolar(wal.lsn, sobre, {"estado":"ok","resultados":resultados})
+
+    def absorber():
+        # failback en el primary: las escrituras que atendió el secondary
+        # entran como escrituras nuevas (un request_id ya aplicado no se repite)
+        registros = emisor.tomar_divergencia(REPL_APLICAR_MAX)
+        if not registros:
+            return
+        nuevas = []
+        for _, _, op in registros:
+            if duplicado(op) is None:
+                nuevas.append(op)
+        try:
+            lsns = escribir_wal(nuevas) if nuevas else []
+        except Exception as e:
+            print(f"[{iso()}] ERROR escribiendo WAL: {e}", file=sys.stderr)
+            return
+        for lsn, op in zip(lsns, nuevas):
+            aplicar_en_db(op, lsn)
+        print(f"[{iso()}] FAILBACK <- lsn {registros[0][0]}..{registros[-1][0]} del secondary: "
+              f"{len(nuevas)} aplicadas, {len(registros) - len(nuevas)} ya estaban")
+        emisor.aplicado_divergencia(registros[-1][0], wal.lsn, len(registros))
+
+    def replicar():
+        # secondary: aplica (a lo sumo REPL_APLICAR_MAX) lo que recibió el
+        # hilo receptor; True si quedan registros (el bucle no espera en el
+        # poll). En el primary envía el hilo emisor; el bucle solo arma los
+        # trozos de un snapshot pedido y aplica las escrituras de un failback
+        if receptor is None:
+            absorber()
+            return emisor.producir(db, wal.lsn, idem) or len(emisor.entrantes) > 0
+        if receptor.cediendo is not None:
+            receptor.confirmar_cesion()
+        snap = receptor.tomar_snapshot()
+        if snap is not None:
+            try:
+                instalar_snapshot(snap)
+            except Exception as e:
+                # el pedido sigue en pie (y anotado en disco): se vuelve a pedir
+                print(f"[{iso()}] ERROR instalando snapshot: {e}", file=sys.stderr)
+                receptor.snapshot_fallido()
+        registros = receptor.tomar(wal.lsn, REPL_APLICAR_MAX)
+        if registros:
+            try:
+                aplicar_replicados(registros)
+            except Exception as e:
+                print(f"[{iso()}] Error procesando replicacion: {e}", file=sys.stderr)
+        hasta = receptor.resincronizando()
+        if hasta is not None and hasta >= 0 and state["applied_lsn"] >= hasta:
+            # el catálogo ya es el del primary en un LSN: con un checkpoint
+            # que lo cubra, el arranque no necesita otro snapshot
+            maybe_checkpoint(force=True)
+            if ckpt.lsn >= hasta:
+                receptor.completar()
+        return receptor.pendientes() > 0
 
-            # --------------- requests (actors / monitor) ---------------
-            if rep in events:
-                raw = rep.recv_string()
+    # main loop
+    quedan = False      # registros por replicar: no se espera en el poll
+    while running:
+        try:
+            if len(pendientes) >= MAX_EN_VUELO:
+                # contrapresión: no se leen más solicitudes hasta que avance el WAL
                 try:
-                    print(f"[{iso()}] REP recibido: {raw[:120]}")
+                    wal.wait(pendientes[0][0], timeout=REQ_TIMEOUT_MS / 1000.0)
                 except Exception:
                     pass
-                # ping from monitor
-                if isinstance(raw, str) and raw.strip().lower() == "ping":
-                    try:
-                        rep.send_string("pong")
-                        print(f"[{iso()}] RESPUESTA PING -> pong")
-                    except Exception as e:
-                        print(f"[{iso()}] ERROR enviando pong: {e}", file=sys.stderr)
-                    continue
-
-                # otherwise expect JSON payload for operation
+                entregar()
+                continue
+            events = dict(poller.poll(0 if quedan else 500))
+            if aviso_r in events:
                 try:
-                    payload = json.loads(raw)
-                except Exception:
-                    rep.send_string(json.dumps({"estado":"error","mensaje":"payload no JSON"}))
-                    continue
-
-                oper = payload.get("operacion")
-                # basic validation
-                if not oper:
-                    rep.send_string(json.dumps({"estado":"error","mensaje":"operacion faltante"}))
-                    continue
-
-                # Si primary -> aplicar localmente y replicar asíncronamente
-                if ROLE == "primary":
-                    # process + persist locally (WAL + pickle)
-                    result = process_and_persist(payload)
-                    # intentar enviar replicacion asíncrona al secondary (no bloqueante)
+                    while os.read(aviso_r, 4096):
+                        pass
+                except BlockingIOError:
+                    pass
+            if not events:
+                # sin tráfico: checkpoint por tiempo si hay cambios pendientes
+                maybe_checkpoint()
+            maybe_barrido()
+            # --------------- requests (actors / monitor) ---------------
+            if router in events:
+                # se drena lo que haya llegado para que el WAL lo confirme en un solo lote
+                for _ in range(LOTE_RECV):
+                    if len(pendientes) >= MAX_EN_VUELO:
+                        break
                     try:
-                        if repl_push:
-                            # envia la misma estructura de WAL para que el secundario escriba su WAL y aplique
-                            wal_entry = {"ts": iso(), "op": payload}
-                            print(f"[{iso()}] REPL SEND -> {payload.get('operacion')} book={payload.get('book_code')} user={payload.get('user_id')} to {REPL_PUSH_ADDR}")
-                            repl_push.send_string(json.dumps(wal_entry), flags=0)
-                    except Exception as e:
-                        # no fatal; informativo en logs
-                        print(f"[{iso()}] Aviso: fallo al enviar replicacion: {e}", file=sys.stderr)
-                    # enviar respuesta al actor (result como JSON)
-                    rep.send_string(json.dumps(result))
-                    continue
-
-                # Si secondary -> se asume que actua cuando primario no está (monitor lo marca en gc/ga_activo.txt)
-                # Podemos aplicar la operación localmente (será eventualmente la nueva fuente) y no replicar.
-                else:
-                    result = process_and_persist(payload)
-                    rep.send_string(json.dumps(result))
-                    continue
+                        *sobre, raw = router.recv_multipart(flags=zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                    atender(sobre, raw.decode("utf-8", "replace"))
+            entregar()
+            # --------------- replicación (ambos roles) ---------------
+            quedan = replicar()
+            # checkpoint incremental solo al alcanzar el umbral (ops/tiempo)
+            if events:
+                maybe_checkpoint()
 
         except zmq.ZMQError as e:
             # errores ZMQ -> log y continue
@@ -323,10 +789,35 @@ def main():
             time.sleep(0.1)
 
     # cierre ordenado
+    wal.close()
+    if emisor is not None:
+        emisor.drenar(2.0)      # lo que el flush final hizo durable
+    print(f"[{iso()}] WAL stats: {wal.stats}")
+    try:
+        entregar()      # respuestas que quedaron confirmadas por el flush final
+    except Exception as e:
+        print(f"[{iso()}] ERROR enviando respuestas finales: {e}", file=sys.stderr)
+    if state["wal_roto"]:
+        print(f"[{iso()}] Sin checkpoint final: el WAL falló y el catálogo en memoria no es durable", file=sys.stderr)
+    else:
+        maybe_checkpoint(force=True)
+        print(f"[{iso()}] Checkpoint stats: {ckpt.stats}")
+    print(f"[{iso()}] Barrido de vencidos stats: {barrido.stats}")
+    if idem.activa():
+        print(f"[{iso()}] Idempotencia stats: {idem.stats}")
+    print(f"[{iso()}] Replicación: {emisor.estado() if emisor else receptor.estado(wal.lsn)}")
+    if not state["wal_roto"] and ckpt.exportar:
+        try:
+            # pickle completo para herramientas externas (verify_replication, pruebas)
+            ckpt.export_full(db, state["applied_lsn"])
+        except Exception as e:
+            print(f"[{iso()}] ERROR guardando DB: {e}", file=sys.stderr)
     try:
-        rep.close(linger=0)
-        if repl_push: repl_push.close(linger=0)
-        if repl_pull: repl_pull.close(linger=0)
+        router.close(linger=1000)
+        (emisor or receptor).cerrar()
+        if vencidos_pub: vencidos_pub.close(linger=0)
+        os.close(aviso_r)
+        os.close(aviso_w)
         ctx.term()
     except Exception:
         pass
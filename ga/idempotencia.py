@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# archivo: ga/idempotencia.py
+#
+# Caché de claves de idempotencia del GA.
+#
+# Los PS etiquetan cada solicitud con request_id (ver
+# evidencias_failover/metricas_clientes.txt) y el GC y los actores lo
+# reenvían en la operación. Un reintento (timeout en contactar_ga, failover)
+# llega con la misma clave: el GA responde el resultado guardado sin volver
+# a escribir en el WAL ni en el catálogo.
+#
+# La tabla es acotada: LRU por uso con un máximo de claves y TTL desde la
+# primera aplicación. Sobrevive a reinicios y a failover sin un log propio:
+#   - la clave viaja dentro de la operación, así que el WAL (y la replicación
+#     al secondary) ya la llevan: el replay de la cola la reconstruye con el
+#     mismo resultado que dio la operación original;
+#   - la parte ya cubierta por el checkpoint (el WAL se trunca) se guarda en
+#     GA_DB_FILE.idem en cada checkpoint: la copia se toma en el bucle y se
+#     escribe cuando el WAL cubre su LSN (antes() del checkpoint), porque una
+#     clave cuya operación podría perderse en una caída no debe sobrevivirla.
+# Las operaciones de la cola que el replay omite por estar en el snapshot
+# (slots del motor mmap) y no están en GA_DB_FILE.idem se recuerdan sin
+# resultado: el duplicado recibe "operacion ya aplicada".
+#
+# Config via env (ver ga/ga.py):
+#   GA_IDEM_MAX     claves recordadas            default 10000 (0: apagado)
+#   GA_IDEM_TTL_S   segundos que vale una clave  default 300
+
+import os
+import sys
+import time
+import pickle
+from collections import OrderedDict
+from datetime import datetime
+
+from checkpoint import _atomic_dump
+
+CAMPO = "request_id"
+
+def iso():
+    return datetime.utcnow().isoformat() + "Z"
+
+def clave_de(op):
+    # clave de idempotencia de una operación (None si no trae)
+    k = op.get(CAMPO) if isinstance(op, dict) else None
+    return str(k) if k not in (None, "") else None
+
+class CacheIdempotencia:
+    """
+    buscar(clave)               -> (lsn, resultado) o None; resultado None si no se conoce
+    guardar(clave, lsn, res)    -> recuerda el resultado de la operación con ese LSN
+    foto(lsn)                   -> copia de las claves vigentes (en el bucle)
+    escribir_foto(path, foto)   -> la guarda en disco (cuando el WAL cubre su lsn)
+    cargar_archivo(path)        -> claves vigentes del snapshot
+    cargar_foto(foto)           -> reemplaza las claves por las de una foto
+    """
+
+    def __init__(self, maximo=10000, ttl_s=300.0):
+        self.maximo = max(int(maximo), 0)
+        self.ttl_s = float(ttl_s)
+        self._claves = OrderedDict()    # clave -> (lsn, resultado, t_epoch)
+        self.stats = {"duplicados": 0, "guardadas": 0, "expiradas": 0, "desalojadas": 0}
+
+    def __len__(self):
+        return len(self._claves)
+
+    def activa(self):
+        return self.maximo > 0
+
+    def buscar(self, clave):
+        e = self._claves.get(clave)
+        if e is None:
+            return None
+        if time.time() - e[2] > self.ttl_s:
+            del self._claves[clave]
+            self.stats["expiradas"] += 1
+            return None
+        self._claves.move_to_end(clave)
+        self.stats["duplicados"] += 1
+        return e[0], e[1]
+
+    def guardar(self, clave, lsn, resultado, t=None):
+        if not self.maximo or clave is None:
+            return
+        previa = self._claves.get(clave)
+        if resultado is None and previa is not None:
+            return      # no se pisa un resultado conocido con uno desconocido
+        self._claves[clave] = (lsn, resultado, time.time() if t is None else t)
+        self._claves.move_to_end(clave)
+        self.stats["guardadas"] += 1
+        while len(self._claves) > self.maximo:
+            self._claves.popitem(last=False)
+            self.stats["desalojadas"] += 1
+
+    def foto(self, lsn):
+        ahora = time.time()
+        return {"lsn": lsn, "claves": [(k, e) for k, e in self._claves.items()
+                                       if e[0] <= lsn and ahora - e[2] <= self.ttl_s]}
+
+    @staticmethod
+    def escribir_foto(path, foto):
+        _atomic_dump(path, foto)
+
+    def cargar_archivo(self, path):
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+        except Exception as e:
+            print(f"[{iso()}] Aviso: no se pudo leer {path}: {e} (claves de idempotencia vacías)",
+                  file=sys.stderr)
+            return 0
+        return self.cargar_foto(data)
+
+    def cargar_foto(self, data):
+        # reemplaza las claves por las vigentes de una foto (archivo o snapshot del primary)
+        self._claves.clear()
+        ahora = time.time()
+        n = 0
+        for clave, (lsn, resultado, t) in data.get("claves", []):
+            if ahora - t <= self.ttl_s:
+                self.guardar(clave, lsn, resultado, t)
+                n += 1
+        return n
+
+def cache_from_env():
+    return CacheIdempotencia(int(os.getenv("GA_IDEM_MAX", "10000")),
+                             float(os.getenv("GA_IDEM_TTL_S", "300")))
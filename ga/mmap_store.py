@@ -0,0 +1,581 @@
+#!/usr/bin/env python3
+# archivo: ga/mmap_store.py
+#
+# Motor de almacenamiento del catálogo sobre un archivo mapeado en memoria
+# (GA_STORAGE=mmap). Alternativa al dict en memoria + pickles por shard de
+# ga/checkpoint.py:
+#   - el arranque solo mapea el archivo y lee la cabecera (no deserializa
+#     el catálogo), así que no depende del tamaño del catálogo;
+#   - cada libro vive en un slot de tamaño fijo, alineado para que un slot
+#     nunca cruce una página: actualizar un libro toca una sola página;
+#   - el índice code -> slot es una tabla hash (direccionamiento abierto)
+#     dentro del mismo archivo; los índices user_id -> {book_code} y de
+#     vencimientos (ga/vencimientos.py) viven en memoria y se arman en la
+#     primera consulta.
+#
+# Estructura del archivo (GA_MMAP_FILE, default GA_DB_FILE con .mmap):
+#   página 0        cabecera   magic, versión, slot_bytes, capacidad,
+#                              index_cap, libros, lsn, sucio
+#   índice          index_cap entradas u32 (slot + 1; 0 = vacía)
+#   slots           capacidad x slot_bytes
+#
+# Slot (slot_bytes, potencia de 2 >= 256):
+#   lsn u64 | estado u8 | n_prestamos u8 | len_code u8 | len_title u8 |
+#   available i32 | code 32 B | title 96 B | préstamos de 36 B:
+#       len_user u8 | flags u8 | renovaciones u16 | due (epoch us) i64 | user 24 B
+#   Los registros que no encajan en esos campos (claves extra, títulos
+#   largos, fechas no ISO...) se guardan como pickle en el mismo slot
+#   (estado PICKLE); si tampoco caben, el archivo se reescribe con slots
+#   más grandes.
+#
+# Recuperación: las páginas modificadas pueden llegar al disco en cualquier
+# orden y antes del checkpoint, por eso cada slot guarda el LSN de la última
+# operación que lo modificó y el replay omite las operaciones con
+# lsn <= lsn del slot (como el pageLSN de ARIES). La cabecera guarda el LSN
+# del último checkpoint (msync completo) y un indicador "sucio" que se
+# enciende con la primera escritura posterior; si el GA cae con el archivo
+# sucio, al abrirlo se reconstruye índice y contador recorriendo los slots.
+#
+# Se asume que la escritura de una página de 4 KiB es atómica (un slot
+# nunca queda a medias).
+#
+# Write-ahead: una página modificada del mapa puede llegar al disco (o
+# sobrevivir a un kill -9 en la caché de páginas) en cualquier momento, así
+# que un slot no puede llevar una operación cuyo lote del WAL aún no es
+# durable: el GA llama volcar(durable_lsn) y hasta entonces la versión nueva
+# del libro vive en memoria (put diferido), visible para las lecturas. Si
+# aun así un slot queda por delante del WAL (p. ej. WAL borrado a mano), la
+# recuperación expone lsn_slots y el GA continúa el WAL desde ahí para no
+# reutilizar LSN que el replay tomaría como ya aplicados.
+
+import os
+import sys
+import mmap
+import time
+import zlib
+import struct
+import pickle
+from collections import deque
+from datetime import datetime
+from collections.abc import MutableMapping
+
+from checkpoint import cargar_origen, shard_of, _atomic_dump, marcar_lsn_pickle
+from catalogo import usuarios_de, indexar_usuarios
+from vencimientos import IndiceVencimientos, vencimientos_de
+from wal_format import iso_to_us, us_to_iso
+
+MAGIC = b"GAMMAP\x00\x01"
+VERSION = 1
+PAGINA = 4096
+
+HDR = struct.Struct("<8sIIIIIQB")   # magic, version, slot_bytes, capacidad, index_cap, libros, lsn, sucio
+OFF_LIBROS, OFF_LSN, OFF_SUCIO = 24, 28, 36
+U32 = struct.Struct("<I")
+U64 = struct.Struct("<Q")
+
+SLOT = struct.Struct("<QBBBBi")     # lsn, estado, n_prestamos, len_code, len_title, available
+PRESTAMO = struct.Struct("<BBHq")   # len_user, flags, renovaciones, due_us
+CODE_MAX, TITLE_MAX, USER_MAX = 32, 96, 24
+OFF_ESTADO, OFF_LEN_CODE = 8, 10
+OFF_CODE = SLOT.size                         # 16
+OFF_TITLE = OFF_CODE + CODE_MAX              # 48
+OFF_PRESTAMOS = OFF_TITLE + TITLE_MAX        # 144
+OFF_PICKLE = OFF_TITLE                       # len u32 + pickle
+PRESTAMO_BYTES = PRESTAMO.size + USER_MAX    # 36
+
+LIBRE, FIJO, PICKLE = 0, 1, 2
+F_RENOVATIONS = 0x01    # préstamo con clave "renovations" (generate_db.py) en vez de "renovaciones"
+
+def iso():
+    return datetime.utcnow().isoformat() + "Z"
+
+def _pot2(n, minimo):
+    p = minimo
+    while p < n:
+        p *= 2
+    return p
+
+def _ceil_pagina(n):
+    return (n + PAGINA - 1) // PAGINA * PAGINA
+
+# ----------------- codificación de slots -----------------
+def _codificar_fijo(code_b, code, rec, lsn, slot_bytes):
+    # campos fijos; None si el registro no tiene la forma esperada
+    if type(rec) is not dict or rec.keys() != {"code", "title", "available", "loans"}:
+        return None
+    title, avail, loans = rec["title"], rec["available"], rec["loans"]
+    if rec["code"] != code or type(title) is not str or type(avail) is not int or type(loans) is not dict:
+        return None
+    title_b = title.encode("utf-8")
+    if len(title_b) > TITLE_MAX or not -2**31 <= avail < 2**31:
+        return None
+    if len(loans) > 255 or OFF_PRESTAMOS + len(loans) * PRESTAMO_BYTES > slot_bytes:
+        return None
+    partes = [SLOT.pack(lsn, FIJO, len(loans), len(code_b), len(title_b), avail),
+              code_b.ljust(CODE_MAX, b"\0"), title_b.ljust(TITLE_MAX, b"\0")]
+    for user, loan in loans.items():
+        if type(user) is not str or type(loan) is not dict:
+            return None
+        user_b = user.encode("utf-8")
+        if len(user_b) > USER_MAX:
+            return None
+        claves = loan.keys()
+        if claves == {"due", "renovaciones"}:
+            flags, renov = 0, loan["renovaciones"]
+        elif claves == {"due", "renovations"}:
+            flags, renov = F_RENOVATIONS, loan["renovations"]
+        else:
+            return None
+        due = iso_to_us(loan["due"])
+        if due is None or type(renov) is not int or not 0 <= renov < 65536:
+            return None
+        partes.append(PRESTAMO.pack(len(user_b), flags, renov, due))
+        partes.append(user_b.ljust(USER_MAX, b"\0"))
+    return b"".join(partes)
+
+def _codificar(code, rec, lsn, slot_bytes):
+    # -> bytes del slot, o None si no cabe ni como pickle
+    code_b = code.encode("utf-8")
+    data = _codificar_fijo(code_b, code, rec, lsn, slot_bytes)
+    if data is not None:
+        return data
+    blob = pickle.dumps(rec, protocol=pickle.HIGHEST_PROTOCOL)
+    if OFF_PICKLE + U32.size + len(blob) > slot_bytes:
+        return None
+    return (SLOT.pack(lsn, PICKLE, 0, len(code_b), 0, 0) + code_b.ljust(CODE_MAX, b"\0")
+            + U32.pack(len(blob)) + blob)
+
+def _bytes_necesarios(code, rec):
+    blob = pickle.dumps(rec, protocol=pickle.HIGHEST_PROTOCOL)
+    return OFF_PICKLE + U32.size + len(blob)
+
+def _decodificar(mm, off):
+    # -> (lsn, code, registro)
+    lsn, estado, n, len_code, len_title, avail = SLOT.unpack_from(mm, off)
+    code = str(mm[off + OFF_CODE:off + OFF_CODE + len_code], "utf-8")
+    if estado == PICKLE:
+        (largo,) = U32.unpack_from(mm, off + OFF_PICKLE)
+        inicio = off + OFF_PICKLE + U32.size
+        return lsn, code, pickle.loads(mm[inicio:inicio + largo])
+    title = str(mm[off + OFF_TITLE:off + OFF_TITLE + len_title], "utf-8")
+    loans = {}
+    p = off + OFF_PRESTAMOS
+    for _ in range(n):
+        len_user, flags, renov, due = PRESTAMO.unpack_from(mm, p)
+        user = str(mm[p + PRESTAMO.size:p + PRESTAMO.size + len_user], "utf-8")
+        clave = "renovations" if flags & F_RENOVATIONS else "renovaciones"
+        loans[user] = {"due": us_to_iso(due), clave: renov}
+        p += PRESTAMO_BYTES
+    return lsn, code, {"code": code, "title": title, "available": avail, "loans": loans}
+
+# ----------------- catálogo -----------------
+class MmapCatalog(MutableMapping):
+    """
+    Catálogo {book_code: registro} respaldado por el archivo mapeado.
+
+    db[code] devuelve una copia decodificada del registro; los cambios se
+    guardan con db[code] = registro o put(code, registro, lsn), que además
+    sella el slot con el LSN de la operación.
+    """
+
+    def __init__(self, path, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self._f = open(path, "rb" if readonly else "r+b")
+        try:
+            acceso = mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE
+            self.mm = mmap.mmap(self._f.fileno(), 0, access=acceso)
+        except Exception:
+            self._f.close()
+            raise
+        magic, version, self.slot_bytes, self.capacidad, self.index_cap, _, lsn, _ = HDR.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path}: no es un catálogo mmap del GA")
+        self.off_index = PAGINA
+        self.off_slots = PAGINA + _ceil_pagina(self.index_cap * U32.size)
+        if len(self.mm) < self.off_slots + self.capacidad * self.slot_bytes:
+            self.close()
+            raise ValueError(f"{path}: archivo truncado")
+        self.recuperado = False
+        self._por_usuario = None     # user_id -> {book_code}; se arma en la primera consulta
+        self._vencimientos = None    # IndiceVencimientos; ídem
+        self.lsn_slots = lsn         # LSN más alto de los slots (tras _recuperar)
+        # puts diferidos hasta que el WAL los cubra: code -> (pickle, lsn)
+        self.durable_lsn = None      # None: los puts escriben el slot directamente
+        self._diferidos = {}
+        self._cola = deque()         # (lsn, code) en orden de LSN
+        self._nuevos = 0             # libros diferidos que aún no tienen slot
+        if self.mm[OFF_SUCIO] and not readonly:
+            self._recuperar()
+
+    # ----------------- creación / reescritura -----------------
+    @staticmethod
+    def crear(path, items, lsn, slot_bytes=512):
+        # items: [(code, registro, lsn_slot)]; escribe un archivo nuevo completo
+        items = list(items)
+        for code, rec, _ in items:
+            if not isinstance(code, str) or len(code.encode("utf-8")) > CODE_MAX:
+                raise ValueError(f"book_code no soportado por el motor mmap: {code!r}")
+            if _codificar(code, rec, 0, slot_bytes) is None:
+                slot_bytes = _pot2(_bytes_necesarios(code, rec), slot_bytes)
+        capacidad = _pot2(2 * len(items), 1024)
+        index_cap = 2 * capacidad
+        off_slots = PAGINA + _ceil_pagina(index_cap * U32.size)
+        tmp = path + ".tmp"
+        with open(tmp, "w+b") as f:
+            f.truncate(off_slots + capacidad * slot_bytes)
+            mm = mmap.mmap(f.fileno(), 0)
+            HDR.pack_into(mm, 0, MAGIC, VERSION, slot_bytes, capacidad, index_cap, len(items), lsn, 0)
+            mask = index_cap - 1
+            for s, (code, rec, slot_lsn) in enumerate(items):
+                data = _codificar(code, rec, slot_lsn, slot_bytes)
+                off = off_slots + s * slot_bytes
+                mm[off:off + len(data)] = data
+                i = zlib.crc32(code.encode("utf-8")) & mask
+                while U32.unpack_from(mm, PAGINA + 4 * i)[0]:
+                    i = (i + 1) & mask
+                U32.pack_into(mm, PAGINA + 4 * i, s + 1)
+            mm.flush()
+            mm.close()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _rehacer(self, slot_bytes=None):
+        # reescribe el archivo (más capacidad y/o slots más grandes) y lo vuelve a mapear
+        items = [(code, rec, lsn) for lsn, code, rec in self._slots()]
+        lsn = self.lsn
+        memoria = (self._por_usuario, self._vencimientos, self.lsn_slots,
+                   self.durable_lsn, self._diferidos, self._cola, self._nuevos)
+        self.close()
+        MmapCatalog.crear(self.path, items, lsn, slot_bytes or self.slot_bytes)
+        self.__init__(self.path)
+        (self._por_usuario, self._vencimientos, self.lsn_slots,
+         self.durable_lsn, self._diferidos, self._cola, self._nuevos) = memoria
+
+    def _recuperar(self):
+        # el GA cayó con escrituras sin checkpoint: índice y contador pueden no
+        # coincidir con los slots que llegaron al disco; se reescribe compacto
+        items = []
+        for s in range(self.capacidad):
+            off = self._off(s)
+            if self.mm[off + OFF_ESTADO] != LIBRE:
+                lsn, code, rec = _decodificar(self.mm, off)
+                items.append((code, rec, lsn))
+        vistos = {}
+        for code, rec, lsn in items:
+            if code not in vistos or lsn >= vistos[code][2]:
+                vistos[code] = (code, rec, lsn)
+        lsn = self.lsn
+        print(f"[{iso()}] {self.path} sin cierre limpio: reconstruyendo índice ({len(vistos)} libros)")
+        self.close()
+        MmapCatalog.crear(self.path, vistos.values(), lsn, self.slot_bytes)
+        self.__init__(self.path)
+        self.recuperado = True
+        self.lsn_slots = max([lsn] + [v[2] for v in vistos.values()])
+
+    def close(self):
+        try:
+            self.mm.close()
+        finally:
+            self._f.close()
+
+    # ----------------- cabecera -----------------
+    @property
+    def lsn(self):
+        return U64.unpack_from(self.mm, OFF_LSN)[0]
+
+    def _ensuciar(self):
+        if not self.mm[OFF_SUCIO]:
+            self.mm[OFF_SUCIO] = 1
+
+    def flush(self):
+        self.mm.flush()
+
+    def marcar_checkpoint(self, lsn):
+        # llamar después de flush(): todos los slots cubren hasta lsn
+        U64.pack_into(self.mm, OFF_LSN, lsn)
+        self.mm[OFF_SUCIO] = 0
+        self.mm.flush(0, PAGINA)
+
+    # ----------------- índice -----------------
+    def _off(self, s):
+        return self.off_slots + s * self.slot_bytes
+
+    def _buscar(self, code_b):
+        # -> (posición en el índice, slot o -1)
+        mask = self.index_cap - 1
+        i = zlib.crc32(code_b) & mask
+        n = len(code_b)
+        mm = self.mm
+        while True:
+            e = U32.unpack_from(mm, self.off_index + 4 * i)[0]
+            if e == 0:
+                return i, -1
+            off = self._off(e - 1)
+            if (mm[off + OFF_ESTADO] != LIBRE and mm[off + OFF_LEN_CODE] == n
+                    and mm[off + OFF_CODE:off + OFF_CODE + n] == code_b):
+                return i, e - 1
+            i = (i + 1) & mask
+
+    def _slot(self, code):
+        if not isinstance(code, str):
+            return -1
+        return self._buscar(code.encode("utf-8"))[1]
+
+    def _n_slots(self):
+        return U32.unpack_from(self.mm, OFF_LIBROS)[0]
+
+    def _slots(self):
+        for s in range(self._n_slots()):
+            yield _decodificar(self.mm, self._off(s))
+
+    # ----------------- API -----------------
+    def slot_lsn(self, code):
+        s = self._slot(code)
+        return U64.unpack_from(self.mm, self._off(s))[0] if s >= 0 else 0
+
+    def put(self, code, record, lsn=None):
+        if not isinstance(code, str) or len(code.encode("utf-8")) > CODE_MAX:
+            raise ValueError(f"book_code no soportado por el motor mmap: {code!r}")
+        code_b = code.encode("utf-8")
+        pend = self._diferidos.get(code)
+        s = self._buscar(code_b)[1] if pend is None else -1
+        if lsn is None:
+            lsn = pend[1] if pend is not None else (U64.unpack_from(self.mm, self._off(s))[0] if s >= 0 else 0)
+        if self._por_usuario is not None or self._vencimientos is not None:
+            anterior = self.get(code)
+            if self._por_usuario is not None:
+                indexar_usuarios(self._por_usuario, code, usuarios_de(anterior), usuarios_de(record))
+            if self._vencimientos is not None:
+                self._vencimientos.actualizar(code, vencimientos_de(anterior), vencimientos_de(record))
+        if self.durable_lsn is not None and lsn > self.durable_lsn:
+            # el WAL todavía no cubre lsn: el slot se escribe en volcar()
+            if pend is None and s < 0:
+                self._nuevos += 1
+            self._diferidos[code] = (pickle.dumps(record, pickle.HIGHEST_PROTOCOL), lsn)
+            self._cola.append((lsn, code))
+            return
+        self._escribir(code_b, code, record, lsn)
+
+    def volcar(self, durable_lsn):
+        # escribe en los slots los puts diferidos que el WAL ya cubre
+        if self.durable_lsn is None or durable_lsn > self.durable_lsn:
+            self.durable_lsn = durable_lsn
+        n = 0
+        while self._cola and self._cola[0][0] <= self.durable_lsn:
+            _, code = self._cola.popleft()
+            pend = self._diferidos.get(code)
+            if pend is None or pend[1] > self.durable_lsn:
+                continue    # hay una versión más nueva; sale con su propio lsn
+            del self._diferidos[code]
+            code_b = code.encode("utf-8")
+            if self._buscar(code_b)[1] < 0:
+                self._nuevos -= 1
+            self._escribir(code_b, code, pickle.loads(pend[0]), pend[1])
+            n += 1
+        return n
+
+    def _escribir(self, code_b, code, record, lsn):
+        pos, s = self._buscar(code_b)
+        data = _codificar(code, record, lsn, self.slot_bytes)
+        if data is None:
+            self._rehacer(slot_bytes=_pot2(_bytes_necesarios(code, record), self.slot_bytes))
+            return self._escribir(code_b, code, record, lsn)
+        if s < 0 and self._n_slots() >= self.capacidad:
+            self._rehacer()
+            return self._escribir(code_b, code, record, lsn)
+        self._ensuciar()
+        if s >= 0:
+            off = self._off(s)
+            self.mm[off:off + len(data)] = data
+            return
+        s = self._n_slots()
+        off = self._off(s)
+        self.mm[off:off + len(data)] = data
+        U32.pack_into(self.mm, self.off_index + 4 * pos, s + 1)
+        U32.pack_into(self.mm, OFF_LIBROS, s + 1)
+
+    def libros_de_usuario(self, user):
+        # el índice se arma al primer uso para no recorrer el archivo al arrancar
+        if self._por_usuario is None:
+            indice = {}
+            for code, rec in self.items():
+                indexar_usuarios(indice, code, set(), usuarios_de(rec))
+            self._por_usuario = indice
+        return self._por_usuario.get(user, ())
+
+    def indice_vencimientos(self):
+        if self._vencimientos is None:
+            self._vencimientos = IndiceVencimientos.desde_items(self.items())
+        return self._vencimientos
+
+    def __getitem__(self, code):
+        pend = self._diferidos.get(code)
+        if pend is not None:
+            return pickle.loads(pend[0])
+        s = self._slot(code)
+        if s < 0:
+            raise KeyError(code)
+        return _decodificar(self.mm, self._off(s))[2]
+
+    def __setitem__(self, code, record):
+        self.put(code, record)
+
+    def __delitem__(self, code):
+        raise TypeError("el catálogo mmap no admite borrar libros")
+
+    def __contains__(self, code):
+        return code in self._diferidos or self._slot(code) >= 0
+
+    def __len__(self):
+        return self._n_slots() + self._nuevos
+
+    def _sin_slot(self):
+        # libros diferidos que todavía no están en el archivo
+        return [code for code in self._diferidos if self._slot(code) < 0] if self._nuevos else []
+
+    def __iter__(self):
+        nuevos = self._sin_slot()
+        for s in range(self._n_slots()):
+            off = self._off(s)
+            n = self.mm[off + OFF_LEN_CODE]
+            yield str(self.mm[off + OFF_CODE:off + OFF_CODE + n], "utf-8")
+        yield from nuevos
+
+    def items(self):
+        if not self._diferidos:
+            return [(code, rec) for _, code, rec in self._slots()]
+        out = [(code, pickle.loads(self._diferidos[code][0]) if code in self._diferidos else rec)
+               for _, code, rec in self._slots()]
+        return out + [(code, pickle.loads(self._diferidos[code][0])) for code in self._sin_slot()]
+
+class CoberturaMmap:
+    """Cobertura serializable para el replay paralelo: LSN del checkpoint y LSN por slot."""
+
+    def __init__(self, path, lsn):
+        self.path = path
+        self.lsn = lsn
+        self._cat = None
+
+    def __getstate__(self):
+        return {"path": self.path, "lsn": self.lsn, "_cat": None}
+
+    def covers(self, code, lsn):
+        if lsn <= self.lsn:
+            return True
+        if self._cat is None:
+            self._cat = MmapCatalog(self.path, readonly=True)
+        return lsn <= self._cat.slot_lsn(code)
+
+# ----------------- checkpoints -----------------
+class MmapCheckpointer:
+    """
+    Misma interfaz que checkpoint.Checkpointer para el GA. Con el archivo
+    mapeado los libros ya están escritos en su slot: un checkpoint es un
+    msync completo + el nuevo LSN en la cabecera.
+    """
+
+    def __init__(self, db_file, path, every_ops=1000, every_s=5.0, slot_bytes=512):
+        self.db_file = db_file
+        self.path = path
+        self.dir = path
+        self.every_ops = max(int(every_ops), 1)
+        self.every_s = float(every_s)
+        self.slot_bytes = _pot2(int(slot_bytes), 256)
+        self.lsn = 0
+        self.lsn_max = 0        # LSN más alto escrito en los slots
+        self.from_shards = True
+        self.externo = False
+        self.exportar = False
+        self.db = None
+        self._ops = 0
+        self._last = time.monotonic()
+        self.stats = {"checkpoints": 0, "operaciones": 0}
+
+    def load(self):
+        if os.path.exists(self.path):
+            if self._fuente_mas_nueva():
+                print(f"[{iso()}] {self.db_file} o sus shards son más recientes que {self.path}; se reimporta")
+            else:
+                try:
+                    self.db = MmapCatalog(self.path)
+                except (ValueError, OSError, struct.error) as e:
+                    print(f"[{iso()}] Error abriendo {self.path}: {e}; se reimporta", file=sys.stderr)
+                    os.replace(self.path, self.path + ".corrupto")
+        if self.db is None:
+            self.db = self._importar()
+        self.lsn = self.db.lsn
+        self.lsn_max = self.db.lsn_slots
+        print(f"[{iso()}] DB mapeada desde {self.path} ({len(self.db)} libros, "
+              f"slots de {self.db.slot_bytes} B, lsn={self.lsn})")
+        return self.db
+
+    def _fuente_mas_nueva(self):
+        t = os.path.getmtime(self.path)
+        fuentes = [self.db_file, os.path.join(self.db_file + ".d", "manifest.json")]
+        return any(os.path.exists(p) and os.path.getmtime(p) > t for p in fuentes)
+
+    def _importar(self):
+        # primer arranque con el motor mmap: se parte de los shards o del pickle
+        db, lsn, cob, self.externo = cargar_origen(self.db_file)
+
+        def lsn_de(code):
+            if cob is None:
+                return 0
+            if code in cob.code_lsn:
+                return cob.code_lsn[code]
+            return cob.shard_lsn[shard_of(code, cob.shards)]
+
+        inicio = time.perf_counter()
+        MmapCatalog.crear(self.path, [(c, r, lsn_de(c)) for c, r in db.items()], lsn, self.slot_bytes)
+        print(f"[{iso()}] Catálogo importado a {self.path} ({len(db)} libros) "
+              f"en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+        return MmapCatalog(self.path)
+
+    def track(self, db, dirty=True):
+        pass
+
+    def covers(self, code, lsn):
+        return lsn <= self.lsn or lsn <= self.db.slot_lsn(code)
+
+    def coverage(self):
+        return CoberturaMmap(self.path, self.lsn)
+
+    def mark(self, code):
+        self._ops += 1
+
+    def pending(self):
+        return self._ops
+
+    def due(self):
+        if not self._ops:
+            return False
+        return self._ops >= self.every_ops or (time.monotonic() - self._last) >= self.every_s
+
+    def checkpoint(self, db, lsn, antes=None):
+        if not self._ops and lsn <= self.lsn:
+            return 0
+        if antes is not None:
+            antes(lsn)
+            # el WAL ya cubre lsn: los slots diferidos pueden escribirse
+            db.volcar(lsn)
+        db.flush()
+        db.marcar_checkpoint(lsn)
+        n = self._ops
+        self.lsn = lsn
+        self.stats["checkpoints"] += 1
+        self.stats["operaciones"] += n
+        self._ops = 0
+        self._last = time.monotonic()
+        return n
+
+    def sincronizar(self, timeout=None):
+        return True
+
+    def export_full(self, db, lsn):
+        # pickle completo para herramientas; el archivo mapeado se marca como
+        # más reciente para no reimportar ese pickle en el próximo arranque
+        _atomic_dump(self.db_file, dict(db.items()))
+        marcar_lsn_pickle(self.db_file, lsn)
+        os.utime(self.path)
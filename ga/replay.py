@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# archivo: ga/replay.py
+#
+# Replay de la cola del WAL, secuencial o en paralelo entre núcleos.
+#
+# Las operaciones sobre distintos book_code son independientes, así que el
+# replay paralelo:
+#   1) decodifica cada segmento del WAL en un proceso del pool y agrupa las
+#      operaciones por libro (manteniendo el orden por LSN dentro del libro)
+#      descartando las que el checkpoint ya incluye;
+#   2) reparte los libros en particiones (crc32 del código) y aplica cada
+#      partición en un proceso sobre una copia de solo esos registros;
+#   3) fusiona los registros resultantes en el catálogo.
+#
+# De las operaciones con clave de idempotencia (ga/idempotencia.py) se
+# devuelve el resultado ("idem": {clave: (lsn, resultado)}) para que el GA
+# reconstruya la caché; las omitidas por el checkpoint van sin resultado.
+#
+# El paralelismo de decodificación depende del número de segmentos
+# (GA_WAL_SEGMENT_BYTES); con colas chicas se usa el camino secuencial,
+# porque arrancar el pool cuesta más que el replay.
+#
+# Config via env:
+#   GA_REPLAY_WORKERS          procesos (default: núcleos; 0/1 = secuencial)
+#   GA_REPLAY_PARALLEL_BYTES   tamaño mínimo de la cola para paralelizar
+#                              (default 4 MiB)
+
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from checkpoint import shard_of
+from db_ops import apply_op_to_db, store_record
+from idempotencia import clave_de
+from wal import wal_files, iter_wal
+from wal_format import iter_file
+
+def iso():
+    return datetime.utcnow().isoformat() + "Z"
+
+# ----------------- tareas del pool -----------------
+def _decode_segment(args):
+    # -> ({book_code: [(lsn, op), ...]}, total, omitidas, primer_lsn, ultimo_lsn,
+    #     [(clave, lsn)] de las omitidas)
+    path, after_lsn, cobertura = args
+    por_libro = {}
+    claves = []
+    total = omitidas = 0
+    primero = ultimo = None
+    for lsn, entry in iter_file(path, after_lsn=after_lsn):
+        if lsn is None:
+            continue
+        total += 1
+        primero = lsn if primero is None else primero
+        ultimo = lsn
+        op = entry.get("op") or {}
+        code = op.get("book_code")
+        if cobertura.covers(code, lsn):
+            omitidas += 1
+            clave = clave_de(op)
+            if clave is not None:
+                claves.append((clave, lsn))
+            continue
+        lst = por_libro.get(code)
+        if lst is None:
+            por_libro[code] = [(lsn, op)]
+        else:
+            lst.append((lsn, op))
+    return por_libro, total, omitidas, primero, ultimo, claves
+
+def _apply_partition(args):
+    # -> (registros modificados, aplicadas, errores, {clave: (lsn, resultado)})
+    registros, por_libro = args
+    aplicadas = errores = 0
+    idem = {}
+    for code, ops in por_libro.items():
+        for lsn, op in ops:
+            try:
+                res = apply_op_to_db(registros, op)
+                aplicadas += 1
+            except Exception as e:
+                errores += 1
+                print(f"[{iso()}] Error replay lsn={lsn}: {e} | op: {op}", file=sys.stderr)
+                continue
+            clave = clave_de(op)
+            if clave is not None:
+                idem[clave] = (lsn, res)
+    return registros, aplicadas, errores, idem
+
+# ----------------- API -----------------
+def replay_tail(base, db, after_lsn, cobertura, workers=None, min_bytes=None):
+    """
+    Aplica sobre db las operaciones del WAL con lsn > after_lsn que la
+    cobertura del checkpoint no incluye. Devuelve un dict de estadísticas
+    con los libros tocados ("libros") para que el llamador los marque.
+    """
+    if workers is None:
+        workers = int(os.getenv("GA_REPLAY_WORKERS", str(os.cpu_count() or 1)))
+    if min_bytes is None:
+        min_bytes = int(os.getenv("GA_REPLAY_PARALLEL_BYTES", str(4 * 1024 * 1024)))
+
+    files = wal_files(base, after_lsn)
+    tail_bytes = sum(os.path.getsize(p) for p in files)
+    inicio = time.perf_counter()
+    if workers > 1 and len(files) > 1 and tail_bytes >= min_bytes:
+        st = _replay_parallel(files, db, after_lsn, cobertura, workers)
+    else:
+        st = _replay_sequential(base, db, after_lsn, cobertura)
+    st["segundos"] = time.perf_counter() - inicio
+    st["bytes"] = tail_bytes
+    st["ops_s"] = st["leidas"] / st["segundos"] if st["segundos"] > 0 else 0.0
+    return st
+
+def _replay_sequential(base, db, after_lsn, cobertura):
+    st = {"modo": "secuencial", "workers": 1, "leidas": 0, "aplicadas": 0, "omitidas": 0,
+          "errores": 0, "primer_lsn": None, "ultimo_lsn": after_lsn, "libros": set(), "idem": {}}
+    for lsn, entry in iter_wal(base, after_lsn=after_lsn):
+        if lsn is None:
+            continue
+        st["leidas"] += 1
+        if st["primer_lsn"] is None:
+            st["primer_lsn"] = lsn
+        st["ultimo_lsn"] = max(st["ultimo_lsn"], lsn)
+        op = entry.get("op") or {}
+        code = op.get("book_code")
+        clave = clave_de(op)
+        if cobertura.covers(code, lsn):
+            st["omitidas"] += 1
+            if clave is not None:
+                st["idem"].setdefault(clave, (lsn, None))
+            continue
+        try:
+            res = apply_op_to_db(db, op, lsn)
+            st["libros"].add(code)
+            st["aplicadas"] += 1
+            if clave is not None:
+                st["idem"][clave] = (lsn, res)
+        except Exception as e:
+            st["errores"] += 1
+            print(f"[{iso()}] Error replay lsn={lsn}: {e} | op: {op}", file=sys.stderr)
+    return st
+
+def _replay_parallel(files, db, after_lsn, cobertura, workers):
+    st = {"modo": "paralelo", "workers": workers, "leidas": 0, "aplicadas": 0, "omitidas": 0,
+          "errores": 0, "primer_lsn": None, "ultimo_lsn": after_lsn, "libros": set(), "idem": {}}
+    ctx = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        # 1) decodificar segmentos en paralelo; map conserva el orden de LSN
+        t0 = time.perf_counter()
+        por_libro = {}
+        for libros, total, omitidas, primero, ultimo, claves in pool.map(
+                _decode_segment, [(p, after_lsn, cobertura) for p in files]):
+            st["leidas"] += total
+            st["omitidas"] += omitidas
+            for clave, lsn in claves:
+                st["idem"].setdefault(clave, (lsn, None))
+            if primero is not None and st["primer_lsn"] is None:
+                st["primer_lsn"] = primero
+            if ultimo is not None:
+                st["ultimo_lsn"] = max(st["ultimo_lsn"], ultimo)
+            for code, ops in libros.items():
+                acc = por_libro.get(code)
+                if acc is None:
+                    por_libro[code] = ops
+                else:
+                    acc.extend(ops)
+        st["decodificacion_s"] = time.perf_counter() - t0
+
+        # 2) particionar por libro y aplicar cada partición en paralelo
+        t1 = time.perf_counter()
+        particiones = [({}, {}) for _ in range(workers)]
+        for code, ops in por_libro.items():
+            registros, ops_part = particiones[shard_of(code, workers)]
+            if code in db:
+                registros[code] = db[code]
+            ops_part[code] = ops
+        tareas = [p for p in particiones if p[1]]
+
+        # 3) fusionar los registros resultantes en el catálogo
+        for registros, aplicadas, errores, idem in pool.map(_apply_partition, tareas):
+            for code, record in registros.items():
+                store_record(db, code, record, por_libro[code][-1][0])
+            st["aplicadas"] += aplicadas
+            st["errores"] += errores
+            st["idem"].update(idem)
+        st["aplicacion_s"] = time.perf_counter() - t1
+        st["libros"] = set(por_libro)
+    return st
@@ -0,0 +1,1186 @@
+#!/usr/bin/env python3
+# archivo: ga/replicacion.py
+#
+# Replicación primary -> secondary como flujo del WAL con LSN y acks.
+#
+# El secondary escribe cada registro replicado en su WAL con el mismo LSN
+# que tuvo en el primary (ambos parten del mismo catálogo con lsn 0 o de una
+# copia con su LSN). Así su wal.lsn es a la vez el último LSN replicado y el
+# punto desde el cual pedir la continuación tras una caída de cualquiera de
+# los dos, sin metadatos propios.
+#
+# Canal: DEALER <-> DEALER, un mensaje JSON por trama (los trozos del snapshot
+# llevan una segunda trama binaria). El secondary hace bind en
+# GA_REPL_PULL_BIND y el primary se conecta a GA_REPL_PUSH_ADDR (los nombres
+# vienen de cuando era PUSH/PULL).
+#
+#   secondary -> primary
+#     {"tipo":"desde","lsn":X}          envíame desde X+1 (arranque, hueco, silencio)
+#     {"tipo":"ack","lsn":X}            X es durable en mi WAL (también es latido)
+#     {"tipo":"divergido","desde":C,"lsn":S}
+#                                       atendí escrituras propias después de C
+#                                       (actué como activo): no aplico el flujo
+#     {"tipo":"snapshot"}               envíame el catálogo completo
+#     {"tipo":"snapshot","parcial":C}   solo los libros que cambiaron después de C
+#     {"tipo":"recibiendo"}             latido mientras llega el snapshot
+#     {"tipo":"divergencia","registros":[[lsn, ts, op], ...]}
+#                                       mis escrituras propias (failback)
+#     {"tipo":"divergencia_fin","lsn":S} no hay más: mi WAL llega a S
+#   primary -> secondary
+#     {"tipo":"lote","registros":[[lsn, ts, op], ...],"lsn":durable}
+#     {"tipo":"latido","lsn":durable}   sin registros nuevos
+#     {"tipo":"sin_wal","lsn":X}        X+1 ya no está en el WAL del primary (o el
+#                                       atraso supera GA_REPL_SNAPSHOT_OPS): pedir snapshot
+#     {"tipo":"error","mensaje":...}
+#     {"tipo":"snapshot_inicio","lsn":L0,"libros":N}
+#     {"tipo":"snapshot_trozo","lsn":Lc,"libros":n} + zlib(pickle([(code, registro), ...]))
+#     {"tipo":"snapshot_fin","lsn":L0,"hasta":Lf,"trozos":k} + pickle(foto de idempotencia)
+#     {"tipo":"ceder","desde":X}        deja de atender y envíame tu WAL desde X+1
+#     {"tipo":"failback_aplicado","desde":C,"hasta":S,"lsn":P}
+#                                       tus escrituras C+1..S ya están en mi WAL (hasta P)
+#
+# El primary solo envía registros durables en su WAL, desde un hilo propio
+# (repl-emisor) dueño del socket: el bucle del GA solo agrega a una cola
+# acotada en memoria (GA_REPL_MEMORIA registros) y nunca espera al secondary.
+# Si la cola se llena (secondary lento o caído) se descartan los registros
+# más viejos: ya están en disco, en el WAL, y el hilo los lee de ahí. Un
+# secondary atrasado (reconexión, caída, cola desbordada) se pone al día desde
+# los segmentos del WAL, que se retienen hasta su ack mientras no superen
+# GA_REPL_RETENER_MB.
+# Lag (operación estado_replicacion del GA): en operaciones, durable_lsn - ack;
+# en ms, la edad de la escritura más antigua sin ack.
+#
+# La primera escritura propia del secondary (atiende con el primary caído)
+# se anota en GA_WAL_FILE.repl antes de llegar al WAL: desde ese LSN sus
+# registros ya no son los del primary y el flujo se detiene hasta
+# resincronizar (copiar el catálogo y borrar ese archivo).
+#
+# Snapshot (secondary nuevo, muy atrasado o adelantado): el primary lo arma
+# desde el bucle del GA, de a GA_REPL_SNAPSHOT_LIBROS libros por vuelta, sin
+# dejar de atender; cada trozo es la foto de sus libros en el LSN de ese
+# momento (Lc) y sale cuando Lc es durable. No es una foto consistente del
+# catálogo: el secondary lo instala, reinicia su WAL en L0 (el LSN del inicio)
+# y aplica el flujo desde L0+1 omitiendo, libro por libro, lo que su trozo ya
+# incluye (lsn <= Lc), como el replay con la cobertura de un checkpoint. Al
+# llegar a Lf (fin del snapshot) el catálogo es el del primary en ese LSN; con
+# el primer checkpoint posterior se borra GA_WAL_FILE.repl, que mientras tanto
+# dice {"snapshot": true}: una caída a mitad vuelve a pedir el snapshot.
+#
+# Failback: el primary que vuelve no atiende escrituras (ni responde "pong"
+# al monitor, sino "failback") hasta saber del secondary, como mucho
+# GA_FAILBACK_ESPERA_S. Si el secondary informa escrituras propias desde C
+# (divergido), el primary le pide que ceda: el secondary deja de atender
+# escrituras y le envía el tramo C+1..S de su WAL, que el primary aplica como
+# escrituras nuevas (con su idempotencia: un request_id ya aplicado no se
+# repite) y anota en GA_WAL_FILE.failback. Después el secondary pide un
+# snapshot parcial: solo los libros que aparecen en el WAL del primary
+# después de C (sus escrituras, las propias del primary que no llegaron a
+# replicarse y las recién aplicadas). El resto del catálogo es el mismo en
+# ambos hasta C, así que el costo depende de la duración de la caída y no del
+# tamaño del catálogo. Sin el WAL del primary desde C se envía completo.
+#
+# Config via env (ver ga/ga.py):
+#   GA_REPL_LOTE         registros max por mensaje          default 500
+#   GA_REPL_MEMORIA      registros en la cola en memoria    default 50000
+#   GA_REPL_TIMEOUT_S    silencio que se considera desconexión default 5
+#   GA_REPL_RETENER_MB   WAL rotado retenido para el secondary default 256
+#   GA_REPL_SNAPSHOT_OPS atraso (ops) desde el cual conviene un snapshot (0: libros del catálogo) default 0
+#   GA_REPL_SNAPSHOT_LIBROS libros por trozo del snapshot   default 2000
+#   GA_REPL_PENDIENTES   registros recibidos sin aplicar (secondary) default 50000
+#   GA_FAILBACK_ESPERA_S espera al secondary al arrancar el primary (0: no espera) default 5
+
+import os
+import sys
+import json
+import time
+import zlib
+import pickle
+import threading
+from collections import deque
+from datetime import datetime
+
+import zmq
+
+from wal import iter_wal, archived_segments
+
+LATIDO_S = 1.0      # latidos y acks sin tráfico
+SNAPSHOT_EN_VUELO = 8   # trozos armados esperando al hilo emisor
+LOTE_CEDER = 500    # registros por mensaje al devolver las escrituras propias
+
+def iso():
+    return datetime.utcnow().isoformat() + "Z"
+
+def _mandar(sock, msg, datos=None):
+    # nunca bloquea el bucle del GA: sin par o con la cola llena se reintenta
+    try:
+        if datos is None:
+            sock.send_string(json.dumps(msg), flags=zmq.NOBLOCK)
+        else:
+            sock.send_multipart([json.dumps(msg).encode("utf-8"), datos], flags=zmq.NOBLOCK)
+        return True
+    except zmq.Again:
+        return False
+
+def _recibir(sock, maximo):
+    # de a uno: quien recibe puede cortar (fin de un snapshot) sin perder los siguientes
+    for _ in range(maximo):
+        try:
+            tramas = sock.recv_multipart(flags=zmq.NOBLOCK)
+        except zmq.Again:
+            return
+        try:
+            msg = json.loads(tramas[0])
+        except Exception:
+            print(f"[{iso()}] Replicacion: mensaje no JSON: {tramas[0][:120]}", file=sys.stderr)
+            continue
+        if isinstance(msg, dict):
+            if len(tramas) > 1:
+                msg["_datos"] = tramas[1]
+            yield msg
+
+# ----------------- primary -----------------
+class Emisor:
+    """
+    registrar(lsns, ops) -> escrituras agregadas al WAL (en orden de LSN)
+    iniciar()            -> hilo emisor dueño del socket (atender + enviar)
+    avisar()             -> el WAL confirmó un lote (desde el hilo del WAL)
+    atender()            -> acks / pedidos del secondary
+    enviar()             -> un lote de registros durables; True si envió
+    producir(db, lsn, idem) -> desde el bucle del GA: el próximo trozo del snapshot pedido
+    bloquea()            -> True mientras el failback no permite atender escrituras
+    tomar_divergencia(n) -> desde el bucle del GA: escrituras del secondary a aplicar
+    aplicado_divergencia(s, p, n) -> las escrituras del secondary hasta s quedaron hasta el lsn p
+    retener(lsn)         -> hasta dónde truncar el WAL sin dejar al secondary sin continuación
+    estado()             -> posición y lag
+    cerrar()             -> detiene el hilo y cierra el socket
+    """
+
+    def __init__(self, sock, wal, lote=500, memoria=50000, timeout_s=5.0, retener_bytes=256 << 20,
+                 snapshot_ops=0, snapshot_libros=2000, espera_failback_s=5.0):
+        self.sock = sock
+        self.wal = wal
+        self.lote = max(int(lote), 1)
+        self.timeout_s = float(timeout_s)
+        self.retener_bytes = int(retener_bytes)
+        self.snapshot_ops = max(int(snapshot_ops), 0)
+        self.snapshot_libros = max(int(snapshot_libros), 1)
+        self.libros = None      # tamaño del catálogo (umbral de snapshot por defecto; lo informa producir)
+        self.despertar = None   # callable: despierta al bucle del GA (hay lugar para otro trozo)
+        self.cola = deque(maxlen=max(int(memoria), 1))     # (lsn, ts, op) aún no enviados
+        self.marcas = deque(maxlen=max(int(memoria), 1))   # (lsn, t monotónico) para el lag en ms
+        self.enviado = None     # último LSN enviado (None: el secondary aún no pidió)
+        self.ack = None         # último LSN durable en el secondary
+        self.divergido = None   # (desde, lsn) informado por el secondary
+        self.visto = None       # último mensaje del secondary (monotónico)
+        self._latido = 0.0
+        self._lector = None     # (generador, límite, último lsn) leyendo el WAL
+        self._listo = None      # lote armado que no se pudo enviar (se reintenta igual)
+        self._aviso_retencion = False
+        self._lock = threading.Lock()   # cola: la llena el bucle, la vacía el hilo emisor
+        self._hilo = None
+        self._aviso = None              # pipe: el WAL confirmó un lote
+        self._cerrar = False
+        # snapshot: el hilo emisor lo pide (generación) y lo envía, el bucle lo arma
+        self._snap_gen = 0
+        self._snap_activo = False
+        self._trozos = deque()          # (gen, tipo, lsn, datos) armados por el bucle
+        self._snap_item = None          # trozo listo que no se pudo enviar
+        self._snap_info = None          # (L0, trozos, bytes, t0) del snapshot en curso
+        self._prod = None               # estado del armado (solo el bucle del GA)
+        self._snap_parcial = None       # C: solo libros con escrituras después de C
+        # failback: lo modifica solo el hilo emisor; el bucle aplica `entrantes`
+        self.espera_failback_s = float(espera_failback_s)
+        self.failback = {"fase": "esperando", "t0": time.monotonic()} if self.espera_failback_s > 0 else None
+        self.entrantes = deque()        # [lsn del secondary, ts, op] por aplicar
+        self.path_failback = wal.path + ".failback"
+        try:
+            with open(self.path_failback) as f:
+                self._absorbido = json.load(f)  # último failback aplicado {"desde","hasta","lsn"}
+        except (FileNotFoundError, ValueError):
+            self._absorbido = None
+        self.stats = {"lotes": 0, "registros": 0, "desde_wal": 0, "acks": 0,
+                      "pedidos": 0, "sin_wal": 0, "reintentos": 0, "desbordes": 0,
+                      "snapshots": 0, "snapshot_bytes": 0, "failbacks": 0, "failback_ops": 0}
+
+    def registrar(self, lsns, ops):
+        # nunca espera al secondary: con la cola llena se descartan los más
+        # viejos, que el hilo emisor lee después de los segmentos del WAL
+        if not lsns:
+            return
+        ts = iso()
+        with self._lock:
+            sobran = len(self.cola) + len(lsns) - self.cola.maxlen
+            if sobran > 0:
+                self.stats["desbordes"] += sobran
+            self.cola.extend((lsn, ts, op) for lsn, op in zip(lsns, ops))
+        self.marcas.append((lsns[-1], time.monotonic()))
+
+    # ----------------- hilo emisor -----------------
+    def iniciar(self):
+        self._aviso = os.pipe()
+        for fd in self._aviso:
+            os.set_blocking(fd, False)
+        self._hilo = threading.Thread(target=self._run, name="repl-emisor", daemon=True)
+        self._hilo.start()
+
+    def avisar(self):
+        if self._aviso is not None:
+            try:
+                os.write(self._aviso[1], b"\0")
+            except OSError:
+                pass    # pipe lleno: ya hay un aviso pendiente
+
+    def cerrar(self):
+        if self._hilo is None:
+            self.sock.close(linger=0)
+            return
+        self._cerrar = True
+        self.avisar()
+        self._hilo.join(timeout=5)
+        for fd in self._aviso:
+            os.close(fd)
+
+    def drenar(self, timeout):
+        # al cerrar: espera (acotado) a que el secondary conectado tenga todo lo durable
+        fin = time.monotonic() + timeout
+        self.avisar()
+        while time.monotonic() < fin and self.conectado() and self.enviado is not None \
+                and self.enviado < self.wal.durable_lsn:
+            time.sleep(0.01)
+
+    def _run(self):
+        # el socket solo se usa desde este hilo (ZeroMQ no comparte sockets)
+        poller = zmq.Poller()
+        poller.register(self.sock, zmq.POLLIN)
+        poller.register(self._aviso[0], zmq.POLLIN)
+        espera = 0
+        while not self._cerrar:
+            try:
+                if self._aviso[0] in dict(poller.poll(espera)):
+                    try:
+                        while os.read(self._aviso[0], 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                self.atender()
+                self._avanzar_failback()
+                if self.enviar():
+                    espera = 0
+                elif self._listo or self._snap_item:
+                    espera = 50     # secondary lento o ausente: se reintenta sin girar
+                else:
+                    espera = int(LATIDO_S * 500)
+            except Exception as e:
+                print(f"[{iso()}] ERROR en hilo de replicación: {e}", file=sys.stderr)
+                espera = 100
+        self.sock.close(linger=0)
+
+    def conectado(self, ahora=None):
+        ahora = time.monotonic() if ahora is None else ahora
+        return self.visto is not None and ahora - self.visto <= self.timeout_s
+
+    def atender(self, maximo=256):
+        for msg in _recibir(self.sock, maximo):
+            tipo = msg.get("tipo")
+            lsn = msg.get("lsn")
+            self.visto = time.monotonic()
+            if tipo in ("divergido", "divergencia", "divergencia_fin"):
+                self._atender_failback(tipo, msg)
+            elif self.failback is not None and self.failback["fase"] == "esperando":
+                print(f"[{iso()}] REPL secondary sin escrituras propias: no hace falta failback")
+                self.failback = None
+            if tipo == "desde" and isinstance(lsn, int):
+                self.stats["pedidos"] += 1
+                self.divergido = None
+                self._lector = None
+                self._cancelar_snapshot()
+                if lsn > self.wal.lsn:
+                    print(f"[{iso()}] REPL ERROR: el secondary pide desde lsn={lsn} y el WAL llega a "
+                          f"{self.wal.lsn} (réplica adelantada: requiere resincronizar)", file=sys.stderr)
+                    self.enviado = None
+                    _mandar(self.sock, {"tipo": "error", "mensaje": "replica_adelantada", "lsn": self.wal.lsn})
+                    continue
+                print(f"[{iso()}] REPL secondary pide desde lsn={lsn} (primary en {self.wal.durable_lsn})")
+                self.enviado = lsn
+            elif tipo == "snapshot":
+                self.stats["snapshots"] += 1
+                self._snap_parcial = msg.get("parcial") if isinstance(msg.get("parcial"), int) else None
+                self.divergido = None
+                self._lector = None
+                self._listo = None
+                self.enviado = None
+                self._snap_item = None
+                self._snap_info = None
+                self._trozos.clear()
+                self._snap_gen += 1
+                self._snap_activo = True
+                print(f"[{iso()}] REPL secondary pide un snapshot del catálogo")
+                if self.despertar is not None:
+                    self.despertar()
+            elif tipo == "ack" and isinstance(lsn, int):
+                self.stats["acks"] += 1
+                self.ack = lsn
+                while self.marcas and self.marcas[0][0] <= lsn:
+                    self.marcas.popleft()
+                if self.enviado is None and self.divergido is None and not self._snap_activo \
+                        and lsn <= self.wal.lsn:
+                    # primary reiniciado: el ack dice desde dónde seguir
+                    print(f"[{iso()}] REPL secondary conectado en lsn={lsn}")
+                    self.enviado = lsn
+            elif tipo == "divergido":
+                if self.divergido is None:
+                    print(f"[{iso()}] REPL ERROR: el secondary atendió escrituras propias desde lsn="
+                          f"{msg.get('desde')} (llega a {lsn}); no se le replica hasta el failback",
+                          file=sys.stderr)
+                self.divergido = (msg.get("desde"), lsn)
+                self.enviado = None
+                self._cancelar_snapshot()
+
+    # ----------------- failback -----------------
+    def bloquea(self):
+        fb = self.failback
+        if fb is None:
+            return False
+        return fb["fase"] != "esperando" or time.monotonic() - fb["t0"] <= self.espera_failback_s
+
+    def _atender_failback(self, tipo, msg):
+        fb = self.failback
+        if tipo == "divergido":
+            desde, hasta = msg.get("desde"), msg.get("lsn")
+            if not isinstance(desde, int) or not isinstance(hasta, int):
+                return
+            ab = self._absorbido
+            if ab is not None and ab.get("desde") == desde and ab.get("hasta") == hasta:
+                # ya aplicado (el secondary no llegó a enterarse): solo se confirma
+                _mandar(self.sock, {"tipo": "failback_aplicado", "desde": desde, "hasta": hasta,
+                                    "lsn": ab.get("lsn")})
+                self.failback = None
+                return
+            if fb is None or fb["fase"] == "esperando":
+                print(f"[{iso()}] FAILBACK: el secondary tiene escrituras propias en lsn {desde + 1}..{hasta}; "
+                      f"se le piden antes de atender", file=sys.stderr)
+                self.failback = fb = {"fase": "pidiendo", "desde": desde, "recibido": desde,
+                                      "aplicado": desde, "fin": None, "lsn": None,
+                                      "t0": time.monotonic(), "visto": 0.0}
+            if fb["desde"] == desde and time.monotonic() - fb["visto"] > self.timeout_s:
+                # primer pedido o el tramo dejó de llegar (secondary reiniciado)
+                if _mandar(self.sock, {"tipo": "ceder", "desde": fb["recibido"]}):
+                    fb["visto"] = time.monotonic()
+            return
+        if fb is None or fb["fase"] != "pidiendo":
+            return
+        fb["visto"] = time.monotonic()
+        if tipo == "divergencia":
+            for reg in msg.get("registros") or ():
+                if reg[0] <= fb["recibido"]:
+                    continue
+                if reg[0] != fb["recibido"] + 1:
+                    _mandar(self.sock, {"tipo": "ceder", "desde": fb["recibido"]})
+                    break
+                self.entrantes.append(reg)
+                fb["recibido"] = reg[0]
+            if self.despertar is not None:
+                self.despertar()
+        elif tipo == "divergencia_fin" and isinstance(msg.get("lsn"), int):
+            if fb["recibido"] < msg["lsn"]:
+                _mandar(self.sock, {"tipo": "ceder", "desde": fb["recibido"]})
+            else:
+                fb["fin"] = msg["lsn"]
+                if self.despertar is not None:
+                    self.despertar()
+
+    def tomar_divergencia(self, maximo):
+        out = []
+        while self.entrantes and len(out) < maximo:
+            out.append(self.entrantes.popleft())
+        return out
+
+    def aplicado_divergencia(self, lsn_secondary, lsn, n=1):
+        fb = self.failback
+        if fb is not None and fb["fase"] == "pidiendo":
+            fb["lsn"] = lsn
+            fb["aplicado"] = lsn_secondary
+            self.stats["failback_ops"] += n
+            self.avisar()
+
+    def _avanzar_failback(self):
+        # hilo emisor: confirma cuando todo el tramo del secondary es durable aquí
+        fb = self.failback
+        if fb is None:
+            return
+        if fb["fase"] == "esperando":
+            if time.monotonic() - fb["t0"] > self.espera_failback_s:
+                print(f"[{iso()}] FAILBACK: sin noticias del secondary en {self.espera_failback_s:.0f} s; "
+                      f"se atiende", file=sys.stderr)
+                self.failback = None
+            return
+        if fb["fin"] is None or fb["aplicado"] < fb["fin"] or self.entrantes:
+            return
+        lsn = fb["lsn"] if fb["lsn"] is not None else self.wal.lsn
+        if self.wal.durable_lsn < lsn:
+            return
+        self._absorbido = {"desde": fb["desde"], "hasta": fb["fin"], "lsn": lsn}
+        escribir_marca(self.path_failback, self._absorbido)
+        if not _mandar(self.sock, dict(self._absorbido, tipo="failback_aplicado")):
+            return      # se confirma con el próximo "divergido" del secondary
+        self.stats["failbacks"] += 1
+        self.failback = None
+        self.divergido = None
+        print(f"[{iso()}] FAILBACK: {fb['fin'] - fb['desde']} escrituras del secondary "
+              f"(lsn {fb['desde'] + 1}..{fb['fin']}) aplicadas hasta lsn={lsn} en "
+              f"{time.monotonic() - fb['t0']:.2f} s; se atiende")
+
+    def _cancelar_snapshot(self):
+        if self._snap_activo:
+            print(f"[{iso()}] REPL snapshot en curso cancelado", file=sys.stderr)
+        self._snap_activo = False
+        self._snap_gen += 1
+        self._snap_item = None
+        self._snap_info = None
+
+    # ----------------- snapshot -----------------
+    def producir(self, db, lsn, idem=None):
+        # desde el bucle del GA (dueño del catálogo), con todo lo escrito en
+        # el WAL ya aplicado: arma un trozo si el hilo emisor tiene lugar.
+        # True si conviene volver a llamar sin esperar.
+        self.libros = len(db)
+        gen = self._snap_gen
+        if not self._snap_activo:
+            self._prod = None
+            return False
+        if self._prod is None or self._prod["gen"] != gen:
+            codes = None if self._snap_parcial is None else self._cambiados(self._snap_parcial, lsn)
+            parcial = codes is not None
+            self._prod = {"gen": gen, "codes": list(db) if codes is None else codes, "i": 0, "lsn": lsn, "n": 0}
+            self._trozos.append((gen, "inicio", lsn, {"libros": len(self._prod["codes"]), "parcial": parcial}))
+            self.avisar()
+            return True
+        prod = self._prod
+        if prod.get("fin") or len(self._trozos) >= SNAPSHOT_EN_VUELO:
+            return False
+        codes = prod["codes"]
+        if prod["i"] < len(codes):
+            registros = []
+            for code in codes[prod["i"]:prod["i"] + self.snapshot_libros]:
+                rec = db.get(code)
+                if rec is not None:         # borrado después del inicio: lo trae el flujo
+                    registros.append((code, rec))
+            prod["i"] += self.snapshot_libros
+            prod["n"] += 1
+            datos = zlib.compress(pickle.dumps(registros, protocol=pickle.HIGHEST_PROTOCOL))
+            self._trozos.append((gen, "trozo", lsn, (len(registros), datos)))
+        else:
+            foto = idem.foto(lsn) if idem is not None and idem.activa() else None
+            datos = pickle.dumps(foto, protocol=pickle.HIGHEST_PROTOCOL)
+            self._trozos.append((gen, "fin", lsn, (prod["lsn"], prod["n"], datos)))
+            prod["fin"] = True
+        self.avisar()
+        return not prod.get("fin") and len(self._trozos) < SNAPSHOT_EN_VUELO
+
+    def _cambiados(self, desde, hasta):
+        # libros con escrituras en desde+1..hasta (None: ya no se sabe, snapshot completo).
+        # Del WAL solo lo durable; la cola aún no enviada tiene el resto
+        # (se copia antes de leer durable_lsn: lo que el hilo emisor saque
+        # después ya es durable)
+        with self._lock:
+            cola = [(lsn, op) for lsn, _, op in self.cola]
+        durable = min(self.wal.durable_lsn, hasta)
+        ops = [op for lsn, op in cola if durable < lsn <= hasta]
+        if len(ops) < hasta - durable:
+            print(f"[{iso()}] REPL la cola no tiene lsn {durable + 1}..{hasta}: snapshot completo", file=sys.stderr)
+            return None
+        esperado = desde + 1
+        if durable > desde:
+            for lsn, entry in iter_wal(self.wal.path, desde):
+                if lsn is None:
+                    continue
+                if lsn != esperado:
+                    break
+                ops.append(entry.get("op"))
+                esperado += 1
+                if lsn >= durable:
+                    break
+            if esperado <= durable:
+                print(f"[{iso()}] REPL el WAL ya no tiene lsn {esperado}..{durable}: snapshot completo",
+                      file=sys.stderr)
+                return None
+        codes = set((op or {}).get("book_code") for op in ops)
+        codes.discard(None)
+        return sorted(codes)
+
+    def _enviar_snapshot(self, durable):
+        # un trozo por llamada, solo si su LSN ya es durable
+        if self._snap_item is None:
+            while self._trozos and self._trozos[0][0] != self._snap_gen:
+                self._trozos.popleft()      # de un snapshot cancelado
+            if not self._trozos or self._trozos[0][2] > durable:
+                return False
+            _, tipo, lsn, datos = self._trozos.popleft()
+            if tipo == "inicio":
+                item = (tipo, lsn, {"tipo": "snapshot_inicio", "lsn": lsn, "libros": datos["libros"],
+                                    "parcial": datos["parcial"]}, None)
+            elif tipo == "trozo":
+                item = (tipo, lsn, {"tipo": "snapshot_trozo", "lsn": lsn, "libros": datos[0]}, datos[1])
+            else:
+                desde, n, foto = datos
+                item = (tipo, lsn, {"tipo": "snapshot_fin", "lsn": desde, "hasta": lsn, "trozos": n}, foto)
+            self._snap_item = item
+            if self.despertar is not None:
+                self.despertar()            # lugar para otro trozo
+        tipo, lsn, msg, datos = self._snap_item
+        if not _mandar(self.sock, msg, datos):
+            self.stats["reintentos"] += 1
+            return False
+        self._snap_item = None
+        self._latido = time.monotonic()
+        self.stats["snapshot_bytes"] += len(datos or b"")
+        if tipo == "inicio":
+            # desde aquí el secondary sigue el flujo: se retiene el WAL desde L0
+            self.ack = lsn
+            self.marcas.clear()
+            self._snap_info = (lsn, 0, 0, time.monotonic())
+            print(f"[{iso()}] REPL SNAPSHOT -> inicio en lsn={lsn} ({msg['libros']} libros"
+                  f"{', parcial' if msg['parcial'] else ''})")
+        elif tipo == "trozo":
+            desde, n, total, t0 = self._snap_info
+            self._snap_info = (desde, n + 1, total + len(datos), t0)
+        else:
+            desde, n, total, t0 = self._snap_info
+            self._snap_activo = False
+            self._snap_info = None
+            self.enviado = msg["lsn"]
+            print(f"[{iso()}] REPL SNAPSHOT -> fin lsn {desde}..{lsn}: {n} trozos, "
+                  f"{total / (1 << 20):.2f} MiB en {time.monotonic() - t0:.2f} s; sigue el flujo desde {desde}")
+        return True
+
+    def enviar(self):
+        ahora = time.monotonic()
+        durable = self.wal.durable_lsn
+        if self._snap_activo:
+            return self.conectado(ahora) and self._enviar_snapshot(durable)
+        if self.enviado is None or not self.conectado(ahora):
+            return False
+        if self.enviado >= durable:
+            if ahora - self._latido >= LATIDO_S and _mandar(self.sock, {"tipo": "latido", "lsn": durable}):
+                self._latido = ahora
+            return False
+        registros = self._listo
+        if not registros or registros[0][0] != self.enviado + 1:
+            registros = self._registros(self.enviado, durable)
+        self._listo = None
+        if registros is None:
+            if self._conviene_snapshot(durable - self.enviado):
+                print(f"[{iso()}] REPL secondary en lsn={self.enviado} con {durable - self.enviado} ops "
+                      f"de atraso: se le indica pedir un snapshot")
+                _mandar(self.sock, {"tipo": "sin_wal", "lsn": self.enviado, "motivo": "atraso"})
+            else:
+                self.stats["sin_wal"] += 1
+                print(f"[{iso()}] REPL ERROR: lsn {self.enviado + 1} ya no está en el WAL; el secondary "
+                      f"no se puede poner al día desde el flujo", file=sys.stderr)
+                _mandar(self.sock, {"tipo": "sin_wal", "lsn": self.enviado})
+            self.enviado = None
+            return False
+        if not registros:
+            return False
+        if not _mandar(self.sock, {"tipo": "lote", "registros": registros, "lsn": durable}):
+            self.stats["reintentos"] += 1
+            self._listo = registros
+            return False
+        self._latido = ahora
+        self.enviado = registros[-1][0]
+        with self._lock:
+            while self.cola and self.cola[0][0] <= self.enviado:
+                self.cola.popleft()
+        self.stats["lotes"] += 1
+        self.stats["registros"] += len(registros)
+        print(f"[{iso()}] REPL SEND -> lote lsn {registros[0][0]}..{registros[-1][0]} "
+              f"({len(registros)} ops)")
+        return True
+
+    def _registros(self, desde, hasta):
+        # hasta `lote` registros contiguos desde desde+1 (None: no están en el
+        # WAL o conviene un snapshot)
+        with self._lock:
+            while self.cola and self.cola[0][0] <= desde:
+                self.cola.popleft()
+            if self.cola and self.cola[0][0] == desde + 1:
+                out = []
+                for lsn, ts, op in self.cola:
+                    if lsn > hasta or len(out) >= self.lote:
+                        break
+                    out.append([lsn, ts, op])
+                return out
+        if self._lector is None and self._conviene_snapshot(hasta - desde):
+            return None     # se decide al empezar a leer del WAL, no a mitad
+        return self._del_wal(desde, hasta)
+
+    def _conviene_snapshot(self, atraso):
+        # reproducir más operaciones que libros tiene el catálogo cuesta más que copiarlo
+        umbral = self.snapshot_ops or (None if self.libros is None else max(self.libros, self.lote))
+        return umbral is not None and atraso > umbral
+
+    def _del_wal(self, desde, hasta):
+        # el generador se conserva entre lotes; se lee solo hasta el LSN durable
+        # al abrirlo, para no tocar la cola que el escritor está agregando
+        nuevo = self._lector is None or self._lector[2] != desde
+        if nuevo:
+            self._lector = (iter_wal(self.wal.path, desde), hasta, desde)
+        gen, limite, _ = self._lector
+        out = []
+        seguir = False
+        for lsn, entry in gen:
+            if lsn is None:
+                continue
+            if lsn != desde + 1 + len(out):
+                break       # hueco: el WAL ya no tiene ese tramo
+            out.append([lsn, entry.get("ts"), entry.get("op")])
+            if lsn >= limite:
+                break
+            if len(out) >= self.lote:
+                seguir = True
+                break
+        self._lector = (gen, limite, out[-1][0]) if seguir else None
+        if not out:
+            # con un generador reutilizado (rotación en medio) se reintenta desde cero
+            return None if nuevo else []
+        self.stats["desde_wal"] += len(out)
+        return out
+
+    def retener(self, lsn):
+        ack = self.ack if self.ack is not None else 0
+        if ack >= lsn:
+            return lsn
+        total = 0
+        for _, path in archived_segments(self.wal.path):
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        if total > self.retener_bytes:
+            if not self._aviso_retencion:
+                print(f"[{iso()}] Aviso: WAL retenido para el secondary ({total >> 20} MiB, ack={self.ack}) "
+                      f"supera GA_REPL_RETENER_MB; se trunca hasta el checkpoint", file=sys.stderr)
+                self._aviso_retencion = True
+            return lsn
+        self._aviso_retencion = False
+        return ack
+
+    def estado(self):
+        durable = self.wal.durable_lsn
+        lag_ms = None
+        if self.ack is not None:
+            try:
+                lag_ms = round((time.monotonic() - self.marcas[0][1]) * 1000, 1)
+            except IndexError:      # sin escrituras pendientes de ack
+                lag_ms = 0.0
+        return {"estado": "ok", "rol": "primary", "lsn": durable, "enviado_lsn": self.enviado,
+                "ack_lsn": self.ack, "conectado": self.conectado(),
+                "lag_ops": None if self.ack is None else max(durable - self.ack, 0),
+                "lag_ms": lag_ms, "divergido": self.divergido, "snapshot": self._snap_activo,
+                "failback": None if self.failback is None else self.failback["fase"],
+                "stats": dict(self.stats)}
+
+# ----------------- secondary -----------------
+class Receptor:
+    """
+    recibir(lsn)            -> registros contiguos desde lsn+1 para aplicar
+    mantener(lsn, durable)  -> acks, latidos y pedidos de continuación (o de snapshot)
+    iniciar(wal)            -> hilo receptor dueño del socket (recibir + mantener)
+    tomar(lsn, maximo)      -> desde el bucle del GA: registros recibidos por el hilo, en orden
+    avisar()                -> el WAL confirmó un lote (ack) o el bucle liberó lugar
+    cerrar()                -> detiene el hilo y cierra el socket
+    divergir(lsn)           -> el secondary atiende una escritura propia tras lsn
+    confirmar_cesion()      -> desde el bucle del GA: ya no atiende escrituras (failback)
+    retener(lsn)            -> hasta dónde truncar el WAL sin perder las escrituras propias
+    tomar_snapshot()        -> snapshot completo recibido, para instalar (o None)
+    instalado(snap)         -> el snapshot está en el catálogo; cubierto(code, lsn) filtra el flujo
+    completar()             -> un checkpoint cubre el fin del snapshot
+    estado(lsn)             -> posición y lag respecto del primary
+    """
+
+    def __init__(self, sock, path_divergencia, timeout_s=5.0, pendientes=50000):
+        self.sock = sock
+        self.path_divergencia = path_divergencia
+        self.timeout_s = float(timeout_s)
+        self.pendientes_max = max(int(pendientes), 1)
+        marca = leer_marca(path_divergencia)
+        self.divergido = marca.get("desde")
+        self.pide_snapshot = bool(marca.get("snapshot"))
+        self.snapshot_parcial = marca.get("parcial")    # C: basta lo que cambió después de C
+        self.cediendo = None        # failback: {"listo", "enviado", "fin", "lector"}
+        self.primario_lsn = None    # último LSN durable informado por el primary
+        self.ultimo_ts = None       # ts (del primary) del último registro recibido
+        self.visto = None
+        self._pedido = None         # (lsn, t) último "desde" (o "snapshot") enviado
+        self._ack = (None, 0.0)     # (lsn, t) último ack enviado
+        self._snap = None           # snapshot en recepción: {"lsn", "trozos": [(Lc, datos)], ...}
+        self._snap_listo = None     # recibido completo, falta tomarlo
+        self._snap_completo = False     # recibido completo y aún sin instalar: el flujo sigue desde L0
+        self._cobertura = None      # (L0, hasta, {code: Lc}) mientras el flujo pasa por el snapshot
+        # hilo receptor: recibe y confirma; el bucle del GA aplica lo que queda en cola
+        self.cola = deque()         # ([lsn, ts, op], t recibido) sin aplicar
+        self.recibido = None        # último LSN contiguo en la cola (o aplicado)
+        self.wal = None
+        self.despertar = None       # callable: despierta al bucle del GA (hay registros)
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._aviso = None
+        self._cerrar = False
+        self._repedir = False       # el bucle encontró un hueco: pedir desde recibido
+        self.stats = {"lotes": 0, "registros": 0, "duplicados": 0, "huecos": 0, "pedidos": 0,
+                      "snapshots": 0, "snapshot_bytes": 0, "aplicados": 0, "lotes_aplicados": 0,
+                      "colas_llenas": 0, "cedidos": 0}
+
+    # ----------------- hilo receptor -----------------
+    def iniciar(self, wal):
+        self.wal = wal
+        self.recibido = wal.lsn
+        self._aviso = os.pipe()
+        for fd in self._aviso:
+            os.set_blocking(fd, False)
+        self._hilo = threading.Thread(target=self._run, name="repl-receptor", daemon=True)
+        self._hilo.start()
+
+    def avisar(self):
+        if self._aviso is not None:
+            try:
+                os.write(self._aviso[1], b"\0")
+            except OSError:
+                pass
+
+    def cerrar(self):
+        if self._hilo is None:
+            self.sock.close(linger=0)
+            return
+        self._cerrar = True
+        self.avisar()
+        self._hilo.join(timeout=5)
+        for fd in self._aviso:
+            os.close(fd)
+
+    def _run(self):
+        # el socket solo se usa desde este hilo; con la cola llena no se lee
+        # (los mensajes esperan en ZeroMQ y el primary reintenta)
+        todo = zmq.Poller()
+        todo.register(self.sock, zmq.POLLIN)
+        todo.register(self._aviso[0], zmq.POLLIN)
+        solo_aviso = zmq.Poller()
+        solo_aviso.register(self._aviso[0], zmq.POLLIN)
+        espera = int(LATIDO_S * 500)
+        while not self._cerrar:
+            try:
+                lleno = len(self.cola) >= self.pendientes_max
+                eventos = dict((solo_aviso if lleno else todo).poll(espera))
+                if self._aviso[0] in eventos:
+                    try:
+                        while os.read(self._aviso[0], 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                if lleno:
+                    self.stats["colas_llenas"] += 1
+                elif self.sock in eventos:
+                    self._encolar()
+                if self._repedir:
+                    self._repedir = False
+                    self.pedir(self.recibido, forzar=True)
+                propio = self.divergido is not None
+                self.mantener(self.wal.lsn if propio else self.recibido, self.wal.durable_lsn)
+                espera = 0 if self._ceder() else int(LATIDO_S * 500)
+            except Exception as e:
+                print(f"[{iso()}] ERROR en hilo receptor de replicación: {e}", file=sys.stderr)
+                time.sleep(0.1)
+        self.sock.close(linger=0)
+
+    def _encolar(self):
+        # de a un mensaje, para no pasarse de pendientes_max por más de un lote
+        hubo = False
+        for _ in range(256):
+            if len(self.cola) >= self.pendientes_max:
+                break
+            base = self.recibido
+            registros = self.recibir(base, 1)
+            if registros:
+                t = time.monotonic()
+                with self._lock:
+                    if self.recibido == base:   # si no, el bucle reinició la posición
+                        self.cola.extend((reg, t) for reg in registros)
+                        self.recibido = registros[-1][0]
+                hubo = True
+            elif self._snap_listo is not None:
+                hubo = True
+                break
+            elif self.sock.poll(0) == 0:
+                break
+        if hubo and self.despertar is not None:
+            self.despertar()
+
+    def tomar(self, lsn, maximo):
+        # desde el bucle del GA: hasta `maximo` registros contiguos desde lsn+1
+        with self._lock:
+            if self.pide_snapshot or self.divergido is not None:
+                return []
+            while self.cola and self.cola[0][0][0] <= lsn:
+                self.cola.popleft()
+            if self.cola and self.cola[0][0][0] != lsn + 1:
+                # hueco respecto del WAL local (aplicación fallida): se vuelve a pedir
+                self.cola.clear()
+                self.recibido = lsn
+                self._repedir = True
+                self.avisar()
+                return []
+            out = []
+            while self.cola and len(out) < maximo:
+                out.append(self.cola.popleft()[0])
+        if out:
+            self.stats["aplicados"] += len(out)
+            self.stats["lotes_aplicados"] += 1
+            if len(self.cola) < self.pendientes_max:
+                self.avisar()
+        return out
+
+    def pendientes(self):
+        return len(self.cola)
+
+    def recibir(self, lsn, maximo=256):
+        out = []
+        for msg in _recibir(self.sock, maximo):
+            self.visto = time.monotonic()
+            tipo = msg.get("tipo")
+            if isinstance(msg.get("lsn"), int) and tipo in ("lote", "latido"):
+                self.primario_lsn = msg["lsn"]
+            if tipo == "sin_wal":
+                print(f"[{iso()}] REPL el primary no puede continuar desde lsn={msg.get('lsn')} "
+                      f"({msg.get('motivo') or 'sin WAL'}): se pide un snapshot", file=sys.stderr)
+                self.solicitar_snapshot()
+            elif tipo == "error":
+                print(f"[{iso()}] REPL ERROR del primary: {msg.get('mensaje')} (lsn {msg.get('lsn')})",
+                      file=sys.stderr)
+                if msg.get("mensaje") == "replica_adelantada":
+                    self.solicitar_snapshot()
+            elif tipo in ("snapshot_inicio", "snapshot_trozo", "snapshot_fin"):
+                if self._recibir_snapshot(tipo, msg):
+                    break       # se instala antes de seguir con el flujo
+                continue
+            elif tipo == "ceder":
+                self._pedido_cesion(msg.get("desde"))
+            elif tipo == "failback_aplicado":
+                self._failback_aplicado(msg)
+            if tipo != "lote" or self.divergido is not None or (self.pide_snapshot and not self._snap_completo):
+                continue
+            self.stats["lotes"] += 1
+            esperado = lsn + len(out) + 1
+            for reg in msg.get("registros") or ():
+                if reg[0] < esperado:
+                    self.stats["duplicados"] += 1
+                    continue
+                if reg[0] > esperado:
+                    self.stats["huecos"] += 1
+                    self.pedir(esperado - 1)
+                    break
+                out.append(reg)
+                esperado += 1
+        if out:
+            self.stats["registros"] += len(out)
+            self.ultimo_ts = out[-1][1]
+        return out
+
+    def _recibir_snapshot(self, tipo, msg):
+        # True cuando el snapshot está completo
+        if not self.pide_snapshot or self._snap_completo:
+            return False
+        if tipo == "snapshot_inicio":
+            self._snap = {"lsn": msg.get("lsn"), "libros": msg.get("libros"), "trozos": [],
+                          "parcial": bool(msg.get("parcial")), "t0": time.monotonic()}
+            self._snap_completo = False
+            print(f"[{iso()}] REPL SNAPSHOT <- inicio en lsn={msg.get('lsn')} ({msg.get('libros')} libros"
+                  f"{', parcial' if msg.get('parcial') else ''})")
+            return False
+        if self._snap is None:
+            return False        # trozos de un snapshot anterior a este pedido
+        datos = msg.get("_datos") or b""
+        self.stats["snapshot_bytes"] += len(datos)
+        if tipo == "snapshot_trozo":
+            self._snap["trozos"].append((msg.get("lsn"), datos))
+            return False
+        snap, self._snap = self._snap, None
+        if tipo != "snapshot_fin" or msg.get("lsn") != snap["lsn"] or msg.get("trozos") != len(snap["trozos"]):
+            print(f"[{iso()}] REPL ERROR: snapshot incompleto ({len(snap['trozos'])} trozos de "
+                  f"{msg.get('trozos')}); se vuelve a pedir", file=sys.stderr)
+            self._pedido = None
+            return False
+        snap["hasta"] = msg.get("hasta")
+        snap["idem"] = pickle.loads(datos) if datos else None
+        with self._lock:
+            # lo que sigue en el flujo va desde L0, sobre el catálogo del snapshot
+            self.cola.clear()
+            self.recibido = snap["lsn"]
+            self._snap_listo = snap
+            self._snap_completo = True
+        return True
+
+    def tomar_snapshot(self):
+        # {"lsn": L0, "hasta": Lf, "libros": iterador de (Lc, code, registro), "idem": foto,
+        # "parcial": solo los libros que cambiaron}; al recorrer los libros se
+        # arma la cobertura que usa instalado()
+        snap, self._snap_listo = self._snap_listo, None
+        if snap is None:
+            return None
+        cobertura = {}
+
+        def libros():
+            for lsn, datos in snap["trozos"]:
+                for code, rec in pickle.loads(zlib.decompress(datos)):
+                    if lsn > snap["lsn"]:
+                        cobertura[code] = lsn
+                    yield lsn, code, rec
+        return {"lsn": snap["lsn"], "hasta": snap["hasta"], "libros": libros(), "idem": snap["idem"],
+                "parcial": snap["parcial"], "cobertura": cobertura, "trozos": len(snap["trozos"]),
+                "segundos": time.monotonic() - snap["t0"]}
+
+    def instalado(self, snap):
+        # el catálogo tiene el snapshot y el WAL sigue vacío desde L0: el flujo
+        # desde L0+1 se aplica salvo lo que cada trozo ya incluye
+        self._cobertura = (snap["lsn"], snap["hasta"], snap["cobertura"])
+        self.pide_snapshot = False
+        self.snapshot_parcial = None
+        self._snap_completo = False
+        self.primario_lsn = snap["hasta"]
+        self._pedido = None
+        self.stats["snapshots"] += 1
+
+    def snapshot_fallido(self):
+        # no se pudo instalar: se pide otro
+        with self._lock:
+            self._snap_completo = False
+            self.cola.clear()
+        self._pedido = None
+
+    def cubierto(self, code, lsn):
+        if self._cobertura is None:
+            return False
+        return lsn <= self._cobertura[2].get(code, self._cobertura[0])
+
+    def resincronizando(self):
+        # None o el LSN que tiene que alcanzar el flujo para terminar el snapshot
+        if self.pide_snapshot:
+            return -1
+        return None if self._cobertura is None else self._cobertura[1]
+
+    def completar(self):
+        # un checkpoint ya cubre el fin del snapshot: el arranque no necesita pedirlo
+        self._cobertura = None
+        try:
+            os.remove(self.path_divergencia)
+        except FileNotFoundError:
+            pass
+        print(f"[{iso()}] REPL SNAPSHOT completo: el secondary sigue solo con el flujo")
+
+    def solicitar_snapshot(self, parcial=None):
+        if self.pide_snapshot or self.divergido is not None:
+            return      # con escrituras propias no se pisan sin resolver la divergencia
+        # antes de tocar el catálogo: una caída a mitad de la instalación vuelve a pedirlo
+        marca = {"snapshot": True}
+        if parcial is not None:
+            marca["parcial"] = parcial
+        escribir_marca(self.path_divergencia, marca)
+        self.snapshot_parcial = parcial
+        with self._lock:
+            self.pide_snapshot = True
+            self._snap_completo = False
+            self.cola.clear()
+        self._snap = None
+        self._pedido = None
+
+    def pedir(self, lsn, forzar=False):
+        ahora = time.monotonic()
+        if not forzar and self._pedido is not None and self._pedido[0] == lsn \
+                and ahora - self._pedido[1] < self.timeout_s:
+            return      # ya pedido: se espera la respuesta
+        if _mandar(self.sock, {"tipo": "desde", "lsn": lsn}):
+            self._pedido = (lsn, ahora)
+            self.stats["pedidos"] += 1
+            print(f"[{iso()}] REPL pide continuación desde lsn={lsn}")
+
+    def mantener(self, lsn, durable):
+        ahora = time.monotonic()
+        if self.pide_snapshot:
+            # sin acks: el primary tomaría el LSN local como punto de continuación
+            if self._snap_completo or (self._snap is not None and ahora - self.visto <= self.timeout_s):
+                if ahora - self._ack[1] >= LATIDO_S and _mandar(self.sock, {"tipo": "recibiendo"}):
+                    self._ack = (None, ahora)
+            elif self._pedido is None or ahora - self._pedido[1] >= self.timeout_s:
+                pedido = {"tipo": "snapshot"}
+                if self.snapshot_parcial is not None:
+                    pedido["parcial"] = self.snapshot_parcial
+                if _mandar(self.sock, pedido):
+                    self._pedido = (None, ahora)
+                    self._snap = None
+                    print(f"[{iso()}] REPL pide un snapshot {'parcial ' if 'parcial' in pedido else ''}"
+                          f"del catálogo al primary")
+            return
+        if self.divergido is not None:
+            if ahora - self._ack[1] >= LATIDO_S:
+                _mandar(self.sock, {"tipo": "divergido", "desde": self.divergido, "lsn": lsn})
+                self._ack = (None, ahora)
+            return
+        if self.visto is None or ahora - self.visto > self.timeout_s:
+            # arranque o primary en silencio (caído o reiniciado): se vuelve a pedir
+            self.pedir(lsn)
+        if durable != self._ack[0] or ahora - self._ack[1] >= LATIDO_S:
+            if _mandar(self.sock, {"tipo": "ack", "lsn": durable}):
+                self._ack = (durable, ahora)
+
+    def divergir(self, lsn):
+        # antes de la primera escritura propia: desde aquí el WAL ya no es el del primary
+        if self.divergido is not None:
+            return
+        marcar_divergencia(self.path_divergencia, lsn)
+        with self._lock:
+            self.divergido = lsn
+            self.cola.clear()
+        print(f"[{iso()}] REPL: escritura propia con el primary ausente; WAL divergido desde lsn={lsn} "
+              f"({self.path_divergencia})", file=sys.stderr)
+
+    def retener(self, lsn):
+        # las escrituras propias (después de divergido) se conservan para el failback
+        return lsn if self.divergido is None else min(lsn, self.divergido)
+
+    # ----------------- failback -----------------
+    def _pedido_cesion(self, desde):
+        # el primary volvió y pide las escrituras propias desde `desde`
+        if self.divergido is None or not isinstance(desde, int) or desde < self.divergido:
+            return
+        if self.cediendo is None:
+            print(f"[{iso()}] FAILBACK: el primary volvió; se dejan de atender escrituras y se le "
+                  f"envía el WAL desde lsn={desde + 1}", file=sys.stderr)
+            self.cediendo = {"listo": False, "enviado": desde, "fin": False, "lector": None}
+            if self.despertar is not None:
+                self.despertar()
+        else:
+            # pedido repetido (hueco o primary reiniciado): desde donde diga
+            self.cediendo["enviado"] = desde
+            self.cediendo["fin"] = False
+
+    def confirmar_cesion(self):
+        # desde el bucle del GA: rechazo() ya no deja pasar escrituras
+        c = self.cediendo
+        if c is not None and not c["listo"]:
+            c["listo"] = True
+            self.avisar()
+
+    def _ceder(self):
+        # hilo receptor: envía el tramo divergido del WAL, ya durable y sin
+        # escrituras nuevas. True si envió (se sigue sin esperar)
+        c = self.cediendo
+        if c is None or not c["listo"] or c["fin"] or self.wal.durable_lsn < self.wal.lsn:
+            return False
+        hasta = self.wal.lsn
+        if c["enviado"] >= hasta:
+            if _mandar(self.sock, {"tipo": "divergencia_fin", "lsn": hasta}):
+                c["fin"] = True
+                print(f"[{iso()}] FAILBACK: WAL propio enviado hasta lsn={hasta}")
+            return False
+        lector = c["lector"]
+        if lector is None or lector[1] != c["enviado"]:
+            lector = (iter_wal(self.wal.path, c["enviado"]), c["enviado"])
+        registros = []
+        for lsn, entry in lector[0]:
+            if lsn is None:
+                continue
+            if lsn != c["enviado"] + len(registros) + 1:
+                break
+            registros.append([lsn, entry.get("ts"), entry.get("op")])
+            if lsn >= hasta or len(registros) >= LOTE_CEDER:
+                break
+        if not registros:
+            c["lector"] = None
+            print(f"[{iso()}] REPL ERROR: el WAL local ya no tiene lsn {c['enviado'] + 1}..{hasta}",
+                  file=sys.stderr)
+            return False
+        if not _mandar(self.sock, {"tipo": "divergencia", "registros": registros}):
+            c["lector"] = None
+            return False
+        c["enviado"] = registros[-1][0]
+        c["lector"] = (lector[0], c["enviado"])
+        self.stats["cedidos"] += len(registros)
+        return True
+
+    def _failback_aplicado(self, msg):
+        # el primary ya tiene las escrituras propias: se descarta la divergencia
+        # y se trae lo que cambió allá desde que dejaron de coincidir
+        desde = self.divergido
+        if desde is None or msg.get("desde") != desde:
+            return
+        print(f"[{iso()}] FAILBACK: el primary aplicó las escrituras propias (lsn {desde + 1}.."
+              f"{msg.get('hasta')}, allá hasta {msg.get('lsn')}); se pide un snapshot parcial")
+        self.divergido = None
+        self.cediendo = None
+        self.solicitar_snapshot(parcial=desde)
+
+    def estado(self, lsn):
+        # lag: respecto del primary (lsn aplicado) y de la etapa de aplicación
+        # (registros recibidos que el bucle todavía no aplicó)
+        try:
+            aplicar_ms = round((time.monotonic() - self.cola[0][1]) * 1000, 1)
+        except IndexError:
+            aplicar_ms = 0.0
+        lag_ms = None
+        if self.ultimo_ts and self.primario_lsn is not None and self.primario_lsn > lsn:
+            try:
+                t = datetime.strptime(self.ultimo_ts.rstrip("Z"), "%Y-%m-%dT%H:%M:%S.%f")
+                lag_ms = round((datetime.utcnow() - t).total_seconds() * 1000, 1)
+            except ValueError:
+                pass
+        return {"estado": "ok", "rol": "secondary", "lsn": lsn, "primario_lsn": self.primario_lsn,
+                "conectado": self.visto is not None and time.monotonic() - self.visto <= self.timeout_s,
+                "lag_ops": None if self.primario_lsn is None else max(self.primario_lsn - lsn, 0),
+                "lag_ms": lag_ms if lag_ms is not None else (None if self.primario_lsn is None else 0.0),
+                "recibido_lsn": self.recibido, "aplicar_pendientes": len(self.cola),
+                "aplicar_lag_ms": aplicar_ms,
+                "divergido": self.divergido, "resincronizando": self.resincronizando(),
+                "cediendo": self.cediendo is not None, "stats": dict(self.stats)}
+
+# ----------------- divergencia / snapshot pendiente -----------------
+def leer_marca(path):
+    # {"desde": C} (escrituras propias desde C), {"snapshot": true[, "parcial": C]} o {} si no hay
+    try:
+        with open(path) as f:
+            marca = json.load(f)
+        if "desde" in marca:
+            marca["desde"] = int(marca["desde"])
+        return marca
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"[{iso()}] Aviso: {path} ilegible ({e}); se asume divergido desde 0", file=sys.stderr)
+        return {"desde": 0}
+
+def leer_divergencia(path):
+    # LSN desde el cual el WAL del secondary tiene escrituras propias (None: ninguna)
+    return leer_marca(path).get("desde")
+
+def escribir_marca(path, marca):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(dict(marca, ts=iso()), f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def marcar_divergencia(path, lsn):
+    escribir_marca(path, {"desde": lsn})
+
+def emisor_from_env(sock, wal):
+    return Emisor(sock, wal,
+                  lote=int(os.getenv("GA_REPL_LOTE", "500")),
+                  memoria=int(os.getenv("GA_REPL_MEMORIA", "50000")),
+                  timeout_s=float(os.getenv("GA_REPL_TIMEOUT_S", "5")),
+                  retener_bytes=int(float(os.getenv("GA_REPL_RETENER_MB", "256")) * (1 << 20)),
+                  snapshot_ops=int(os.getenv("GA_REPL_SNAPSHOT_OPS", "0")),
+                  snapshot_libros=int(os.getenv("GA_REPL_SNAPSHOT_LIBROS", "2000")),
+                  espera_failback_s=float(os.getenv("GA_FAILBACK_ESPERA_S", "5")))
+
+def receptor_from_env(sock, path_divergencia):
+    return Receptor(sock, path_divergencia, timeout_s=float(os.getenv("GA_REPL_TIMEOUT_S", "5")),
+                    pendientes=int(os.getenv("GA_REPL_PENDIENTES", "50000")))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# archivo: ga/ruteo.py
+#
+# Ruteo de operaciones a GA particionados por hash de book_code.
+#
+# Con GA_SHARDS=N hay N procesos GA (cada uno con su par primary/secondary,
+# su WAL y su snapshot); el libro `code` vive en la partición
+# blake2b(code) % N. No se usa crc32: dentro de una partición los shards de
+# checkpoint.shard_of, las particiones del replay (ga/replay.py) y el índice
+# del motor mmap reparten con crc32; con el mismo hash solo verían los
+# valores que caen en la partición (con N=4 y 16 shards, 4 shards llenos y 12
+# vacíos). Además crc32 es lineal: otra semilla no lo descorrelaciona.
+#
+# La tabla de ruteo es gc/ga_shards.json (GA_SHARDS_FILE), la genera
+# scripts/particionar_db.py:
+#   {"shards": [{"primary": "tcp://host:6000", "secondary": "tcp://host:6001",
+#                "estado": "gc/ga_activo.txt"},
+#               {"primary": "tcp://host:6010", "secondary": "tcp://host:6011",
+#                "estado": "gc/ga_activo_1.txt"}, ...]}
+# "estado" es el archivo que escribe el monitor de failover de ese par. Sin
+# tabla hay una sola partición: el GA de siempre y gc/ga_activo.txt.
+#
+# Lo usan gc/gc.py y los actores (contactar_ga); la tabla se relee si cambia.
+
+import os
+import sys
+import json
+import hashlib
+from datetime import datetime
+
+FILE_SHARDS = "gc/ga_shards.json"
+FILE_GA_ACTIVO = "gc/ga_activo.txt"
+SALTO_PUERTOS = 10      # la partición k usa los puertos por defecto + 10*k
+
+def iso():
+    return datetime.utcnow().isoformat() + "Z"
+
+def shard_de(code, n):
+    if n <= 1:
+        return 0
+    h = hashlib.blake2b(str(code).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(h, "little") % n
+
+def archivo_estado(k):
+    return FILE_GA_ACTIVO if k == 0 else f"gc/ga_activo_{k}.txt"
+
+def leer_activo(path):
+    # "primary" | "secondary" según el monitor; primary por defecto
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            v = f.read().strip().lower()
+            return v if v in ("primary", "secondary") else "primary"
+    except Exception:
+        return "primary"
+
+class TablaRuteo:
+    """
+    shard(code)          -> partición del libro
+    direccion(code)      -> GA activo (primary/secondary) de esa partición
+    direcciones()        -> GA activo de cada partición
+    agrupar(codes)       -> {partición: [codes]}
+    """
+
+    def __init__(self, primary, secondary, estado=FILE_GA_ACTIVO, path=None):
+        self.path = path or os.getenv("GA_SHARDS_FILE", FILE_SHARDS)
+        self._defecto = [{"primary": primary, "secondary": secondary, "estado": estado}]
+        self.shards = self._defecto
+        self._mtime = None
+
+    def _recargar(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self.shards, self._mtime = self._defecto, None
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                shards = json.load(f)["shards"]
+            for k, s in enumerate(shards):
+                if not s.get("primary") or not s.get("secondary"):
+                    raise ValueError(f"partición {k} sin primary/secondary")
+                s.setdefault("estado", archivo_estado(k))
+            if not shards:
+                raise ValueError("tabla vacía")
+        except Exception as e:
+            print(f"[{iso()}] ERROR leyendo tabla de ruteo {self.path}: {e} (se mantiene la anterior)",
+                  file=sys.stderr)
+            return
+        self.shards, self._mtime = shards, mtime
+
+    @property
+    def n(self):
+        self._recargar()
+        return len(self.shards)
+
+    def shard(self, code):
+        return shard_de(code, self.n)
+
+    def direccion_shard(self, k):
+        s = self.shards[k]
+        return s["secondary"] if leer_activo(s["estado"]) == "secondary" else s["primary"]
+
+    def direccion(self, code=None):
+        return self.direccion_shard(self.shard(code) if code is not None else 0)
+
+    def direcciones(self):
+        return [self.direccion_shard(k) for k in range(self.n)]
+
+    def agrupar(self, codes):
+        n = self.n
+        grupos = {}
+        for code in codes:
+            grupos.setdefault(shard_de(code, n), []).append(code)
+        return grupos
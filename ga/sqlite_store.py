@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# archivo: ga/sqlite_store.py
+#
+# Motor de almacenamiento del catálogo sobre SQLite (GA_STORAGE=sqlite).
+#
+# El catálogo vive en tablas en disco en vez de en memoria, así que puede
+# crecer más allá de lo que cabe cómodo en un pickle y el snapshot nunca se
+# reescribe completo:
+#   books(code PK, title, available, extra)
+#   loans(book_code, user_id, due, renovaciones, clave_gen)  PK (book_code, user_id)
+#         índices por user_id y por due
+#   meta(k PK, v)   lsn: último LSN del WAL del GA incluido en la base
+#
+# Journal en modo WAL de SQLite. Las operaciones se escriben en una
+# transacción abierta que se confirma (junto con meta.lsn) al llegar a
+# GA_SQLITE_TX_OPS operaciones o GA_SQLITE_TX_MS milisegundos: con poco
+# tráfico cada transacción lleva una o pocas operaciones y con carga se
+# agrupan. La durabilidad de cada operación la sigue dando el WAL del GA
+# (ga/wal.py), que también alimenta la replicación; por eso SQLite usa
+# synchronous=NORMAL: una caída puede perder la última transacción, pero
+# la base queda consistente en meta.lsn y el replay del WAL completa el resto.
+#
+# Los registros con otra forma que la estándar (ver catalogo.forma_compacta)
+# se guardan completos como pickle en books.extra.
+
+import os
+import json
+import time
+import pickle
+import sqlite3
+from datetime import datetime
+from collections.abc import MutableMapping
+
+from catalogo import forma_compacta, F_RENOVATIONS
+from vencimientos import IndiceVencimientos, vencimientos_de
+from wal_format import iso_to_us
+from checkpoint import Cobertura, cargar_origen, _atomic_dump, marcar_lsn_pickle
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    code      TEXT PRIMARY KEY,
+    title     TEXT NOT NULL DEFAULT '',
+    available INTEGER NOT NULL DEFAULT 0,
+    extra     BLOB
+);
+CREATE TABLE IF NOT EXISTS loans (
+    book_code    TEXT NOT NULL,
+    user_id      TEXT NOT NULL,
+    due          TEXT NOT NULL,
+    renovaciones INTEGER NOT NULL DEFAULT 0,
+    clave_gen    INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (book_code, user_id)
+);
+CREATE INDEX IF NOT EXISTS loans_user ON loans(user_id);
+CREATE INDEX IF NOT EXISTS loans_due ON loans(due);
+CREATE TABLE IF NOT EXISTS meta (
+    k TEXT PRIMARY KEY,
+    v
+);
+"""
+
+def iso():
+    return datetime.utcnow().isoformat() + "Z"
+
+def conectar(path):
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(ESQUEMA)
+    return conn
+
+class SqliteCatalog(MutableMapping):
+    """
+    Catálogo {book_code: registro} sobre las tablas books/loans.
+
+    db[code] arma el registro desde las filas; put()/db[code] = registro lo
+    escribe dentro de la transacción abierta (la confirma commit()).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = conectar(path)
+        self._n = self.conn.execute("SELECT count(*) FROM books").fetchone()[0]
+        self._vencimientos = None    # IndiceVencimientos; se arma en la primera consulta
+
+    def close(self):
+        if self.conn.in_transaction:
+            self.conn.execute("COMMIT")
+        self.conn.close()
+
+    # ----------------- meta / transacciones -----------------
+    def meta(self, k, default=None):
+        row = self.conn.execute("SELECT v FROM meta WHERE k = ?", (k,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_meta(self, k, v):
+        self._begin()
+        self.conn.execute("INSERT OR REPLACE INTO meta (k, v) VALUES (?, ?)", (k, v))
+
+    @property
+    def lsn(self):
+        return int(self.meta("lsn", 0))
+
+    def _begin(self):
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+
+    def commit(self, lsn):
+        self.set_meta("lsn", lsn)
+        self.conn.execute("COMMIT")
+
+    # ----------------- API -----------------
+    def put(self, code, record, lsn=None):
+        if not isinstance(code, str):
+            raise ValueError(f"book_code no soportado por el motor sqlite: {code!r}")
+        self._begin()
+        c = self.conn
+        if self._vencimientos is not None:
+            self._vencimientos.actualizar(code, self._vencimientos_libro(code), vencimientos_de(record))
+        prestamos = forma_compacta(code, record)
+        if prestamos is None:
+            fila = ("", 0, pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL), code)
+        else:
+            fila = (record["title"], record["available"], None, code)
+        if c.execute("UPDATE books SET title = ?, available = ?, extra = ? WHERE code = ?", fila).rowcount == 0:
+            c.execute("INSERT INTO books (title, available, extra, code) VALUES (?, ?, ?, ?)", fila)
+            self._n += 1
+        else:
+            c.execute("DELETE FROM loans WHERE book_code = ?", (code,))
+        if prestamos:
+            c.executemany(
+                "INSERT INTO loans (book_code, user_id, due, renovaciones, clave_gen) VALUES (?, ?, ?, ?, ?)",
+                [(code, user, due, renov, 1 if flags & F_RENOVATIONS else 0)
+                 for user, due, renov, flags in prestamos])
+
+    def _registro(self, code, title, available, extra, loans_rows):
+        if extra is not None:
+            return pickle.loads(extra)
+        loans = {}
+        for user, due, renov, gen in loans_rows:
+            loans[user] = {"due": due, "renovations" if gen else "renovaciones": renov}
+        return {"code": code, "title": title, "available": available, "loans": loans}
+
+    def get(self, code, default=None):
+        row = self.conn.execute("SELECT title, available, extra FROM books WHERE code = ?", (code,)).fetchone()
+        if row is None:
+            return default
+        loans = self.conn.execute(
+            "SELECT user_id, due, renovaciones, clave_gen FROM loans WHERE book_code = ? ORDER BY rowid",
+            (code,))
+        return self._registro(code, *row, loans)
+
+    def resumen(self, code):
+        # (title, available, préstamos) con una sola consulta
+        row = self.conn.execute(
+            "SELECT title, available, extra, (SELECT count(*) FROM loans WHERE book_code = code) "
+            "FROM books WHERE code = ?", (code,)).fetchone()
+        if row is None:
+            return None
+        title, available, extra, n = row
+        if extra is not None:
+            rec = pickle.loads(extra)
+            if not isinstance(rec, dict):
+                return None
+            return rec.get("title", ""), rec.get("available", 0), len(rec.get("loans") or {})
+        return title, available, n
+
+    def libros_de_usuario(self, user):
+        # índice loans_user
+        return [row[0] for row in self.conn.execute(
+            "SELECT book_code FROM loans WHERE user_id = ?", (user,))]
+
+    def _vencimientos_libro(self, code):
+        row = self.conn.execute("SELECT extra FROM books WHERE code = ?", (code,)).fetchone()
+        if row is None:
+            return {}
+        if row[0] is not None:
+            return vencimientos_de(pickle.loads(row[0]))
+        out = {}
+        for user, due in self.conn.execute("SELECT user_id, due FROM loans WHERE book_code = ?", (code,)):
+            due = iso_to_us(due)
+            if due is not None:
+                out[user] = due
+        return out
+
+    def indice_vencimientos(self):
+        # en memoria: el orden de texto de loans_due no es el de los instantes
+        # (fracciones de segundo de distinto largo)
+        if self._vencimientos is None:
+            entradas = [(iso_to_us(due), code, user) for code, user, due in
+                        self.conn.execute("SELECT book_code, user_id, due FROM loans")]
+            for code, extra in self.conn.execute("SELECT code, extra FROM books WHERE extra IS NOT NULL"):
+                entradas.extend((due, code, user) for user, due in vencimientos_de(pickle.loads(extra)).items())
+            self._vencimientos = IndiceVencimientos.desde_entradas(e for e in entradas if e[0] is not None)
+        return self._vencimientos
+
+    def __getitem__(self, code):
+        rec = self.get(code)
+        if rec is None:
+            raise KeyError(code)
+        return rec
+
+    def __setitem__(self, code, record):
+        self.put(code, record)
+
+    def __delitem__(self, code):
+        self._begin()
+        if self._vencimientos is not None:
+            self._vencimientos.actualizar(code, self._vencimientos_libro(code), {})
+        if self.conn.execute("DELETE FROM books WHERE code = ?", (code,)).rowcount == 0:
+            raise KeyError(code)
+        self.conn.execute("DELETE FROM loans WHERE book_code = ?", (code,))
+        self._n -= 1
+
+    def __contains__(self, code):
+        return self.conn.execute("SELECT 1 FROM books WHERE code = ?", (code,)).fetchone() is not None
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        return (row[0] for row in self.conn.execute("SELECT code FROM books ORDER BY rowid").fetchall())
+
+    def items(self):
+        prestamos = {}
+        for code, *loan in self.conn.execute(
+                "SELECT book_code, user_id, due, renovaciones, clave_gen FROM loans ORDER BY rowid"):
+            prestamos.setdefault(code, []).append(loan)
+        return [(code, self._registro(code, title, available, extra, prestamos.get(code, ())))
+                for code, title, available, extra in
+                self.conn.execute("SELECT code, title, available, extra FROM books ORDER BY rowid")]
+
+# ----------------- checkpoints -----------------
+class SqliteCheckpointer:
+    """
+    Misma interfaz que checkpoint.Checkpointer para el GA: un checkpoint es
+    el COMMIT de la transacción abierta con meta.lsn.
+    """
+
+    def __init__(self, db_file, path, tx_ops=100, tx_ms=50.0):
+        self.db_file = db_file
+        self.path = path
+        self.dir = path
+        self.tx_ops = max(int(tx_ops), 1)
+        self.tx_s = float(tx_ms) / 1000.0
+        self.lsn = 0
+        self.from_shards = True
+        self.externo = False
+        self.exportar = False
+        self.db = None
+        self._cob = None        # cobertura de los shards importados (hasta el primer commit)
+        self._ops = 0
+        self._last = time.monotonic()
+        self.stats = {"transacciones": 0, "operaciones": 0, "max_ops_tx": 0}
+
+    def load(self):
+        nueva = not os.path.exists(self.path) or self._fuente_mas_nueva()
+        if nueva and os.path.exists(self.path):
+            print(f"[{iso()}] {self.db_file} o sus shards son más recientes que {self.path}; se reimporta")
+            for sufijo in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.path + sufijo)
+                except FileNotFoundError:
+                    pass
+        self.db = self._importar() if nueva else SqliteCatalog(self.path)
+        self.lsn = self.db.lsn
+        cob = self.db.meta("cobertura")
+        if cob:
+            c = json.loads(cob)
+            self._cob = Cobertura(c["shards"], c["shard_lsn"], c["code_lsn"])
+        print(f"[{iso()}] DB abierta desde {self.path} ({len(self.db)} libros, lsn={self.lsn})")
+        return self.db
+
+    def _fuente_mas_nueva(self):
+        t = os.path.getmtime(self.path)
+        fuentes = [self.db_file, os.path.join(self.db_file + ".d", "manifest.json")]
+        return any(os.path.exists(p) and os.path.getmtime(p) > t for p in fuentes)
+
+    def _importar(self):
+        # primer arranque con el motor sqlite: se parte de los shards o del pickle
+        src, lsn, cob, self.externo = cargar_origen(self.db_file)
+        inicio = time.perf_counter()
+        db = SqliteCatalog(self.path)
+        for code, rec in src.items():
+            db.put(code, rec)
+        if cob is not None:
+            # shards escritos con un LSN mayor que el del manifest (caída a
+            # mitad de checkpoint): se conserva la cobertura por shard
+            db.set_meta("cobertura", json.dumps({"shards": cob.shards, "shard_lsn": cob.shard_lsn,
+                                                 "code_lsn": cob.code_lsn}))
+        db.commit(lsn)
+        print(f"[{iso()}] Catálogo importado a {self.path} ({len(db)} libros) "
+              f"en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+        return db
+
+    def track(self, db, dirty=True):
+        pass
+
+    def covers(self, code, lsn):
+        return lsn <= self.lsn or (self._cob is not None and self._cob.covers(code, lsn))
+
+    def coverage(self):
+        return self._cob or Cobertura(1, [self.lsn], {})
+
+    def mark(self, code):
+        self._ops += 1
+
+    def pending(self):
+        return self._ops
+
+    def due(self):
+        if not self._ops:
+            return False
+        return self._ops >= self.tx_ops or (time.monotonic() - self._last) >= self.tx_s
+
+    def checkpoint(self, db, lsn, antes=None):
+        if not self._ops and lsn <= self.lsn and self._cob is None:
+            return 0
+        if antes is not None:
+            antes(lsn)
+        if self._cob is not None:
+            db.set_meta("cobertura", None)
+            self._cob = None
+        db.commit(lsn)
+        n = self._ops
+        self.lsn = lsn
+        self.stats["transacciones"] += 1
+        self.stats["operaciones"] += n
+        self.stats["max_ops_tx"] = max(self.stats["max_ops_tx"], n)
+        self._ops = 0
+        self._last = time.monotonic()
+        return n
+
+    def sincronizar(self, timeout=None):
+        return True
+
+    def export_full(self, db, lsn):
+        # pickle completo para herramientas (verify_replication, pruebas)
+        _atomic_dump(self.db_file, dict(db.items()))
+        marcar_lsn_pickle(self.db_file, lsn)
+        os.utime(self.path)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# archivo: ga/test_idempotencia.py
+#
+# Pruebas de la caché de claves de idempotencia (ga/idempotencia.py):
+# - LRU acotada y TTL
+# - un resultado conocido no se pisa con uno desconocido (replay omitido)
+# - snapshot a disco y carga (descarta claves vencidas)
+#
+# Uso:
+#   python -m pytest -q ga/test_idempotencia.py
+#   python ga/test_idempotencia.py
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from idempotencia import CacheIdempotencia, clave_de   # noqa: E402
+
+OK = {"estado": "ok", "mensaje": "prestamo aplicado (replay)"}
+
+def test_lru_y_ttl():
+    c = CacheIdempotencia(maximo=2, ttl_s=60)
+    c.guardar("a", 1, OK)
+    c.guardar("b", 2, OK)
+    assert c.buscar("a") == (1, OK)        # "a" pasa a ser la más reciente
+    c.guardar("c", 3, OK)
+    assert c.buscar("b") is None and c.buscar("a") == (1, OK)
+    assert c.stats["desalojadas"] == 1
+
+    c.guardar("viejo", 4, OK, t=time.time() - 120)
+    assert c.buscar("viejo") is None and c.stats["expiradas"] == 1
+
+def test_resultado_desconocido_no_pisa():
+    c = CacheIdempotencia()
+    c.guardar("a", 5, OK)
+    c.guardar("a", 5, None)
+    assert c.buscar("a") == (5, OK)
+    c.guardar("b", 6, None)
+    assert c.buscar("b") == (6, None)
+
+def test_foto_y_carga():
+    d = tempfile.mkdtemp(prefix="test_idem_")
+    try:
+        path = os.path.join(d, "db.pkl.idem")
+        c = CacheIdempotencia(ttl_s=60)
+        c.guardar("a", 1, OK)
+        c.guardar("b", 7, OK)                               # posterior al lsn de la foto
+        c.guardar("vencida", 2, OK, t=time.time() - 120)
+        CacheIdempotencia.escribir_foto(path, c.foto(5))
+        nueva = CacheIdempotencia(ttl_s=60)
+        assert nueva.cargar_archivo(path) == 1
+        assert nueva.buscar("a") == (1, OK) and nueva.buscar("b") is None
+    finally:
+        shutil.rmtree(d)
+
+def test_clave_de():
+    assert clave_de({"request_id": "x"}) == "x"
+    assert clave_de({"request_id": 12}) == "12"
+    assert clave_de({"request_id": ""}) is None and clave_de({}) is None and clave_de(None) is None
+
+if __name__ == "__main__":
+    for nombre, fn in list(globals().items()):
+        if nombre.startswith("test_") and callable(fn):
+            fn()
+            print(f"PASS {nombre}")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# archivo: ga/test_lote.py
+#
+# Pruebas de las solicitudes por lote del GA ({"operacion":"lote"}), contra un
+# ga.py real (primary, sin secondary) en un directorio temporal:
+# - el mismo request_id repetido dentro del lote se aplica una vez y las dos
+#   posiciones reciben el mismo resultado
+# - una lectura ve las escrituras anteriores del mismo lote (y no las siguientes)
+# - un lote anidado, una entrada sin operación o que no es un objeto se
+#   responden con error en su posición sin afectar al resto
+# - una escritura de otra partición se rechaza (shard_incorrecto) en su posición
+#
+# Uso:
+#   python -m pytest -q ga/test_lote.py
+#   python ga/test_lote.py
+
+import os
+import sys
+import json
+import pickle
+import shutil
+import socket
+import tempfile
+import subprocess
+from pathlib import Path
+
+import zmq
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from ruteo import shard_de   # noqa: E402
+
+GA_PY = str(Path(__file__).resolve().parent / "ga.py")
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _libros(shard, n, shards=2):
+    # códigos de libro que caen en la partición `shard`
+    codes = []
+    i = 0
+    while len(codes) < n:
+        code = f"BOOK-{i:03d}"
+        if shard_de(code, shards) == shard:
+            codes.append(code)
+        i += 1
+    return codes
+
+class _GA:
+    # ga.py en un directorio temporal, partición 0 de 2
+    def __init__(self, catalogo):
+        self.dir = tempfile.mkdtemp(prefix="test_lote_")
+        with open(os.path.join(self.dir, "db.pkl"), "wb") as f:
+            pickle.dump(catalogo, f)
+        self.bind = f"tcp://127.0.0.1:{_puerto_libre()}"
+        env = dict(os.environ,
+                   GA_ROLE="primary", GA_SHARDS="2", GA_SHARD="0", GA_BIND=self.bind,
+                   GA_DB_FILE=os.path.join(self.dir, "db.pkl"),
+                   GA_WAL_FILE=os.path.join(self.dir, "wal.log"),
+                   GA_STATUS_FILE=os.path.join(self.dir, "activo.txt"),
+                   GA_REPL_PUSH_ADDR=f"tcp://127.0.0.1:{_puerto_libre()}",
+                   GA_VENCIDOS_PUB_BIND="", GA_VENCIDOS_INTERVAL_S="0",
+                   GA_FAILBACK_ESPERA_S="0", GA_WAL_SYNC_MODE="group")
+        self.log = open(os.path.join(self.dir, "ga.out"), "wb")
+        self.proc = subprocess.Popen([sys.executable, GA_PY], cwd=self.dir, env=env,
+                                     stdout=self.log, stderr=subprocess.STDOUT)
+        self.ctx = zmq.Context()
+        self.sock = self.ctx.socket(zmq.DEALER)
+        self.sock.setsockopt(zmq.LINGER, 0)
+        self.sock.connect(self.bind)
+        # el GA atiende cuando responde el ping
+        for _ in range(100):
+            self.sock.send_multipart([b"", b"ping"])
+            if self.sock.poll(200):
+                assert self.sock.recv_multipart()[-1] == b"pong"
+                return
+            if self.proc.poll() is not None:
+                break
+        self.cerrar()
+        raise AssertionError("el GA no arrancó")
+
+    def pedir(self, payload, timeout_ms=5000):
+        self.sock.send_multipart([b"", json.dumps(payload).encode("utf-8")])
+        assert self.sock.poll(timeout_ms), "sin respuesta del GA"
+        return json.loads(self.sock.recv_multipart()[-1])
+
+    def cerrar(self):
+        self.sock.close()
+        self.ctx.term()
+        if self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.log.close()
+        shutil.rmtree(self.dir)
+
+def _prestamo(code, user, rid=None):
+    op = {"operacion": "prestamo", "book_code": code, "user_id": user,
+          "recv_ts": "2026-03-01T10:00:00.250000Z"}
+    if rid is not None:
+        op["request_id"] = rid
+    return op
+
+def _disponibles(ga, code):
+    r = ga.pedir({"operacion": "consulta", "book_code": code})
+    assert r["estado"] == "ok", r
+    return r["libros"][0]["available"]
+
+def test_lote():
+    propios = _libros(0, 2)
+    ajeno = _libros(1, 1)[0]
+    catalogo = {c: {"code": c, "title": c, "available": 3, "loans": {}} for c in propios + [ajeno]}
+    ga = _GA(catalogo)
+    try:
+        a, b = propios
+        r = ga.pedir({"operacion": "lote", "operaciones": [
+            {"operacion": "consulta_usuario", "user_id": "1"},      # 0: antes de las escrituras
+            _prestamo(a, "1", "rid-a"),                             # 1
+            _prestamo(a, "1", "rid-a"),                             # 2: repetido en el lote
+            {"operacion": "consulta_usuario", "user_id": "1"},      # 3: ve el préstamo 1
+            {"operacion": "lote", "operaciones": [_prestamo(b, "1")]},  # 4: anidado
+            {"book_code": b},                                       # 5: sin operación
+            "prestamo",                                             # 6: no es un objeto
+            _prestamo(ajeno, "1", "rid-ajeno"),                     # 7: otra partición
+            _prestamo(b, "2", "rid-b"),                             # 8
+            {"operacion": "consulta_usuario", "user_id": "2"},      # 9: ve el préstamo 8
+        ]})
+        assert r["estado"] == "ok"
+        res = r["resultados"]
+        assert len(res) == 10
+
+        assert res[0]["estado"] == "ok" and res[0]["total"] == 0
+        assert res[1]["estado"] == "ok"
+        assert res[2] == res[1]
+        assert res[3]["total"] == 1 and res[3]["prestamos"][0]["book_code"] == a
+        # el vencimiento sellado antes del WAL: recepción + 14 días
+        assert res[3]["prestamos"][0]["due"] == "2026-03-15T10:00:00.250000Z"
+        assert res[4] == {"estado": "error", "mensaje": "lote anidado"}
+        assert res[5] == {"estado": "error", "mensaje": "operacion faltante"}
+        assert res[6] == {"estado": "error", "mensaje": "operacion faltante"}
+        assert res[7] == {"estado": "error", "mensaje": "shard_incorrecto", "shard": 1}
+        assert res[8]["estado"] == "ok"
+        assert res[9]["total"] == 1 and res[9]["prestamos"][0]["book_code"] == b
+
+        # el repetido se aplicó una sola vez; el anidado y el ajeno, ninguna
+        assert _disponibles(ga, a) == 2 and _disponibles(ga, b) == 2
+
+        # el mismo request_id en otro lote: resultado guardado, sin reaplicar
+        r = ga.pedir({"operacion": "lote", "operaciones": [_prestamo(a, "1", "rid-a")]})
+        assert r["resultados"][0] == res[1]
+        assert _disponibles(ga, a) == 2
+    finally:
+        ga.cerrar()
+
+if __name__ == "__main__":
+    for nombre, fn in list(globals().items()):
+        if nombre.startswith("test_") and callable(fn):
+            fn()
+            print(f"PASS {nombre}")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# archivo: ga/test_mmap_store.py
+#
+# Pruebas del motor mmap (ga/mmap_store.py):
+# - write-ahead: un put con lsn no durable no llega a los slots hasta volcar()
+# - la vista en memoria (lecturas, índices, len) incluye los puts diferidos
+#
+# Uso:
+#   python -m pytest -q ga/test_mmap_store.py
+#   python ga/test_mmap_store.py
+
+import os
+import sys
+import shutil
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mmap_store import MmapCatalog   # noqa: E402
+
+def _libro(code, available=1, loans=None):
+    return {"code": code, "title": "t", "available": available, "loans": loans or {}}
+
+def test_put_diferido_hasta_wal_durable():
+    d = tempfile.mkdtemp(prefix="test_mmap_")
+    try:
+        path = os.path.join(d, "c.mmap")
+        MmapCatalog.crear(path, [("BOOK-001", _libro("BOOK-001"), 1)], 1)
+        cat = MmapCatalog(path)
+        cat.volcar(1)
+        prestamo = {"7": {"due": "2026-01-01T00:00:00Z", "renovaciones": 0}}
+        cat.put("BOOK-001", _libro("BOOK-001", 0, prestamo), 2)
+        cat.put("BOOK-002", _libro("BOOK-002"), 3)
+
+        # en memoria ya se ven
+        assert cat["BOOK-001"]["available"] == 0
+        assert "BOOK-002" in cat and len(cat) == 2
+        assert sorted(cat) == ["BOOK-001", "BOOK-002"]
+        assert list(cat.libros_de_usuario("7")) == ["BOOK-001"]
+
+        # en el archivo, no: el WAL aún no los cubre
+        disco = MmapCatalog(path, readonly=True)
+        assert disco.slot_lsn("BOOK-001") == 1 and "BOOK-002" not in disco
+
+        assert cat.volcar(2) == 1
+        assert disco.slot_lsn("BOOK-001") == 2 and "BOOK-002" not in disco
+        assert cat.volcar(3) == 1
+        assert disco.slot_lsn("BOOK-002") == 3 and len(disco) == 2
+        disco.close()
+        cat.close()
+    finally:
+        shutil.rmtree(d)
+
+def test_volcar_con_reescritura_del_archivo():
+    d = tempfile.mkdtemp(prefix="test_mmap_")
+    try:
+        path = os.path.join(d, "c.mmap")
+        MmapCatalog.crear(path, [], 0)
+        cat = MmapCatalog(path)
+        cat.volcar(0)
+        # más libros que la capacidad inicial: volcar() reescribe el archivo
+        for i in range(3000):
+            cat.put(f"BOOK-{i:04d}", _libro(f"BOOK-{i:04d}"), i + 1)
+        assert len(cat) == 3000
+        cat.volcar(3000)
+        assert len(cat) == 3000 and cat.slot_lsn("BOOK-2999") == 3000
+        cat.close()
+    finally:
+        shutil.rmtree(d)
+
+if __name__ == "__main__":
+    for nombre, fn in list(globals().items()):
+        if nombre.startswith("test_") and callable(fn):
+            fn()
+            print(f"PASS {nombre}")
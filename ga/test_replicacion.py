@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# archivo: ga/test_replicacion.py
+#
+# Pruebas del flujo de replicación por LSN (ga/replicacion.py) sobre inproc:
+# - registros recientes desde la cola en memoria, atrasados (o desbordados)
+#   desde el WAL; envío desde el hilo emisor
+# - acks -> lag en operaciones; retención del WAL hasta el ack
+# - un hueco en el flujo hace que el secondary pida la continuación
+# - divergencia del secondary persistida en disco
+# - hilo receptor: recibe y confirma; el bucle toma lotes acotados y en orden
+# - snapshot por trozos mientras el primary sigue escribiendo, y el flujo
+#   desde su LSN omitiendo lo que cada trozo ya incluye
+# - failback: el primary que vuelve incorpora el tramo divergido del secondary
+#   y este trae solo los libros que cambiaron (snapshot parcial)
+#
+# Uso:
+#   python -m pytest -q ga/test_replicacion.py
+#   python ga/test_replicacion.py
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from pathlib import Path
+
+import zmq
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from wal import WALWriter                                    # noqa: E402
+from catalogo import Catalogo                                # noqa: E402
+from db_ops import apply_op_to_db, store_record              # noqa: E402
+from replicacion import Emisor, Receptor, leer_divergencia, leer_marca   # noqa: E402
+
+def _op(i):
+    return {"operacion": "prestamo", "book_code": f"BOOK-{i:03d}", "user_id": "7"}
+
+def _par(ctx, nombre):
+    a = ctx.socket(zmq.DEALER)
+    b = ctx.socket(zmq.DEALER)
+    a.bind(f"inproc://{nombre}")
+    b.connect(f"inproc://{nombre}")
+    return a, b
+
+def _recibir_todo(receptor, lsn, intentos=50):
+    out = []
+    for _ in range(intentos):
+        regs = receptor.recibir(lsn + len(out))
+        out.extend(regs)
+        if not regs:
+            time.sleep(0.01)
+            if receptor.sock.poll(0) == 0:
+                break
+    return out
+
+def test_flujo_memoria_wal_y_ack():
+    d = tempfile.mkdtemp(prefix="test_repl_")
+    ctx = zmq.Context()
+    try:
+        wal = WALWriter(os.path.join(d, "wal.log"), mode="always", segment_bytes=1024)
+        s_sec, s_pri = _par(ctx, "flujo")
+        emisor = Emisor(s_pri, wal, lote=8, memoria=5)
+        receptor = Receptor(s_sec, os.path.join(d, "wal.log.repl"))
+
+        ops = [_op(i) for i in range(30)]
+        for i in range(0, 30, 3):
+            emisor.registrar(wal.append_many(ops[i:i + 3]), ops[i:i + 3])
+        receptor.mantener(0, 0)             # pide desde 0 y confirma 0
+        emisor.atender()
+        while emisor.enviar():
+            pass
+        regs = _recibir_todo(receptor, 0)
+        assert [r[0] for r in regs] == list(range(1, 31))
+        assert [r[2] for r in regs] == ops
+        # la cola en memoria guarda 5: el resto salió de los segmentos del WAL
+        assert emisor.stats["desbordes"] == 25 and emisor.stats["desde_wal"] >= 25
+
+        assert emisor.estado()["lag_ops"] == 30
+        assert emisor.retener(30) == 0      # nada confirmado: se retiene todo
+        receptor.mantener(30, 30)
+        emisor.atender()
+        assert emisor.estado()["lag_ops"] == 0 and emisor.retener(30) == 30
+        assert receptor.estado(30)["lag_ops"] == 0
+        wal.close()
+    finally:
+        ctx.destroy(linger=0)
+        shutil.rmtree(d)
+
+def test_hilo_emisor():
+    d = tempfile.mkdtemp(prefix="test_repl_")
+    ctx = zmq.Context()
+    try:
+        wal = WALWriter(os.path.join(d, "wal.log"), mode="group", window_ms=1)
+        s_sec, s_pri = _par(ctx, "hilo")
+        emisor = Emisor(s_pri, wal, lote=16, memoria=100)
+        wal.on_durable = lambda _lsn: emisor.avisar()
+        receptor = Receptor(s_sec, os.path.join(d, "wal.log.repl"))
+        emisor.iniciar()
+        receptor.mantener(0, 0)
+        ops = [_op(i) for i in range(200)]
+        for i in range(0, 200, 10):
+            emisor.registrar(wal.append_many(ops[i:i + 10]), ops[i:i + 10])
+        regs = []
+        fin = time.time() + 5
+        while len(regs) < 200 and time.time() < fin:
+            if receptor.sock.poll(100):
+                regs.extend(receptor.recibir(len(regs)))
+        assert [r[0] for r in regs] == list(range(1, 201))
+        emisor.cerrar()
+        wal.close()
+    finally:
+        ctx.destroy(linger=0)
+        shutil.rmtree(d)
+
+def test_hilo_receptor_y_aplicacion_por_lotes():
+    d = tempfile.mkdtemp(prefix="test_repl_")
+    ctx = zmq.Context()
+    try:
+        wal_pri = WALWriter(os.path.join(d, "pri.log"), mode="group", window_ms=1)
+        wal_sec = WALWriter(os.path.join(d, "sec.log"), mode="group", window_ms=1)
+        s_sec, s_pri = _par(ctx, "receptor")
+        emisor = Emisor(s_pri, wal_pri, lote=40, memoria=1000)
+        wal_pri.on_durable = lambda _lsn: emisor.avisar()
+        receptor = Receptor(s_sec, os.path.join(d, "sec.repl"), pendientes=100)
+        wal_sec.on_durable = lambda _lsn: receptor.avisar()
+        emisor.iniciar()
+        receptor.iniciar(wal_sec)
+        ops = [_op(i) for i in range(500)]
+        for i in range(0, 500, 50):
+            emisor.registrar(wal_pri.append_many(ops[i:i + 50]), ops[i:i + 50])
+        # el "bucle del GA": lotes de a lo sumo 30, un append al WAL por lote
+        aplicados = []
+        fin = time.time() + 5
+        while len(aplicados) < 500 and time.time() < fin:
+            regs = receptor.tomar(wal_sec.lsn, 30)
+            if not regs:
+                time.sleep(0.005)
+                continue
+            assert len(regs) <= 30 and receptor.pendientes() <= 100 + 40
+            wal_sec.append_many([r[2] for r in regs])
+            aplicados.extend(regs)
+        assert [r[0] for r in aplicados] == list(range(1, 501))
+        assert [r[2] for r in aplicados] == ops
+        wal_sec.flush()
+        receptor.avisar()
+        fin = time.time() + 3
+        while emisor.ack != 500 and time.time() < fin:
+            time.sleep(0.01)
+        assert emisor.ack == 500
+        st = receptor.estado(wal_sec.lsn)
+        assert st["aplicar_pendientes"] == 0 and st["recibido_lsn"] == 500
+        assert st["stats"]["lotes_aplicados"] >= 500 // 30
+        emisor.cerrar()
+        receptor.cerrar()
+        wal_pri.close()
+        wal_sec.close()
+    finally:
+        ctx.destroy(linger=0)
+        shutil.rmtree(d)
+
+def test_hueco_pide_continuacion():
+    d = tempfile.mkdtemp(prefix="test_repl_")
+    ctx = zmq.Context()
+    try:
+        s_sec, s_pri = _par(ctx, "hueco")
+        receptor = Receptor(s_sec, os.path.join(d, "wal.log.repl"))
+        s_pri.send_json({"tipo": "lote", "registros": [[1, "t", _op(1)], [2, "t", _op(2)]], "lsn": 4})
+        s_pri.send_json({"tipo": "lote", "registros": [[4, "t", _op(4)]], "lsn": 4})
+        time.sleep(0.05)
+        regs = receptor.recibir(0)
+        assert [r[0] for r in regs] == [1, 2]
+        assert receptor.stats["huecos"] == 1
+        assert s_pri.recv_json(flags=zmq.NOBLOCK) == {"tipo": "desde", "lsn": 2}
+        assert receptor.estado(2)["lag_ops"] == 2
+    finally:
+        ctx.destroy(linger=0)
+        shutil.rmtree(d)
+
+def test_divergencia_persistida():
+    d = tempfile.mkdtemp(prefix="test_repl_")
+    ctx = zmq.Context()
+    try:
+        path = os.path.join(d, "wal.log.repl")
+        s_sec, s_pri = _par(ctx, "divergencia")
+        receptor = Receptor(s_sec, path)
+        receptor.divergir(12)
+        receptor.divergir(15)               # solo cuenta la primera escritura propia
+        assert leer_divergencia(path) == 12
+        assert Receptor(s_sec, path).divergido == 12
+        # con divergencia no se aplica el flujo
+        s_pri.send_json({"tipo": "lote", "registros": [[13, "t", _op(13)]], "lsn": 13})
+        time.sleep(0.05)
+        assert receptor.recibir(12) == []
+    finally:
+        ctx.destroy(linger=0)
+        shutil.rmtree(d)
+
+def test_snapshot_con_escrituras_en_curso():
+    d = tempfile.mkdtemp(prefix="test_repl_")
+    ctx = zmq.Context()
+    try:
+        wal = WALWriter(os.path.join(d, "wal.log"), mode="always")
+        s_sec, s_pri = _par(ctx, "snapshot")
+        emisor = Emisor(s_pri, wal, lote=50, memoria=50, snapshot_libros=10)
+        path = os.path.join(d, "sec.repl")
+        receptor = Receptor(s_sec, path)
+        db = Catalogo()
+        for i in range(60):
+            db[f"BOOK-{i:03d}"] = {"code": f"BOOK-{i:03d}", "title": "", "available": 3, "loans": {}}
+        n = [0]
+
+        def escribir(k):
+            # el bucle del GA: WAL + catálogo, sin esperar al secondary
+            ops = []
+            for _ in range(k):
+                n[0] += 1
+                ops.append({"operacion": "prestamo" if n[0] % 3 else "devolucion",
+                            "book_code": f"BOOK-{n[0] * 7 % 60:03d}", "user_id": str(n[0] % 5),
+                            "due": "2030-01-01T00:00:00Z"})
+            lsns = wal.append_many(ops)
+            for lsn, op in zip(lsns, ops):
+                apply_op_to_db(db, op, lsn)
+            emisor.registrar(lsns, ops)
+
+        escribir(200)
+        emisor.producir(db, wal.lsn)
+        receptor.mantener(0, 0)
+        emisor.atender()
+        assert not emisor.enviar()          # 200 ops de atraso > 60 libros: snapshot
+        regs = receptor.recibir(0)
+        assert regs == [] and receptor.pide_snapshot and leer_marca(path).get("snapshot")
+
+        receptor.mantener(0, 0)             # {"tipo":"snapshot"}
+        emisor.atender()
+        snap = None
+        for _ in range(200):
+            emisor.producir(db, wal.lsn)
+            escribir(3)                     # el primary sigue atendiendo entre trozos
+            while emisor.enviar():
+                pass
+            receptor.recibir(0)
+            snap = receptor.tomar_snapshot()
+            if snap is not None:
+                break
+        assert snap is not None and snap["trozos"] == 6 and snap["hasta"] > snap["lsn"]
+
+        # instalación (como ga.instalar_snapshot) y flujo desde L0
+        sec = Catalogo()
+        for lsn, code, rec in snap["libros"]:
+            store_record(sec, code, rec, lsn)
+        receptor.instalado(snap)
+        assert receptor.resincronizando() == snap["hasta"]
+        aplicado = snap["lsn"]
+        omitidas = 0
+        for _ in range(100):
+            escribir(2)
+            while emisor.enviar():
+                pass
+            for lsn, _, op in receptor.recibir(aplicado):
+                if receptor.cubierto(op["book_code"], lsn):
+                    omitidas += 1
+                else:
+                    apply_op_to_db(sec, op, lsn)
+                aplicado = lsn
+            if aplicado == wal.lsn:
+                break
+        assert aplicado == wal.lsn and omitidas > 0
+        assert {c: db.get(c) for c in db} == {c: sec.get(c) for c in sec}
+        receptor.completar()
+        assert receptor.resincronizando() is None and not os.path.exists(path)
+        assert emisor.stats["snapshots"] == 1 and emisor.stats["snapshot_bytes"] > 0
+        wal.close()
+    finally:
+        ctx.destroy(linger=0)
+        shutil.rmtree(d)
+
+def test_failback_delta():
+    d = tempfile.mkdtemp(prefix="test_repl_")
+    ctx = zmq.Context()
+    try:
+        wal_pri = WALWriter(os.path.join(d, "pri.log"), mode="always")
+        wal_sec = WALWriter(os.path.join(d, "sec.log"), mode="always")
+        s_sec, s_pri = _par(ctx, "failback")
+        path = os.path.join(d, "sec.repl")
+        receptor = Receptor(s_sec, path)
+        receptor.wal = wal_sec
+        pri, sec = Catalogo(), Catalogo()
+        for db in (pri, sec):
+            for i in range(60):
+                db[f"BOOK-{i:03d}"] = {"code": f"BOOK-{i:03d}", "title": "", "available": 3, "loans": {}}
+        aplicados = set()
+
+        def escribir(wal, db, libros, prefijo):
+            ops = [{"operacion": "prestamo", "book_code": f"BOOK-{b:03d}", "user_id": prefijo,
+                    "due": "2030-01-01T00:00:00Z", "request_id": f"{prefijo}-{b}"} for b in libros]
+            for lsn, op in zip(wal.append_many(ops), ops):
+                apply_op_to_db(db, op, lsn)
+            return ops
+
+        # 30 escrituras replicadas; el primary cae con 3 sin replicar y el
+        # secondary atiende 12 propias (una es el reintento de una del primary)
+        comunes = escribir(wal_pri, pri, range(30), "c")
+        for lsn, op in zip(wal_sec.append_many(comunes), comunes):
+            apply_op_to_db(sec, op, lsn)
+        aplicados.update(op["request_id"] for op in escribir(wal_pri, pri, [40, 41, 42], "p"))
+        receptor.divergir(wal_sec.lsn)
+        propias = escribir(wal_sec, sec, range(45, 56), "s")
+        propias.append(escribir(wal_sec, sec, [42], "p")[0])
+        assert receptor.divergido == 30 and wal_sec.lsn == 42
+
+        # vuelve el primary: no atiende hasta recibir el tramo 31..42
+        emisor = Emisor(s_pri, wal_pri, lote=50, memoria=50, snapshot_libros=4, espera_failback_s=5)
+        assert emisor.bloquea()
+        receptor.mantener(wal_sec.lsn, wal_sec.durable_lsn)        # divergido
+        emisor.atender()                                            # ceder
+        receptor.recibir(30)
+        assert receptor.cediendo is not None and not receptor._ceder()
+        receptor.confirmar_cesion()                                 # el bucle ya no atiende
+        while receptor._ceder():
+            pass
+        receptor._ceder()                                           # divergencia_fin
+        emisor.atender()
+        registros = emisor.tomar_divergencia(100)
+        assert [r[0] for r in registros] == list(range(31, 43))
+        nuevas = [r[2] for r in registros if r[2]["request_id"] not in aplicados]
+        for lsn, op in zip(wal_pri.append_many(nuevas), nuevas):
+            apply_op_to_db(pri, op, lsn)
+            emisor.registrar([lsn], [op])
+        emisor.aplicado_divergencia(42, wal_pri.lsn, len(registros))
+        emisor._avanzar_failback()
+        assert not emisor.bloquea() and len(nuevas) == 11 and wal_pri.lsn == 44
+        assert os.path.exists(wal_pri.path + ".failback")
+
+        # el secondary descarta su tramo y trae solo los libros tocados desde 30
+        receptor.recibir(wal_sec.lsn)
+        assert receptor.divergido is None and leer_marca(path).get("parcial") == 30
+        receptor.mantener(0, 0)
+        emisor.atender()
+        snap = None
+        for _ in range(50):
+            emisor.producir(pri, wal_pri.lsn)
+            while emisor.enviar():
+                pass
+            receptor.recibir(0)
+            snap = receptor.tomar_snapshot()
+            if snap is not None:
+                break
+        assert snap is not None and snap["parcial"] and snap["lsn"] == 44
+        libros = list(snap["libros"])
+        assert sorted(code for _, code, _ in libros) == [f"BOOK-{b:03d}" for b in [40, 41, 42] + list(range(45, 56))]
+        for lsn, code, rec in libros:
+            store_record(sec, code, rec, lsn)
+        receptor.instalado(snap)
+        assert {c: pri.get(c) for c in pri} == {c: sec.get(c) for c in sec}
+        wal_pri.close()
+        wal_sec.close()
+    finally:
+        ctx.destroy(linger=0)
+        shutil.rmtree(d)
+
+if __name__ == "__main__":
+    for nombre, fn in list(globals().items()):
+        if nombre.startswith("test_") and callable(fn):
+            fn()
+            print(f"PASS {nombre}")
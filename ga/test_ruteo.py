@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# archivo: ga/test_ruteo.py
+#
+# Pruebas del ruteo por partición (ga/ruteo.py):
+# - shard_de es estable (blake2b, no depende de PYTHONHASHSEED ni del proceso)
+#   y reparte parejo
+# - TablaRuteo relee la tabla cuando cambia el archivo y usa el GA activo que
+#   indica el archivo de estado de cada partición
+# - una tabla inválida no reemplaza a la anterior; sin archivo, una partición
+#
+# Uso:
+#   python -m pytest -q ga/test_ruteo.py
+#   python ga/test_ruteo.py
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from ruteo import shard_de, TablaRuteo   # noqa: E402
+
+def _escribir(path, contenido, mtime):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(contenido if isinstance(contenido, str) else json.dumps(contenido))
+    # mtime explícito: dos escrituras en el mismo tick del reloj también cuentan
+    os.utime(path, (mtime, mtime))
+
+def _tabla(n, d):
+    return {"shards": [{"primary": f"tcp://ga{k}:6000", "secondary": f"tcp://ga{k}:6001",
+                        "estado": os.path.join(d, f"activo_{k}.txt")} for k in range(n)]}
+
+def test_shard_estable_y_parejo():
+    # valores fijos: cambiar el hash mueve libros de partición (re-particionar)
+    assert [shard_de(f"BOOK-{i:03d}", 4) for i in range(12)] == [2, 2, 3, 0, 0, 2, 3, 2, 0, 0, 1, 0]
+    assert shard_de("BOOK-001", 1) == 0 and shard_de("BOOK-001", 0) == 0
+    assert shard_de(7, 4) == shard_de("7", 4)
+    cuenta = Counter(shard_de(f"BOOK-{i:05d}", 4) for i in range(4000))
+    assert sorted(cuenta) == [0, 1, 2, 3]
+    assert min(cuenta.values()) > 900 and max(cuenta.values()) < 1100
+
+def test_recarga_y_anterior_si_invalida():
+    d = tempfile.mkdtemp(prefix="test_ruteo_")
+    try:
+        path = os.path.join(d, "ga_shards.json")
+        t = TablaRuteo("tcp://local:6000", "tcp://local:6001",
+                       estado=os.path.join(d, "activo.txt"), path=path)
+        # sin archivo: la partición única por defecto
+        assert t.n == 1 and t.direccion("BOOK-001") == "tcp://local:6000"
+
+        _escribir(path, _tabla(2, d), 1000)
+        assert t.n == 2
+        k = shard_de("BOOK-001", 2)
+        assert t.shard("BOOK-001") == k
+        assert t.direccion("BOOK-001") == f"tcp://ga{k}:6000"
+        codes = [f"BOOK-{i:03d}" for i in range(10)]
+        grupos = t.agrupar(codes)
+        assert sorted(c for g in grupos.values() for c in g) == codes
+        assert all(shard_de(c, 2) == s for s, g in grupos.items() for c in g)
+
+        # el monitor de la partición k pasó al secondary
+        _escribir(os.path.join(d, f"activo_{k}.txt"), "secondary\n", 1000)
+        assert t.direccion("BOOK-001") == f"tcp://ga{k}:6001"
+        assert t.direcciones()[1 - k] == f"tcp://ga{1 - k}:6000"
+
+        # tabla nueva: se relee al cambiar el mtime
+        _escribir(path, _tabla(4, d), 2000)
+        assert t.n == 4 and t.shard("BOOK-001") == shard_de("BOOK-001", 4)
+
+        # JSON roto, vacía o sin secondary: se mantiene la de 4 particiones
+        _escribir(path, "{\"shards\": [", 3000)
+        assert t.n == 4
+        _escribir(path, {"shards": []}, 4000)
+        assert t.n == 4
+        _escribir(path, {"shards": [{"primary": "tcp://x:6000"}]}, 5000)
+        assert t.n == 4 and len(t.direcciones()) == 4
+
+        # reparada: se toma; "estado" por defecto según la partición
+        _escribir(path, {"shards": [{"primary": "tcp://x:6000", "secondary": "tcp://x:6001"}]}, 6000)
+        assert t.n == 1 and t.shards[0]["estado"] == "gc/ga_activo.txt"
+
+        # sin archivo otra vez: vuelve a la partición por defecto
+        os.remove(path)
+        assert t.n == 1 and t.direccion() == "tcp://local:6000"
+    finally:
+        shutil.rmtree(d)
+
+if __name__ == "__main__":
+    for nombre, fn in list(globals().items()):
+        if nombre.startswith("test_") and callable(fn):
+            fn()
+            print(f"PASS {nombre}")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# archivo: ga/test_vencimientos.py
+#
+# Pruebas del vencimiento de préstamos (ga/db_ops.py, ga/vencimientos.py):
+# - un préstamo nuevo vence a los 14 días de la recepción en el GC: no aparece
+#   en la consulta de vencidos ni en el barrido, y sí cuando pasa el plazo
+# - el vencimiento se sella una vez en la operación (lo que va al WAL): aplicar
+#   la misma operación más tarde (replay, secondary) deja la misma fecha
+#
+# Uso:
+#   python -m pytest -q ga/test_vencimientos.py
+#   python ga/test_vencimientos.py
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import db_ops   # noqa: E402
+from db_ops import apply_op_to_db, consulta_vencimientos, sellar_vencimiento, ahora_us   # noqa: E402
+from vencimientos import Barrido, indice_de   # noqa: E402
+from wal_format import iso_to_us   # noqa: E402
+
+DIA_US = 86400 * 1000000
+
+def _catalogo():
+    return {"BOOK-001": {"code": "BOOK-001", "title": "Libro 1", "available": 2, "loans": {}}}
+
+def _prestamo(recv_ts):
+    return {"operacion": "prestamo", "book_code": "BOOK-001", "user_id": "7",
+            "recv_ts": recv_ts, "request_id": "req-1"}
+
+def test_prestamo_nuevo_no_vencido():
+    recv_ts = db_ops.iso()      # mismo formato que el recv_ts del GC
+    op = sellar_vencimiento(_prestamo(recv_ts))
+    assert iso_to_us(op["due"]) == iso_to_us(recv_ts) + 14 * DIA_US
+
+    db = _catalogo()
+    assert apply_op_to_db(db, op)["estado"] == "ok"
+    assert db["BOOK-001"]["loans"]["7"]["due"] == op["due"]
+
+    vencidos = consulta_vencimientos(db, {"operacion": "consulta_vencimientos"})
+    assert vencidos["total"] == 0 and vencidos["vencimientos"] == []
+    assert Barrido(60).ejecutar(indice_de(db), ahora_us()) == []
+
+    # pasado el plazo sí se informa
+    despues = ahora_us() + 15 * DIA_US
+    assert Barrido(60).ejecutar(indice_de(db), despues) == [
+        {"book_code": "BOOK-001", "user_id": "7", "due": op["due"]}]
+
+def test_vencimiento_sellado_es_determinista():
+    op = sellar_vencimiento(_prestamo("2026-03-01T10:00:00.250000Z"))
+    assert op["due"] == "2026-03-15T10:00:00.250000Z"
+    # un due ya sellado no se recalcula
+    assert sellar_vencimiento(dict(op, recv_ts=None))["due"] == op["due"]
+
+    db_a, db_b = _catalogo(), _catalogo()
+    apply_op_to_db(db_a, dict(op))
+    time.sleep(0.01)
+    apply_op_to_db(db_b, dict(op))
+    assert db_a == db_b
+
+def test_registro_viejo_sin_due():
+    # operaciones del WAL anteriores al sellado: el plazo se cuenta desde recv_ts
+    db = _catalogo()
+    apply_op_to_db(db, _prestamo("2026-03-01T10:00:00.250000Z"))
+    assert db["BOOK-001"]["loans"]["7"]["due"] == "2026-03-15T10:00:00.250000Z"
+    # sin recv_ts, desde ahora: tampoco nace vencido
+    db = _catalogo()
+    apply_op_to_db(db, _prestamo(None))
+    assert iso_to_us(db["BOOK-001"]["loans"]["7"]["due"]) > ahora_us() + (db_ops.DIAS_PRESTAMO - 1) * DIA_US
+
+if __name__ == "__main__":
+    for nombre, fn in list(globals().items()):
+        if nombre.startswith("test_") and callable(fn):
+            fn()
+            print(f"PASS {nombre}")
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# archivo: ga/test_wal.py
+#
+# Pruebas de recuperación del WAL del GA (ga/wal.py, ga/wal_format.py):
+# - cola rota (escritura interrumpida) en binario y JSON: valid_end, parada
+#   en el primer CRC inválido y reapertura del escritor
+# - conversión JSON <-> binario ida y vuelta
+# - iter_wal acotado por LSN sobre segmentos rotados y truncate()
+# - escritor fail-stop tras un error de escritura
+# - un error de fsync detiene el escritor (no confirma el lote)
+# - aviso on_durable al confirmar, en los tres modos
+#
+# Uso:
+#   python -m pytest -q ga/test_wal.py
+#   python ga/test_wal.py
+
+import os
+import sys
+import shutil
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from wal import WALWriter, iter_wal, wal_files, archived_segments   # noqa: E402
+from wal_format import iter_file, valid_end, convert_file, detect, MAGIC   # noqa: E402
+
+OPS = [
+    {"operacion": "prestamo", "book_code": "BOOK-001", "user_id": "7", "due": "2026-01-02T03:04:05.123456Z"},
+    {"operacion": "renovacion", "book_code": "BOOK-001", "user_id": "7", "nueva_fecha": "2026-01-09T03:04:05Z"},
+    {"operacion": "devolucion", "book_code": "BOOK-001", "user_id": 7},
+    {"operacion": "prestamo", "book_code": "BOOK-002", "user_id": "8", "due": "2026-02-01T00:00:00Z", "title": "Extra"},
+    {"operacion": "devolucion", "book_code": "BOOK-002", "user_id": None},
+]
+
+def _dir():
+    return tempfile.mkdtemp(prefix="test_wal_")
+
+def _escribir(path, ops, fmt, segment_bytes=16 * 1024 * 1024):
+    w = WALWriter(path, mode="always", fmt=fmt, segment_bytes=segment_bytes)
+    for op in ops:
+        w.append(op)
+    w.close()
+
+def _ops(path):
+    return [(lsn, entry["op"]) for lsn, entry in iter_wal(path)]
+
+def test_cola_rota_binario():
+    d = _dir()
+    try:
+        path = os.path.join(d, "w.log")
+        _escribir(path, OPS, "binary")
+        completo = os.path.getsize(path)
+        assert valid_end(path) == completo
+
+        # registro final a medio escribir: se descarta y el escritor sigue el LSN
+        with open(path, "ab") as f:
+            f.write(b"\x30\x00\x00\x00\x01\x02")
+        assert valid_end(path) == completo
+        assert [lsn for lsn, _ in iter_file(path)] == [1, 2, 3, 4, 5]
+        w = WALWriter(path, start_lsn=5, mode="always", fmt="binary")
+        assert os.path.getsize(path) == completo
+        w.append(OPS[0])
+        w.close()
+        assert [lsn for lsn, _ in iter_file(path)] == [1, 2, 3, 4, 5, 6]
+
+        # CRC inválido en medio: la lectura se detiene en el registro dañado
+        data = bytearray(open(path, "rb").read())
+        data[-3] ^= 0xFF
+        open(path, "wb").write(bytes(data))
+        stats = {}
+        assert [lsn for lsn, _ in iter_file(path, stats)] == [1, 2, 3, 4, 5]
+        assert stats.get("torn") == "CRC inválido"
+        assert valid_end(path) == completo
+    finally:
+        shutil.rmtree(d)
+
+def test_cola_rota_json():
+    d = _dir()
+    try:
+        path = os.path.join(d, "w.log")
+        _escribir(path, OPS[:3], "json")
+        completo = os.path.getsize(path)
+        with open(path, "ab") as f:
+            f.write(b'{"lsn": 4, "ts": "2026-01-01T00:00:00Z", "op": {"operac')
+        assert valid_end(path) == completo
+        w = WALWriter(path, start_lsn=3, mode="always", fmt="json")
+        w.append(OPS[3])
+        w.close()
+        assert [lsn for lsn, _ in iter_file(path)] == [1, 2, 3, 4]
+    finally:
+        shutil.rmtree(d)
+
+def test_conversion_ida_y_vuelta():
+    d = _dir()
+    try:
+        js = os.path.join(d, "w.json.log")
+        _escribir(js, OPS, "json")
+        bn, js2 = os.path.join(d, "w.bin.log"), os.path.join(d, "w.json2.log")
+        assert convert_file(js, bn, "binary") == len(OPS)
+        assert detect(bn) == "binary" and open(bn, "rb").read(len(MAGIC)) == MAGIC
+        assert convert_file(bn, js2, "json") == len(OPS)
+        original = list(iter_file(js))
+        for archivo in (bn, js2):
+            convertido = list(iter_file(archivo))
+            assert [lsn for lsn, _ in convertido] == [lsn for lsn, _ in original]
+            assert [e["op"] for _, e in convertido] == [e["op"] for _, e in original]
+        assert os.path.getsize(bn) < os.path.getsize(js)
+    finally:
+        shutil.rmtree(d)
+
+def test_iter_wal_por_lsn_y_truncate():
+    for fmt in ("json", "binary"):
+        d = _dir()
+        try:
+            path = os.path.join(d, "w.log")
+            ops = [dict(OPS[i % len(OPS)], book_code=f"BOOK-{i:03d}") for i in range(200)]
+            _escribir(path, ops, fmt, segment_bytes=1024)
+            segs = archived_segments(path)
+            assert len(segs) >= 3, fmt
+            assert [lsn for lsn, _ in _ops(path)] == list(range(1, 201))
+
+            # acotado por LSN: solo la cola, sin abrir segmentos cubiertos
+            corte = segs[2][0] + 1
+            assert [lsn for lsn, _ in iter_wal(path, after_lsn=corte)] == list(range(corte + 1, 201))
+            assert segs[0][1] not in wal_files(path, after_lsn=corte)
+
+            # truncate borra solo segmentos con todas sus entradas <= lsn
+            w = WALWriter(path, start_lsn=200, mode="always", fmt=fmt, segment_bytes=1024)
+            w.truncate(corte)
+            restantes = archived_segments(path)
+            assert restantes[0][0] <= corte + 1
+            assert all(s in segs for s in restantes)
+            w.append(OPS[0])
+            w.close()
+            assert [lsn for lsn, _ in iter_wal(path, after_lsn=corte)] == list(range(corte + 1, 202))
+        finally:
+            shutil.rmtree(d)
+
+def test_escritor_fail_stop():
+    d = _dir()
+    try:
+        path = os.path.join(d, "w.log")
+        w = WALWriter(path, mode="group", window_ms=1)
+        w.wait(w.append(OPS[0]), timeout=5)
+        escribir = w._write_batch
+
+        def roto(items, last):
+            raise OSError("disco lleno")
+        w._write_batch = roto
+        lsn = w.append(OPS[1])
+        try:
+            w.wait(lsn, timeout=5)
+            assert False, "wait debía fallar"
+        except OSError:
+            pass
+        w._write_batch = escribir
+        try:
+            w.append(OPS[2])
+            assert False, "append debía fallar tras el error"
+        except RuntimeError:
+            pass
+        assert w.durable_lsn == 1
+        w.close()
+        assert [lsn for lsn, _ in iter_file(path)] == [1]
+    finally:
+        shutil.rmtree(d)
+
+def test_fsync_fallido_no_confirma():
+    # EIO en fsync: el lote no es durable, wait falla y el escritor se detiene
+    for modo in ("always", "group"):
+        d = _dir()
+        fsync = os.fsync
+        try:
+            path = os.path.join(d, "w.log")
+            w = WALWriter(path, mode=modo, window_ms=1)
+            w.wait(w.append(OPS[0]), timeout=5)
+
+            def roto(fd):
+                raise OSError(5, "Input/output error")
+            os.fsync = roto
+            try:
+                w.wait(w.append(OPS[1]), timeout=5)
+                assert False, f"{modo}: el lote no debía confirmarse"
+            except OSError:
+                pass
+            os.fsync = fsync
+            assert w.durable_lsn == 1, modo
+            assert w.error is not None, modo
+            try:
+                w.append(OPS[2])
+                assert False, f"{modo}: append debía fallar tras el error"
+            except RuntimeError:
+                pass
+            w.close()
+        finally:
+            os.fsync = fsync
+            shutil.rmtree(d)
+
+def test_aviso_durable_en_todos_los_modos():
+    # on_durable llega con el LSN confirmado también en always (sin hilo escritor)
+    for modo in ("always", "group", "interval"):
+        d = _dir()
+        try:
+            w = WALWriter(os.path.join(d, "w.log"), mode=modo, window_ms=1, interval_ms=1)
+            avisos = []
+            w.on_durable = avisos.append
+            lsns = w.append_many(OPS[:2])
+            w.wait(lsns[-1], timeout=5)
+            w.close()
+            assert avisos and max(avisos) == lsns[-1], (modo, avisos)
+        finally:
+            shutil.rmtree(d)
+
+if __name__ == "__main__":
+    for nombre, fn in list(globals().items()):
+        if nombre.startswith("test_") and callable(fn):
+            fn()
+            print(f"PASS {nombre}")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# archivo: ga/vencimientos.py
+#
+# Índice de préstamos ordenado por vencimiento y barrido de vencidos del GA.
+#
+# IndiceVencimientos guarda (due_us, book_code, user_id) de los préstamos
+# vigentes en una lista ordenada (bisect): "vencidos" y "vencen en las
+# próximas N horas" son rangos de la lista y no recorren el catálogo. Lo
+# mantiene el catálogo en cada put() (prestamo/renovacion/devolucion pasan por
+# apply_op_to_db -> put), igual que el índice por usuario.
+#
+# Barrido emite en lotes los préstamos que vencieron desde el barrido
+# anterior: el rango (marca, ahora] más los "tardíos", préstamos que entraron
+# al índice con un vencimiento ya pasado por la marca (p. ej. un prestamo con
+# due antiguo) y que el rango no volvería a ver.
+#
+# Solo notifica el GA que atiende (ver GA_STATUS_FILE en ga/ga.py); el otro
+# rol avanza la marca con un intervalo de retraso: tras un failover el nuevo
+# activo repite a lo sumo un intervalo y no pierde vencimientos.
+#
+# Los vencimientos que no son ISO-8601 'Z' (ver wal_format.iso_to_us) no
+# entran al índice.
+
+import time
+from bisect import bisect_left, insort
+
+from wal_format import iso_to_us, us_to_iso
+
+def vencimientos_de(record):
+    # {user_id: due_us} de los préstamos de un registro (cualquier forma)
+    loans = record.get("loans") if isinstance(record, dict) else None
+    if not isinstance(loans, dict):
+        return {}
+    out = {}
+    for user, loan in loans.items():
+        if type(user) is str and isinstance(loan, dict):
+            due = iso_to_us(loan.get("due"))
+            if due is not None:
+                out[user] = due
+    return out
+
+class IndiceVencimientos:
+    """
+    Préstamos vigentes ordenados por vencimiento.
+
+    actualizar(code, antes, despues) -> aplica el cambio de {user: due_us} de un libro
+    rango(desde_us, hasta_us, limite) -> [(due_us, code, user)] con desde <= due <= hasta
+    """
+
+    def __init__(self):
+        self._orden = []        # [(due_us, code, user)] ordenada
+        self.marca_us = None    # hasta dónde llegó el último barrido
+        self.tardios = []       # entradas con due <= marca_us agregadas después del barrido
+
+    def __len__(self):
+        return len(self._orden)
+
+    def actualizar(self, code, antes, despues):
+        if type(code) is not str:
+            return
+        for user, due in antes.items():
+            if despues.get(user) != due:
+                i = bisect_left(self._orden, (due, code, user))
+                if i < len(self._orden) and self._orden[i] == (due, code, user):
+                    del self._orden[i]
+        for user, due in despues.items():
+            if antes.get(user) != due:
+                insort(self._orden, (due, code, user))
+                if self.marca_us is not None and due <= self.marca_us:
+                    self.tardios.append((due, code, user))
+
+    def contiene(self, entrada):
+        i = bisect_left(self._orden, entrada)
+        return i < len(self._orden) and self._orden[i] == entrada
+
+    def rango(self, desde_us=None, hasta_us=None, limite=None):
+        lo = 0 if desde_us is None else bisect_left(self._orden, (desde_us,))
+        hi = len(self._orden) if hasta_us is None else bisect_left(self._orden, (hasta_us + 1,))
+        if limite is not None:
+            hi = min(hi, lo + limite)
+        return self._orden[lo:hi]
+
+    def contar(self, desde_us=None, hasta_us=None):
+        lo = 0 if desde_us is None else bisect_left(self._orden, (desde_us,))
+        hi = len(self._orden) if hasta_us is None else bisect_left(self._orden, (hasta_us + 1,))
+        return max(hi - lo, 0)
+
+    @classmethod
+    def desde_entradas(cls, entradas):
+        # entradas: (due_us, code, user) en cualquier orden
+        indice = cls()
+        indice._orden = sorted(e for e in entradas if type(e[1]) is str)
+        return indice
+
+    @classmethod
+    def desde_items(cls, items):
+        # items: (code, record); para los motores que lo arman al primer uso
+        return cls.desde_entradas((due, code, user) for code, rec in items
+                                  for user, due in vencimientos_de(rec).items())
+
+def indice_de(db):
+    # índice del catálogo; los dict planos (herramientas) se recorren completos
+    indice = getattr(db, "indice_vencimientos", None)
+    if indice is not None:
+        return indice()
+    return IndiceVencimientos.desde_items(db.items())
+
+class Barrido:
+    """
+    Barrido periódico de préstamos vencidos.
+
+    ejecutar(indice, ahora_us) -> [{"book_code","user_id","due"}] vencidos
+    desde el barrido anterior; el primero emite todos los ya vencidos.
+    """
+
+    def __init__(self, intervalo_s=60.0):
+        self.intervalo_s = float(intervalo_s)
+        self.ultimo = None       # time.monotonic() del último barrido
+        self.stats = {"barridos": 0, "notificados": 0, "max_lote": 0}
+
+    def due(self):
+        if self.intervalo_s <= 0:
+            return False
+        return self.ultimo is None or time.monotonic() - self.ultimo >= self.intervalo_s
+
+    def ejecutar(self, indice, ahora_us):
+        desde = None if indice.marca_us is None else indice.marca_us + 1
+        vencidos = indice.rango(desde, ahora_us)
+        if indice.tardios:
+            # solo los que siguen en el índice con el mismo vencimiento
+            vencidos = sorted(set(vencidos).union(e for e in indice.tardios if indice.contiene(e)))
+            indice.tardios = []
+        if indice.marca_us is None or ahora_us > indice.marca_us:
+            indice.marca_us = ahora_us
+        self.ultimo = time.monotonic()
+        self.stats["barridos"] += 1
+        self.stats["notificados"] += len(vencidos)
+        self.stats["max_lote"] = max(self.stats["max_lote"], len(vencidos))
+        return [{"book_code": code, "user_id": user, "due": us_to_iso(due)} for due, code, user in vencidos]
+
+    def avanzar(self, indice, hasta_us):
+        # rol pasivo: no notifica, pero lleva la marca hasta hasta_us para que
+        # al tomar el servicio no reemita todo lo que ya notificó el activo
+        if hasta_us is not None and (indice.marca_us is None or hasta_us > indice.marca_us):
+            indice.marca_us = hasta_us
+            indice.tardios = []
+        self.ultimo = time.monotonic()
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+# archivo: ga/wal.py
+#
+# WAL del Gestor Administrador (GA): escritor con "group commit", LSN por
+# entrada y segmentos de tamaño fijo.
+#
+# En lugar de abrir el archivo, escribir una línea y hacer fsync por cada
+# operación, las entradas se acumulan en memoria y un hilo escritor las
+# vuelca en un solo write + fsync por lote. Cada entrada recibe un LSN (log
+# sequence number) creciente y quien la agrega puede esperar a que ese LSN
+# sea durable antes de responder al actor.
+#
+# Formato de cada entrada (GA_WAL_FORMAT, ver ga/wal_format.py):
+#   json   -> {"lsn": 42, "ts": "...Z", "op": {...}} por línea (default)
+#   binary -> registros con longitud + CRC32, ids internados y timestamps
+#             en microsegundos (varias veces más chico y rápido de leer)
+# Al abrir, una cola rota por una escritura interrumpida se descarta.
+#
+# Segmentos: el segmento activo es siempre GA_WAL_FILE (p.ej.
+# gc/ga_wal_primary.log). Al superar GA_WAL_SEGMENT_BYTES se rota a
+# GA_WAL_FILE.<lsn_inicial con 12 dígitos> y se abre uno nuevo. truncate(lsn)
+# borra los segmentos rotados cuyas entradas ya están cubiertas por un
+# checkpoint, de modo que el arranque solo reproduce la cola posterior.
+#
+# Modos de durabilidad (GA_WAL_SYNC_MODE):
+#   always   -> write + fsync inline por cada entrada (comportamiento original)
+#   group    -> lotes por ventana de tiempo (GA_WAL_GROUP_WINDOW_MS) o por
+#               tamaño (GA_WAL_GROUP_MAX); una sola fsync por lote
+#   interval -> write inmediato, fsync periódico cada GA_WAL_SYNC_INTERVAL_MS
+#               (las entradas se consideran confirmadas al llegar al SO;
+#               ante caída de la máquina se pueden perder hasta un intervalo)
+#
+# Un error de escritura detiene el escritor: append/wait/flush lo propagan
+# desde entonces y durable_lsn no avanza más allá del último lote escrito, de
+# modo que nunca se confirma un LSN posterior a una entrada perdida.
+
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+from wal_format import iter_file, codec_for, detect, valid_end
+
+SYNC_MODES = ("always", "group", "interval")
+
+def iso():
+    return datetime.utcnow().isoformat() + "Z"
+
+def _fsync(f):
+    # Sin capturar errores: un EIO en fsync no es durabilidad, y el escritor
+    # tiene que quedar detenido (fail-stop) en lugar de confirmar el lote.
+    f.flush()
+    os.fsync(f.fileno())
+
+# ----------------- Segmentos / lectura -----------------
+def segment_path(base, first_lsn):
+    return f"{base}.{first_lsn:012d}"
+
+def archived_segments(base):
+    # Segmentos rotados [(lsn_inicial, path)] ordenados por LSN.
+    folder = os.path.dirname(base) or "."
+    name = os.path.basename(base)
+    pat = re.compile(re.escape(name) + r"\.(\d{12})$")
+    out = []
+    try:
+        for fn in os.listdir(folder):
+            m = pat.match(fn)
+            if m:
+                out.append((int(m.group(1)), os.path.join(folder, fn)))
+    except FileNotFoundError:
+        pass
+    return sorted(out)
+
+def _first_lsn(path):
+    try:
+        for lsn, _ in iter_file(path):
+            return lsn
+    except FileNotFoundError:
+        pass
+    return None
+
+def wal_files(base, after_lsn=0):
+    # Archivos del WAL (rotados + activo) que pueden tener lsn > after_lsn.
+    segs = archived_segments(base)
+    paths = []
+    for i, (first, path) in enumerate(segs):
+        nxt = segs[i + 1][0] if i + 1 < len(segs) else None
+        if nxt is not None and nxt - 1 <= after_lsn:
+            continue
+        paths.append(path)
+    if os.path.exists(base):
+        paths.append(base)
+    return paths
+
+def iter_wal(base, after_lsn=0):
+    """
+    Recorre el WAL (segmentos rotados + activo) en orden y entrega
+    (lsn, entry) con lsn > after_lsn. Los segmentos completamente cubiertos
+    por after_lsn ni se abren. Las líneas legado sin LSN se entregan con
+    lsn None.
+    """
+    for path in wal_files(base, after_lsn):
+        yield from iter_file(path, after_lsn=after_lsn)
+
+def last_lsn(base):
+    # Último LSN escrito: se busca en el activo y, si está vacío, en el último rotado.
+    candidates = [base] + [p for _, p in reversed(archived_segments(base))]
+    for path in candidates:
+        if not os.path.exists(path):
+            continue
+        last = None
+        for lsn, _ in iter_file(path):
+            if lsn is not None:
+                last = lsn
+        if last is not None:
+            return last
+    return 0
+
+def migrate_legacy(base):
+    # Un WAL activo escrito antes de los LSN (líneas {"ts","op"}) se aparta a
+    # base + ".pre-lsn" para que el nuevo escritor empiece limpio.
+    if not os.path.exists(base) or os.path.getsize(base) == 0:
+        return None
+    for lsn, _ in iter_file(base):
+        if lsn is not None:
+            return None
+        break
+    legacy = base + ".pre-lsn"
+    with open(base, "rb") as src, open(legacy, "ab") as dst:
+        dst.write(src.read())
+        _fsync(dst)
+    os.remove(base)
+    print(f"[{iso()}] WAL sin LSN movido a {legacy}")
+    return legacy
+
+def apartar(base):
+    # Mueve el WAL (rotados + activo) a base.apartado-<ts>/ cuando el
+    # catálogo viene de un pickle sin LSN o de un snapshot del primary: esas
+    # entradas no se le pueden aplicar encima. Devuelve el directorio (None
+    # si no había WAL).
+    paths = [p for _, p in archived_segments(base)]
+    if os.path.exists(base) and os.path.getsize(base) > 0:
+        paths.append(base)
+    if not paths:
+        return None
+    destino = f"{base}.apartado-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}"
+    os.makedirs(destino, exist_ok=True)
+    for path in paths:
+        os.replace(path, os.path.join(destino, os.path.basename(path)))
+    print(f"[{iso()}] WAL apartado en {destino} ({len(paths)} archivo(s))")
+    return destino
+
+# ----------------- Escritor -----------------
+class WALWriter:
+    """
+    Escritor append-only del WAL con confirmación por LSN.
+
+    append(op)         -> LSN asignado a la entrada (no espera durabilidad)
+    append_many(ops)   -> LSN consecutivos; las entradas van en el mismo lote (un fsync)
+    wait(lsn)          -> bloquea hasta que la entrada lsn sea durable
+    append_and_wait()  -> atajo de las dos anteriores
+    durable_lsn        -> último LSN confirmado (sin bloquear)
+    on_durable         -> callback(lsn) al confirmar un lote: desde el hilo escritor,
+                          o desde append_many en modo always
+    truncate(lsn)      -> borra segmentos rotados cubiertos por un checkpoint
+    reiniciar(lsn)     -> aparta el WAL y sigue vacío desde lsn (snapshot instalado)
+    """
+
+    def __init__(self, path, start_lsn=0, mode="group", window_ms=2.0, max_batch=256,
+                 interval_ms=50.0, segment_bytes=16 * 1024 * 1024, fmt="json"):
+        if mode not in SYNC_MODES:
+            raise ValueError(f"modo WAL invalido: {mode} (validos: {', '.join(SYNC_MODES)})")
+        self.path = path
+        self.mode = mode
+        self.window_s = max(window_ms, 0.0) / 1000.0
+        self.max_batch = max(int(max_batch), 1)
+        self.interval_s = max(interval_ms, 1.0) / 1000.0
+        self.segment_bytes = max(int(segment_bytes), 1024)
+
+        self.codec = codec_for(fmt)
+        self._seg_lock = threading.Lock()       # rotación vs truncate
+        self._f = self._open_active()
+        self._active_first = _first_lsn(path)   # LSN inicial del segmento activo
+        self._cond = threading.Condition()
+        self._pending = []          # (lsn, ts, op) aun no escritas
+        self._next_seq = start_lsn  # ultimo LSN asignado
+        self._durable_seq = start_lsn   # ultimo LSN confirmado (segun el modo)
+        self._synced_seq = start_lsn    # ultimo LSN con fsync hecho
+        self._sync_requested = False
+        self._waiters = 0           # hilos esperando confirmacion
+        self._error = None          # ultimo error de escritura (se propaga a wait)
+        self._closed = False
+        self.on_durable = None      # aviso sin bloquear (p. ej. al bucle del GA)
+
+        # estadisticas simples (lotes, fsyncs y segmentos)
+        self.stats = {"entradas": 0, "lotes": 0, "fsyncs": 0, "bytes": 0,
+                      "segmentos_rotados": 0, "segmentos_borrados": 0}
+
+        self._thread = None
+        if mode != "always":
+            self._thread = threading.Thread(target=self._run, name="wal-writer", daemon=True)
+            self._thread.start()
+
+    # ----------------- API -----------------
+    @property
+    def lsn(self):
+        return self._next_seq
+
+    @property
+    def durable_lsn(self):
+        return self._durable_seq
+
+    @property
+    def error(self):
+        return self._error
+
+    def append(self, op):
+        return self.append_many((op,))[0]
+
+    def append_many(self, ops):
+        # todas bajo el mismo lock: el hilo escritor las toma juntas
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("WAL cerrado")
+            if self._error is not None:
+                raise RuntimeError(f"WAL detenido por error de escritura: {self._error}")
+            ts = iso()
+            first = self._next_seq + 1
+            items = [(first + i, ts, op) for i, op in enumerate(ops)]
+            if not items:
+                return []
+            self._next_seq = seq = items[-1][0]
+            if self.mode == "always":
+                try:
+                    self._write_batch(items, seq)
+                    _fsync(self._f)
+                    self.stats["fsyncs"] += 1
+                    self._durable_seq = self._synced_seq = seq
+                    self._maybe_roll()
+                except Exception as e:
+                    self._error = e
+                    self._cond.notify_all()
+                    raise
+            else:
+                self._pending.extend(items)
+                self._cond.notify_all()
+        if self.mode == "always" and self.on_durable is not None:
+            # ya durable: sin hilo escritor, avisa quien agregó (fuera del lock)
+            self.on_durable(seq)
+        return list(range(first, seq + 1))
+
+    def wait(self, seq, timeout=None):
+        return self._wait_for(lambda: self._durable_seq >= seq, seq, timeout)
+
+    def append_and_wait(self, op, timeout=None):
+        return self.wait(self.append(op), timeout=timeout)
+
+    def flush(self, timeout=None):
+        # fuerza a disco (fsync) todo lo agregado hasta ahora
+        with self._cond:
+            seq = self._next_seq
+            self._sync_requested = True
+            self._cond.notify_all()
+        return self._wait_for(lambda: self._synced_seq >= seq, seq, timeout)
+
+    def truncate(self, upto_lsn):
+        # Borra segmentos rotados cuyas entradas son todas <= upto_lsn.
+        removed = 0
+        with self._seg_lock:
+            segs = archived_segments(self.path)
+            for i, (first, path) in enumerate(segs):
+                nxt = segs[i + 1][0] if i + 1 < len(segs) else self._active_first
+                if nxt is None or nxt - 1 > upto_lsn:
+                    break
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        self.stats["segmentos_borrados"] += removed
+        return removed
+
+    def reiniciar(self, lsn):
+        # Empieza un WAL vacío en lsn (catálogo reemplazado por un snapshot del
+        # primary): el anterior se aparta con apartar(). Sin appends en curso.
+        self.flush(timeout=5)
+        with self._cond:
+            if self._pending:
+                raise RuntimeError("reiniciar con entradas pendientes")
+            with self._seg_lock:
+                # el archivo anterior no se cierra aquí: el hilo escritor puede
+                # tener una referencia y se cierra al soltarla
+                self._f.flush()
+                apartar(self.path)
+                self._f = open(self.path, "ab")
+                self.codec.reset()
+                self._active_first = None
+            self._next_seq = self._durable_seq = self._synced_seq = lsn
+            self._cond.notify_all()
+
+    def close(self):
+        try:
+            self.flush(timeout=5)
+        except Exception as e:
+            print(f"[{iso()}] Aviso: flush final del WAL fallo: {e}", file=sys.stderr)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        try:
+            self._f.close()
+        except Exception:
+            pass
+
+    # ----------------- internos -----------------
+    def _wait_for(self, predicate, seq, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._waiters += 1
+            try:
+                return self._wait_loop(predicate, seq, deadline)
+            finally:
+                self._waiters -= 1
+
+    def _wait_loop(self, predicate, seq, deadline):
+        # se llama con self._cond tomado
+        while not predicate():
+            if self._error is not None:
+                raise self._error
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError(f"WAL lsn {seq} no confirmado a tiempo")
+            self._cond.wait(remaining)
+        return seq
+
+    def _open_active(self):
+        # Abre el segmento activo para append: descarta una cola rota y, si
+        # quedó en otro formato (cambio de GA_WAL_FORMAT), lo rota primero.
+        fmt = detect(self.path)
+        if fmt is not None:
+            size = os.path.getsize(self.path)
+            end = valid_end(self.path)
+            if end < size:
+                print(f"[{iso()}] Aviso: WAL {self.path} truncado de {size} a {end} bytes (escritura incompleta)", file=sys.stderr)
+                with open(self.path, "r+b") as f:
+                    f.truncate(end)
+                    _fsync(f)
+            first = _first_lsn(self.path)
+            if fmt != self.codec.name:
+                if first is not None:
+                    os.replace(self.path, segment_path(self.path, first))
+                else:
+                    open(self.path, "wb").close()   # sin entradas: se descarta
+            elif fmt == "binary":
+                self.codec.resume(self.path)
+        return open(self.path, "ab")
+
+    def _write_batch(self, items, last):
+        # se codifica aquí (no en append) para que los strings internados
+        # queden en el mismo segmento que las entradas que los usan
+        if self._active_first is None:
+            self._active_first = last - len(items) + 1
+        if self._f.tell() == 0:
+            self._f.write(self.codec.header())
+        data = b"".join(self.codec.encode(lsn, ts, op) for lsn, ts, op in items)
+        self._f.write(data)
+        self.stats["entradas"] += len(items)
+        self.stats["lotes"] += 1
+        self.stats["bytes"] += len(data)
+
+    def _maybe_roll(self):
+        # Rota el segmento activo si superó el tamaño (se llama tras un fsync).
+        if self._active_first is None or self._f.tell() < self.segment_bytes:
+            return
+        with self._seg_lock:
+            _fsync(self._f)
+            self._f.close()
+            os.replace(self.path, segment_path(self.path, self._active_first))
+            self._f = open(self.path, "ab")
+            self.codec.reset()
+            self._active_first = None
+            self.stats["segmentos_rotados"] += 1
+
+    def _run(self):
+        last_sync = time.monotonic()
+        dirty = False   # (interval) hay datos escritos sin fsync
+        while True:
+            with self._cond:
+                if self._error is not None:
+                    return      # fail-stop: lo pendiente nunca será durable
+                if self.mode == "group":
+                    while not self._pending and not self._sync_requested and not self._closed:
+                        self._cond.wait()
+                    concurrentes = len(self._pending) > 1 or self._waiters > 1
+                    if concurrentes and len(self._pending) < self.max_batch and self.window_s > 0:
+                        # ventana de commit: esperar a que lleguen más entradas
+                        # (solo si hay otros escritores; uno solo no espera)
+                        deadline = time.monotonic() + self.window_s
+                        while len(self._pending) < self.max_batch and not self._closed:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                break
+                            self._cond.wait(remaining)
+                elif not self._pending and not self._sync_requested and not self._closed:
+                    self._cond.wait(self.interval_s)
+                if self._closed and not self._pending and not dirty:
+                    return
+                batch = self._pending
+                self._pending = []
+                upto = self._next_seq   # todo LSN <= upto está en batch o ya escrito
+                force = self._sync_requested or self._closed
+                self._sync_requested = False
+
+            # write + fsync fuera del lock: los actores siguen encolando
+            err = None
+            synced = False
+            try:
+                if batch:
+                    self._write_batch(batch, upto)
+                self._f.flush()
+                dirty = dirty or bool(batch)
+                if self.mode == "group" or (dirty and (force or time.monotonic() - last_sync >= self.interval_s)):
+                    _fsync(self._f)
+                    self.stats["fsyncs"] += 1
+                    last_sync = time.monotonic()
+                    dirty = False
+                    synced = True
+                elif not dirty:
+                    synced = True
+                if synced:
+                    self._maybe_roll()
+            except Exception as e:
+                err = e
+                print(f"[{iso()}] ERROR escribiendo lote WAL: {e}", file=sys.stderr)
+
+            with self._cond:
+                if err is not None:
+                    self._error = err
+                else:
+                    self._durable_seq = upto
+                    if synced:
+                        self._synced_seq = upto
+                self._cond.notify_all()
+            if self.on_durable is not None and (batch or err is not None):
+                self.on_durable(upto)
+
+def writer_from_env(path, start_lsn=0):
+    # Construye el escritor a partir de las variables GA_WAL_*.
+    mode = os.getenv("GA_WAL_SYNC_MODE", "group").lower()
+    return WALWriter(
+        path,
+        start_lsn=start_lsn,
+        mode=mode,
+        window_ms=float(os.getenv("GA_WAL_GROUP_WINDOW_MS", "2")),
+        max_batch=int(os.getenv("GA_WAL_GROUP_MAX", "256")),
+        interval_ms=float(os.getenv("GA_WAL_SYNC_INTERVAL_MS", "50")),
+        segment_bytes=int(os.getenv("GA_WAL_SEGMENT_BYTES", str(16 * 1024 * 1024))),
+        fmt=os.getenv("GA_WAL_FORMAT", "json").lower(),
+    )
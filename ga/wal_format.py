@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# archivo: ga/wal_format.py
+#
+# Formatos de registro del WAL del GA (GA_WAL_FORMAT):
+#
+#   json   -> una línea por entrada: {"lsn": 42, "ts": "...Z", "op": {...}}
+#   binary -> registros con prefijo de longitud y CRC32:
+#
+#       cabecera de archivo : MAGIC (8 bytes)
+#       registro            : <u32 len><u32 crc32(payload)> payload
+#       payload[0] = tipo
+#         0x01 DEF  : <u32 id><u16 n> utf8          (interna un string)
+#         0x02 OP   : <u64 lsn><i64 ts_us><u8 opcode><u8 flags>
+#                     <u32 book_id><u32 user_id>
+#                     [<i64 fecha_us>]              (flags & F_FECHA)
+#                     [<u32 n> json extras]         (flags & F_EXTRAS)
+#         0x03 JSON : <u64 lsn> json de la entrada completa (respaldo)
+#
+#   Los book_code / user_id se internan por segmento (los DEF se emiten la
+#   primera vez que aparecen en el archivo), así cada segmento se puede leer
+#   solo aunque se borren los anteriores. Los timestamps viajan como epoch
+#   en microsegundos. Los campos redundantes que agrega el pipeline
+#   (recv_ts, published_ts, origen, procesado_ts) no se guardan: para
+#   'prestamo' la fecha efectiva (due/nueva_fecha/recv_ts) se guarda como
+#   'due', que es lo único que usa apply_op_to_db.
+#
+# Ambos formatos se leen con iter_file(), que detecta el formato por la
+# cabecera, y valid_end() encuentra el final de la última entrada completa
+# para descartar escrituras truncadas (torn writes) antes de reabrir.
+
+import os
+import sys
+import json
+import struct
+import zlib
+import time
+import functools
+from datetime import datetime, timedelta
+
+MAGIC = b"GAWAL\x00\x01\n"
+FORMATS = ("json", "binary")
+
+DEF, OP, JSON_REC = 0x01, 0x02, 0x03
+OPCODES = {"prestamo": 1, "renovacion": 2, "devolucion": 3}
+OPNAMES = {v: k for k, v in OPCODES.items()}
+
+F_FECHA = 0x01        # trae fecha_us
+F_EXTRAS = 0x02       # trae json con campos adicionales
+F_NUEVA_FECHA = 0x04  # la fecha se llamaba 'nueva_fecha' (si no, 'due')
+F_USER_INT = 0x08     # user_id era int en el payload original
+
+NONE_ID = 0xFFFFFFFF
+REDUNDANTES = ("recv_ts", "published_ts", "origen", "procesado_ts")
+
+_HDR = struct.Struct("<II")
+_OP = struct.Struct("<QqBBII")
+_I64 = struct.Struct("<q")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_DEF = struct.Struct("<IH")
+
+_EPOCH = datetime(1970, 1, 1)
+_US = timedelta(microseconds=1)
+
+def iso():
+    return datetime.utcnow().isoformat() + "Z"
+
+# ----------------- timestamps -----------------
+def iso_to_us(s):
+    # ISO-8601 'Z' -> epoch us; None si no se puede representar sin pérdida
+    if not isinstance(s, str) or not s.endswith("Z"):
+        return None
+    try:
+        dt = datetime.fromisoformat(s[:-1])
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        return None
+    us = (dt - _EPOCH) // _US
+    return us if us_to_iso(us) == s else None
+
+@functools.lru_cache(maxsize=4096)
+def _sec_prefix(secs):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(secs))
+
+def us_to_iso(us):
+    # equivalente a datetime.isoformat() + "Z" (sin fracción si us == 0);
+    # las entradas de un segmento caen en pocos segundos distintos (caché)
+    secs, frac = divmod(us, 1000000)
+    base = _sec_prefix(secs)
+    return f"{base}.{frac:06d}Z" if frac else base + "Z"
+
+# ----------------- JSON -----------------
+class JsonCodec:
+    name = "json"
+
+    def header(self):
+        return b""
+
+    def reset(self):
+        pass
+
+    def encode(self, lsn, ts, op):
+        return (json.dumps({"lsn": lsn, "ts": ts, "op": op}) + "\n").encode("utf-8")
+
+# ----------------- Binario -----------------
+class BinaryCodec:
+    name = "binary"
+
+    def __init__(self):
+        self.reset()
+
+    def header(self):
+        return MAGIC
+
+    def reset(self):
+        # tabla de strings internados del segmento actual
+        self._ids = {}
+
+    def resume(self, path):
+        # recarga la tabla de un segmento existente antes de seguir escribiendo
+        self.reset()
+        with open(path, "rb") as f:
+            for kind, body, _ in _records(f):
+                if kind == DEF:
+                    sid, n = _DEF.unpack_from(body, 1)
+                    self._ids[str(body[1 + _DEF.size:1 + _DEF.size + n], "utf-8")] = sid
+
+    def _intern(self, s, out):
+        if s is None:
+            return NONE_ID
+        sid = self._ids.get(s)
+        if sid is None:
+            sid = len(self._ids)
+            self._ids[s] = sid
+            raw = s.encode("utf-8")
+            out.append(_frame(bytes([DEF]) + _DEF.pack(sid, len(raw)) + raw))
+        return sid
+
+    def encode(self, lsn, ts, op):
+        out = []
+        rec = self._encode_op(lsn, ts, op, out)
+        if rec is None:
+            payload = json.dumps({"lsn": lsn, "ts": ts, "op": op}).encode("utf-8")
+            out.append(_frame(bytes([JSON_REC]) + _U64.pack(lsn) + payload))
+        else:
+            out.append(rec)
+        return b"".join(out)
+
+    def _encode_op(self, lsn, ts, op, out):
+        ts_us = iso_to_us(ts)
+        if ts_us is None or not isinstance(op, dict):
+            return None
+        oper = op.get("operacion")
+        code = op.get("book_code")
+        user = op.get("user_id")
+        if code is not None and not isinstance(code, str):
+            return None
+        flags = 0
+        if isinstance(user, bool) or not (user is None or isinstance(user, (str, int))):
+            return None
+        if isinstance(user, int):
+            flags |= F_USER_INT
+            user = str(user)
+
+        extras = {k: v for k, v in op.items()
+                  if k not in ("operacion", "book_code", "user_id", "due", "nueva_fecha") and k not in REDUNDANTES}
+        opcode = OPCODES.get(oper, 0)
+        if opcode == 0:
+            extras["operacion"] = oper
+
+        # fecha relevante para apply_op_to_db
+        if oper == "prestamo":
+            fecha, key = op.get("due") or op.get("nueva_fecha") or op.get("recv_ts"), "due"
+        elif op.get("nueva_fecha") is not None:
+            fecha, key = op.get("nueva_fecha"), "nueva_fecha"
+        else:
+            fecha, key = op.get("due"), "due"
+        if op.get("due") is not None and key != "due":
+            extras["due"] = op["due"]
+        tail = b""
+        if fecha is not None:
+            fecha_us = iso_to_us(fecha)
+            if fecha_us is None:
+                extras[key] = fecha
+            else:
+                flags |= F_FECHA
+                if key == "nueva_fecha":
+                    flags |= F_NUEVA_FECHA
+                tail += _I64.pack(fecha_us)
+        if extras:
+            raw = json.dumps(extras).encode("utf-8")
+            flags |= F_EXTRAS
+            tail += _U32.pack(len(raw)) + raw
+
+        book_id = self._intern(code, out)
+        user_id = self._intern(user, out)
+        return _frame(bytes([OP]) + _OP.pack(lsn, ts_us, opcode, flags, book_id, user_id) + tail)
+
+def _frame(payload):
+    return _HDR.pack(len(payload), zlib.crc32(payload)) + payload
+
+def _records(f, stats=None):
+    # (tipo, payload, fin) de registros íntegros; se detiene en el primer registro
+    # truncado o con CRC inválido (cola rota por una escritura interrumpida).
+    # El archivo se lee completo (un segmento) y se recorre sin copias.
+    data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        return
+    view = memoryview(data)
+    pos, end = len(MAGIC), len(data)
+    unpack, hsize, crc32 = _HDR.unpack_from, _HDR.size, zlib.crc32
+    while pos < end:
+        if end - pos < hsize:
+            _torn(stats, f, "cabecera incompleta")
+            return
+        n, crc = unpack(data, pos)
+        body = view[pos + hsize:pos + hsize + n]
+        if n == 0 or len(body) < n or crc32(body) != crc:
+            _torn(stats, f, "registro vacío" if n == 0 else
+                  "registro incompleto" if len(body) < n else "CRC inválido")
+            return
+        pos += hsize + n
+        yield body[0], body, pos
+
+def _torn(stats, f, motivo):
+    if stats is not None:
+        stats["torn"] = motivo
+    print(f"[{iso()}] Aviso: cola del WAL descartada ({getattr(f, 'name', '?')}): {motivo}", file=sys.stderr)
+
+def _iter_binary(f, stats=None, after_lsn=0):
+    # Decodificador en un solo bucle (enmarcado + CRC + decodificación).
+    # Las OP con lsn <= after_lsn se saltan sin construir la entrada.
+    names = {}
+    op_unpack, def_unpack, u64_unpack = _OP.unpack_from, _DEF.unpack_from, _U64.unpack_from
+    opnames = OPNAMES
+    for kind, body, _ in _records(f, stats):
+        if kind == OP:
+            lsn, ts_us, opcode, flags, book_id, user_id = op_unpack(body, 1)
+            if lsn <= after_lsn:
+                continue
+            user = None if user_id == NONE_ID else names[user_id]
+            if flags & F_USER_INT and user is not None:
+                user = int(user)
+            op = {
+                "operacion": opnames.get(opcode),
+                "book_code": None if book_id == NONE_ID else names[book_id],
+                "user_id": user,
+            }
+            if flags & (F_FECHA | F_EXTRAS):
+                pos = 1 + _OP.size
+                if flags & F_FECHA:
+                    fecha = us_to_iso(_I64.unpack_from(body, pos)[0])
+                    pos += _I64.size
+                    op["nueva_fecha" if flags & F_NUEVA_FECHA else "due"] = fecha
+                if flags & F_EXTRAS:
+                    (n,) = _U32.unpack_from(body, pos)
+                    pos += _U32.size
+                    op.update(json.loads(str(body[pos:pos + n], "utf-8")))
+            yield lsn, {"lsn": lsn, "ts": us_to_iso(ts_us), "op": op}
+        elif kind == DEF:
+            sid, n = def_unpack(body, 1)
+            names[sid] = str(body[1 + _DEF.size:1 + _DEF.size + n], "utf-8")
+        elif kind == JSON_REC:
+            (lsn,) = u64_unpack(body, 1)
+            if lsn > after_lsn:
+                yield lsn, json.loads(str(body[1 + _U64.size:], "utf-8"))
+
+def _iter_json(f, path):
+    for raw in f:
+        line = raw.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except Exception as e:
+            print(f"[{iso()}] Error leyendo linea WAL ({path}): {e} | linea: {line[:120]!r}", file=sys.stderr)
+            continue
+        lsn = entry.get("lsn") if isinstance(entry, dict) else None
+        yield lsn, entry
+
+# ----------------- API de lectura -----------------
+def detect(path):
+    # 'binary' | 'json' | None (vacío/inexistente)
+    try:
+        with open(path, "rb") as f:
+            head = f.read(len(MAGIC))
+    except FileNotFoundError:
+        return None
+    if not head:
+        return None
+    return "binary" if head == MAGIC else "json"
+
+def iter_file(path, stats=None, after_lsn=0):
+    """
+    (lsn|None, entry) de un archivo de WAL en cualquiera de los formatos.
+    Con after_lsn, el formato binario descarta las entradas anteriores sin
+    decodificarlas (en JSON se filtran después de parsear la línea).
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            f.seek(0)
+            yield from _iter_binary(f, stats, after_lsn)
+        else:
+            f.seek(0)
+            for lsn, entry in _iter_json(f, path):
+                if lsn is None or lsn > after_lsn:
+                    yield lsn, entry
+
+def valid_end(path):
+    # Offset tras la última entrada completa (para truncar colas rotas).
+    fmt = detect(path)
+    if fmt is None:
+        return 0
+    with open(path, "rb") as f:
+        if fmt == "binary":
+            end = len(MAGIC)
+            for _, _, end in _records(f):
+                pass
+            return end
+        data = f.read()
+    cut = data.rfind(b"\n")
+    return cut + 1 if cut >= 0 else 0
+
+def codec_for(fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"formato WAL invalido: {fmt} (validos: {', '.join(FORMATS)})")
+    return BinaryCodec() if fmt == "binary" else JsonCodec()
+
+def convert_file(src, dst, fmt):
+    """Reescribe un archivo de WAL en el formato indicado. Devuelve #entradas."""
+    codec = codec_for(fmt)
+    n = 0
+    tmp = dst + ".tmp"
+    with open(tmp, "wb") as out:
+        out.write(codec.header())
+        for lsn, entry in iter_file(src):
+            if lsn is None:
+                # línea legado sin LSN: solo representable en JSON
+                if fmt != "json":
+                    raise ValueError(f"{src}: entrada sin LSN, no convertible a {fmt}")
+                out.write((json.dumps(entry) + "\n").encode("utf-8"))
+            else:
+                out.write(codec.encode(lsn, entry.get("ts") or iso(), entry.get("op")))
+            n += 1
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, dst)
+    return n
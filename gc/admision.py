@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# archivo: gc/admision.py
+#
+# Control de admisión del GC (gc.py y el broker de gc_multihilo.py).
+#
+# Bajo sobrecarga es mejor rechazar rápido que dejar que las solicitudes
+# esperen en colas ZMQ hasta que el PS vence su timeout: el PS recibe en
+# milisegundos un
+#   {"estado":"busy","mensaje":"...","ts":"...","retry_after_ms":200,
+#    "info":{"operacion":"prestamo","motivo":"en_vuelo|edad_cola",...}}
+# y decide si reintenta después de retry_after_ms.
+#
+# Dos criterios:
+#   - en vuelo por operación: solicitudes admitidas y aún sin responder
+#     (esperando en el GC o en proceso). Al llegar al límite se rechaza.
+#   - edad en cola: una solicitud admitida que esperó más de GC_EDAD_MAX_MS
+#     antes de empezar a procesarse se descarta (el PS probablemente ya
+#     dejó de esperarla o está por hacerlo).
+#
+# Variables de entorno:
+#   GC_MAX_EN_VUELO    "operacion=n,..." (default prestamo=256,consulta=64,
+#                      consulta_usuario=64,consulta_vencimientos=64);
+#                      una operación sin límite o con 0 no se limita
+#   GC_EDAD_MAX_MS     edad máxima en cola (default 1000; 0 = sin descarte)
+#   GC_RETRY_AFTER_MS  pista de reintento en la respuesta busy (default 200)
+#
+# Sin límites y con GC_EDAD_MAX_MS=0 la admisión queda apagada (activa() es
+# False) y gc_multihilo.py / gc_multiproceso.py vuelven a zmq.proxy.
+#
+# No es thread-safe: admitir/liberar los llama un solo hilo (el bucle de
+# gc.py o el broker de gc_multihilo.py); vencida() y busy() no modifican
+# estado y se pueden llamar desde otros hilos.
+
+import json
+import os
+import time
+from datetime import datetime
+
+LIMITES_DEFAULT = "prestamo=256,consulta=64,consulta_usuario=64,consulta_vencimientos=64"
+
+def iso():
+    return datetime.utcnow().isoformat() + "Z"
+
+def parsear_limites(texto):
+    # "prestamo=256,consulta=64" -> {"prestamo": 256, "consulta": 64} (0 = sin límite)
+    limites = {}
+    for parte in (texto or "").split(","):
+        if not parte.strip():
+            continue
+        operacion, _, valor = parte.partition("=")
+        try:
+            n = int(valor)
+        except ValueError:
+            raise ValueError(f"GC_MAX_EN_VUELO inválido: '{parte.strip()}' (se espera operacion=n)")
+        if n > 0:
+            limites[operacion.strip().lower()] = n
+    return limites
+
+class Admision:
+    def __init__(self, limites=None, edad_max_ms=None, retry_after_ms=None):
+        if limites is None:
+            limites = parsear_limites(os.getenv("GC_MAX_EN_VUELO", LIMITES_DEFAULT))
+        if edad_max_ms is None:
+            edad_max_ms = int(os.getenv("GC_EDAD_MAX_MS", "1000"))
+        if retry_after_ms is None:
+            retry_after_ms = int(os.getenv("GC_RETRY_AFTER_MS", "200"))
+        self.limites = limites
+        self.edad_max_s = max(int(edad_max_ms), 0) / 1000.0
+        self.retry_after_ms = max(int(retry_after_ms), 0)
+        self.en_vuelo = {}          # operacion -> admitidas sin responder
+        self.stats = {"admitidas": 0, "en_vuelo": 0, "edad_cola": 0}
+
+    def activa(self):
+        # False si no limita nada: no hace falta un frontend que la aplique
+        return bool(self.limites) or self.edad_max_s > 0
+
+    def admitir(self, operacion):
+        # True si la operación entra (y queda contada en vuelo); False = busy.
+        n = self.en_vuelo.get(operacion, 0)
+        limite = self.limites.get(operacion)
+        if limite is not None and n >= limite:
+            self.stats["en_vuelo"] += 1
+            return False
+        self.en_vuelo[operacion] = n + 1
+        self.stats["admitidas"] += 1
+        return True
+
+    def liberar(self, operacion, descartada=False):
+        # La solicitud admitida ya se respondió; descartada = busy por edad en cola.
+        n = self.en_vuelo.get(operacion, 0)
+        if n > 0:
+            self.en_vuelo[operacion] = n - 1
+        if descartada:
+            self.stats["edad_cola"] += 1
+
+    def vencida(self, llegada, ahora=None):
+        # True si lo recibido en `llegada` (time.monotonic) superó la edad máxima.
+        if not self.edad_max_s:
+            return False
+        if ahora is None:
+            ahora = time.monotonic()
+        return ahora - llegada > self.edad_max_s
+
+    def busy(self, operacion, motivo, llegada=None):
+        # Respuesta de rechazo para el PS (string JSON); no modifica estado.
+        informacion = {"operacion": operacion, "motivo": motivo,
+                       "en_vuelo": self.en_vuelo.get(operacion, 0)}
+        if motivo == "en_vuelo":
+            informacion["limite"] = self.limites.get(operacion)
+        if llegada is not None:
+            informacion["edad_ms"] = int((time.monotonic() - llegada) * 1000)
+        return json.dumps({
+            "estado": "busy",
+            "mensaje": "GC saturado, reintente más tarde",
+            "ts": iso(),
+            "retry_after_ms": self.retry_after_ms,
+            "info": informacion,
+        })
+
+    def resumen(self):
+        # Línea para los logs de cierre.
+        return (f"admitidas={self.stats['admitidas']} rechazadas_en_vuelo={self.stats['en_vuelo']} "
+                f"descartadas_edad={self.stats['edad_cola']}")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# archivo: gc/cliente_actor.py
+#
+# Conexión persistente del GC al actor de préstamo (REP).
+#
+# Un solo DEALER por dueño (el bucle de gc.py o cada hilo de
+# gc_multihilo.py), abierto una vez: cada préstamo paga solo el viaje del
+# mensaje, sin handshake TCP ni negociación ZMQ. El sobre lleva un id propio:
+#   GC -> actor   [id, b"", json]
+#   actor -> GC   [id, b"", json]     (el REP devuelve el sobre tal cual)
+# así varias solicitudes pueden estar en vuelo y cada respuesta vuelve a
+# quien la pidió; una respuesta que llega después de vencer se descarta.
+#
+# Reconexión: si una solicitud vence y desde el último cambio de socket no
+# llegó ninguna respuesta, el actor se da por perdido (caído, reiniciado o
+# colgado con mensajes encolados hacia él) y el DEALER se reemplaza por uno
+# nuevo; lo que seguía en vuelo vence normalmente.
+#
+# Uso (por eventos, gc.py):
+#   cliente = ClienteActor(contexto, ACTOR_PRESTAMO, 5000, poller)
+#   cliente.enviar(carga, dato)          -> False si no se pudo encolar
+#   cliente.recibir()                    -> [(dato, respuesta_bytes)]
+#   cliente.vencidos()                   -> [dato] sin respuesta a tiempo
+#   cliente.espera_ms(500)               -> timeout del poll hasta el próximo vencimiento
+# Uso (bloqueante, un hilo):
+#   cliente.pedir(carga)                 -> respuesta (str); zmq.Again si vence
+
+import json
+import sys
+import time
+from datetime import datetime
+
+import zmq
+
+def iso():
+    return datetime.utcnow().isoformat() + "Z"
+
+class ClienteActor:
+    def __init__(self, contexto, direccion, timeout_ms=5000, poller=None, hwm=10000):
+        self.contexto = contexto
+        self.direccion = direccion
+        self.timeout_s = max(int(timeout_ms), 1) / 1000.0
+        self.poller = poller
+        self.hwm = int(hwm)
+        self.en_vuelo = {}          # id -> (dato, vence)
+        self.secuencia = 0
+        self.socket = None
+        self._respondio = False     # hubo respuesta desde que se abrió el socket
+        self.stats = {"enviados": 0, "respuestas": 0, "vencidos": 0, "tardias": 0, "reconexiones": 0}
+        self._abrir()
+
+    def _abrir(self):
+        self.socket = self.contexto.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.setsockopt(zmq.SNDHWM, self.hwm)
+        self.socket.setsockopt(zmq.RECONNECT_IVL, 100)
+        self.socket.setsockopt(zmq.RECONNECT_IVL_MAX, 2000)
+        self.socket.connect(self.direccion)
+        if self.poller is not None:
+            self.poller.register(self.socket, zmq.POLLIN)
+        self._respondio = False
+
+    def _reconectar(self):
+        print(f"[{iso()}] Actor de prestamo sin respuesta en {self.direccion}: se reabre la conexión",
+              file=sys.stderr)
+        if self.poller is not None:
+            self.poller.unregister(self.socket)
+        self.socket.close(linger=0)
+        self.stats["reconexiones"] += 1
+        self._abrir()
+
+    def enviar(self, carga, dato=None):
+        # Encola la solicitud sin esperar; la respuesta sale por recibir().
+        self.secuencia += 1
+        id_pedido = str(self.secuencia).encode()
+        try:
+            self.socket.send_multipart([id_pedido, b"", json.dumps(carga).encode("utf-8")], flags=zmq.NOBLOCK)
+        except zmq.Again:
+            return False
+        self.en_vuelo[id_pedido] = (dato, time.monotonic() + self.timeout_s)
+        self.stats["enviados"] += 1
+        return True
+
+    def recibir(self):
+        # Respuestas disponibles: [(dato, respuesta_bytes)] de solicitudes en vuelo.
+        out = []
+        while True:
+            try:
+                tramas = self.socket.recv_multipart(flags=zmq.NOBLOCK)
+            except zmq.Again:
+                return out
+            self._respondio = True
+            pedido = self.en_vuelo.pop(tramas[0], None)
+            if pedido is None or len(tramas) < 3:
+                # Llegó después de vencer (ya se respondió error) o mal formada.
+                self.stats["tardias"] += 1
+                continue
+            self.stats["respuestas"] += 1
+            out.append((pedido[0], tramas[-1]))
+
+    def vencidos(self):
+        # Solicitudes sin respuesta a tiempo: [dato]; reconecta si el actor no contesta nada.
+        if not self.en_vuelo:
+            return []
+        ahora = time.monotonic()
+        ids = [k for k, (_, vence) in self.en_vuelo.items() if vence <= ahora]
+        if ids and not self._respondio:
+            self._reconectar()
+        self.stats["vencidos"] += len(ids)
+        return [self.en_vuelo.pop(k)[0] for k in ids]
+
+    def espera_ms(self, maximo):
+        # Timeout del poll: hasta `maximo` o el próximo vencimiento.
+        if not self.en_vuelo:
+            return maximo
+        proximo = min(vence for _, vence in self.en_vuelo.values())
+        return max(0, min(maximo, int((proximo - time.monotonic()) * 1000) + 1))
+
+    def pedir(self, carga):
+        # Bloqueante (un hilo con su propio cliente): respuesta o zmq.Again al vencer.
+        if not self.enviar(carga, True):
+            raise zmq.Again("cola hacia el actor de prestamo llena")
+        while True:
+            listas = self.recibir()
+            if listas:
+                return listas[0][1].decode("utf-8")
+            if self.vencidos():
+                raise zmq.Again("Resource temporarily unavailable")
+            self.socket.poll(self.espera_ms(500), zmq.POLLIN)
+
+    def cerrar(self):
+        if self.poller is not None:
+            self.poller.unregister(self.socket)
+        self.socket.close(linger=0)
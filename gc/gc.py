@@ -8,16 +8,38 @@
 # Fecha: 8 de octubre de 2025
 #
 # Qué hace:
-#   Gestor de Carga (GC) con dos sockets ZeroMQ:
-#     - REP: recibe solicitudes desde PS (JSON o "op|codigo|usuario")
+#   Gestor de Carga (GC) con dos sockets ZeroMQ hacia afuera:
+#     - ROUTER: recibe solicitudes desde PS (REQ; JSON o "op|codigo|usuario")
 #     - PUB: publica a actores en tópicos "Devolucion" y "Renovacion"
 #   Responde al PS y publica a los actores con el payload correspondiente.
 #
+#   Es un broker por eventos: el bucle nunca espera una respuesta.
+#     - prestamo: se reenvía al actor de préstamo por una conexión DEALER
+#       persistente con un id propio en el sobre (gc/cliente_actor.py); la
+#       respuesta se entrega al PS de ese id. Varios préstamos quedan en
+#       vuelo a la vez y cada uno vence a los GC_ACTOR_TIMEOUT_MS.
+#     - consultas: las resuelve un pool de hilos (REQ al GA) que devuelve
+#       la respuesta al bucle por inproc.
+#   Así un préstamo lento no frena las devoluciones y renovaciones.
+#
+#   Control de admisión (gc/admision.py): préstamos y consultas cuentan en
+#   vuelo por operación hasta que se responden; sobre el límite
+#   (GC_MAX_EN_VUELO) el PS recibe al instante {"estado":"busy",...} con
+#   retry_after_ms en vez de esperar hasta su timeout. Las consultas esperan
+#   en una cola del bucle hasta que hay un hilo libre en el pool; la que pasa
+#   GC_EDAD_MAX_MS esperando se descarta (busy) sin consultar al GA.
+#   Devoluciones y renovaciones se responden en el acto y no pasan por la
+#   admisión.
+#
 # Mensajes:
 #   PS -> GC (JSON):
 #     {"operation":"devolucion|renovacion","book_code":"BOOK-123","user_id":45}
+#     {"operation":"consulta","book_codes":["BOOK-1","BOOK-2"]}  (o "book_code"; disponibilidad, la responde el GA)
+#     {"operation":"consulta_usuario","user_id":45}   (ídem)
+#     {"operation":"consulta_vencimientos","horas":24} (o desde/hasta ISO, limite; ídem)
 #   GC -> PS (JSON de respuesta):
 #     {"estado":"ok|error","mensaje":"...","ts":"...","info":{...}}
+#     {"estado":"busy","mensaje":"...","ts":"...","retry_after_ms":200,"info":{"motivo":"en_vuelo|edad_cola",...}}
 #   GC -> Actores (string, 1 frame):
 #     "TOPICO {json}"
 #
@@ -30,33 +52,68 @@ import os
 import time           # Pequeños sleeps ante errores
 import signal         # Ctrl+C y apagado ordenado
 import sys
+import threading      # Sockets PUSH por hilo del pool de consultas
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from datetime import datetime
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ga"))
+
+from ruteo import TablaRuteo   # noqa: E402  (GA particionado por book_code)
+from cliente_actor import ClienteActor   # noqa: E402  (DEALER persistente al actor)
+from admision import Admision            # noqa: E402  (límites en vuelo y edad en cola)
+
 # ---------- Configuración de IPs/puertos ----------
 # Bindea a toda la red para que PS remoto pueda conectar (defaults fijos).
-ENLACE_REP = os.getenv("GC_REP_BIND", "tcp://0.0.0.0:5555")  # REP (PS -> GC)
+ENLACE_REP = os.getenv("GC_REP_BIND", "tcp://0.0.0.0:5555")  # ROUTER (PS -> GC)
 ENLACE_PUB = os.getenv("GC_PUB_BIND", "tcp://0.0.0.0:5556")  # PUB (GC -> Actores)
 
 # Dirección fija del Actor de Préstamo (REQ/REP síncrono).
 # El requisito indicaba usar tcp://localhost:5560 o similar.
 ACTOR_PRESTAMO = os.getenv("GC_ACTOR_PRESTAMO", "tcp://localhost:5560")
+ACTOR_TIMEOUT_MS = int(os.getenv("GC_ACTOR_TIMEOUT_MS", "5000"))    # por préstamo en vuelo
+CONSULTAS_HILOS = max(int(os.getenv("GC_CONSULTAS_HILOS", "4")), 1)  # pool de consultas al GA
+
+# GA para consultas de solo lectura (CONSULTAS_GA), REQ/REP directo.
+# El GA activo se lee de gc/ga_activo.txt (lo escribe monitor_failover.py);
+# con gc/ga_shards.json hay un GA por partición (ver ga/ruteo.py).
+GA_PRIMARY = os.getenv("GC_GA_PRIMARY", "tcp://localhost:6000")
+GA_SECONDARY = os.getenv("GC_GA_SECONDARY", "tcp://localhost:6001")
+FILE_GA_ACTIVO = "gc/ga_activo.txt"
+RUTEO = TablaRuteo(GA_PRIMARY, GA_SECONDARY, FILE_GA_ACTIVO)
 
 # ---------- Inicialización de ZeroMQ ----------
 contexto = zmq.Context()                 # Crea contexto global
 
-socket_rep = contexto.socket(zmq.REP)    # Socket REP: atiende PS (síncrono)
-socket_rep.bind(ENLACE_REP)              # Vincula el puerto de escucha
+socket_rep = contexto.socket(zmq.ROUTER)     # ROUTER: atiende PS (REQ) sin orden forzado
+socket_rep.bind(ENLACE_REP)                  # Vincula el puerto de escucha
+
+socket_pub = contexto.socket(zmq.PUB)        # Socket PUB: publica a Actores
+socket_pub.bind(ENLACE_PUB)                  # Vincula el puerto de publicación
 
-socket_pub = contexto.socket(zmq.PUB)    # Socket PUB: publica a Actores
-socket_pub.bind(ENLACE_PUB)              # Vincula el puerto de publicación
+socket_consultas = contexto.socket(zmq.PULL)     # respuestas del pool de consultas
+socket_consultas.bind("inproc://gc-consultas")
 
 # Poller: permite esperar con timeout (no bloquear indefinidamente).
 poller = zmq.Poller()
 poller.register(socket_rep, zmq.POLLIN)
+poller.register(socket_consultas, zmq.POLLIN)
+
+# DEALER persistente: préstamos en vuelo al actor (REP); se registra en el poller
+actor = ClienteActor(contexto, ACTOR_PRESTAMO, ACTOR_TIMEOUT_MS, poller)
 
 # ---------- Estado y utilidades ----------
 EJECUTANDO = True
 
+admision = Admision()               # GC_MAX_EN_VUELO, GC_EDAD_MAX_MS, GC_RETRY_AFTER_MS
+consultas_pendientes = deque()      # consultas admitidas esperando hilo: (llegada, operacion, args)
+consultas_activas = 0               # consultas entregadas al pool sin respuesta
+
+pool_consultas = ThreadPoolExecutor(max_workers=CONSULTAS_HILOS, thread_name_prefix="gc-consulta")
+local_hilos = threading.local()     # PUSH hacia el bucle, uno por hilo del pool
+sockets_push = []                   # para cerrarlos al salir (contexto.term() los espera)
+
 def iso():
     # Retorna timestamp ISO-8601 (UTC) con sufijo 'Z'.
     return datetime.utcnow().isoformat() + "Z"
@@ -64,10 +121,15 @@ def iso():
 def banner_inicio():
     # Imprime banner de inicio (bloque multilínea legible).
     print("\n" + "=" * 72)
-    print(" GESTOR DE CARGA (GC) — REQ/REP + PUB/SUB ".center(72, " "))
+    print(" GESTOR DE CARGA (GC) — ROUTER/DEALER + PUB/SUB ".center(72, " "))
     print("-" * 72)
-    print(f"  REP (escucha) : {ENLACE_REP}")
-    print(f"  PUB (publica) : {ENLACE_PUB}")
+    print(f"  ROUTER (escucha) : {ENLACE_REP}")
+    print(f"  PUB (publica)    : {ENLACE_PUB}")
+    print(f"  Actor préstamo   : {ACTOR_PRESTAMO} (timeout {ACTOR_TIMEOUT_MS} ms)")
+    print(f"  Hilos consultas  : {CONSULTAS_HILOS}")
+    limites = ", ".join(f"{op}={n}" for op, n in admision.limites.items()) or "sin límite"
+    print(f"  Máx en vuelo     : {limites}")
+    print(f"  Edad máx en cola : {int(admision.edad_max_s * 1000)} ms (retry-after {admision.retry_after_ms} ms)")
     print("=" * 72 + "\n")
 
 def cargar_json_seguro(s: str):
@@ -84,6 +146,87 @@ def construir_respuesta(estado="ok", mensaje="ok", informacion=None):
         carga["info"] = informacion
     return json.dumps(carga)
 
+def ga_addr_actual(codigo_libro=None):
+    # Dirección del GA activo (de la partición del libro) según el monitor.
+    return RUTEO.direccion(codigo_libro)
+
+def consultar_ga(carga: dict, addr=None):
+    # REQ temporal al GA activo con timeout; devuelve la respuesta (string JSON).
+    req_socket = contexto.socket(zmq.REQ)
+    try:
+        req_socket.setsockopt(zmq.RCVTIMEO, 5000)
+        req_socket.setsockopt(zmq.SNDTIMEO, 5000)
+        req_socket.connect(addr or ga_addr_actual())
+        req_socket.send_string(json.dumps(carga))
+        return req_socket.recv_string()
+    finally:
+        req_socket.close(linger=0)
+
+def clave_due(due):
+    # orden cronológico de "...:SS[.ffffff]Z" (sin fracción = .000000)
+    due = due or ""
+    return due[:19] + (due[20:-1] if due[19:20] == "." else "").ljust(6, "0")
+
+def consultar_particiones(carga: dict):
+    # Consulta de solo lectura con el GA particionado: se pide a cada
+    # partición lo suyo y se combinan las respuestas (string JSON).
+    if RUTEO.n == 1:
+        return consultar_ga(carga)
+    operacion = carga["operacion"]
+    if operacion == "consulta":
+        codigos = carga.get("book_codes")
+        if codigos is None and carga.get("book_code") is not None:
+            codigos = [carga["book_code"]]
+        if not isinstance(codigos, list) or not codigos:
+            return consultar_ga(carga)      # el GA responde el error de validación
+        pedidos = {k: dict(carga, book_codes=cs) for k, cs in RUTEO.agrupar(codigos).items()}
+    else:
+        pedidos = {k: carga for k in range(RUTEO.n)}
+
+    respuestas, fallidas = {}, []
+    for k, pedido in pedidos.items():
+        try:
+            respuestas[k] = json.loads(consultar_ga(pedido, RUTEO.direccion_shard(k)))
+        except Exception as e:
+            print(f"[{iso()}] Error consultando partición {k}: {e}", file=sys.stderr)
+            fallidas.append(k)
+    if not respuestas:
+        raise RuntimeError(f"ninguna partición respondió ({len(fallidas)})")
+    for r in respuestas.values():
+        if r.get("estado") != "ok":
+            return json.dumps(r)
+
+    if operacion == "consulta":
+        encontrados = {lib["book_code"]: lib for r in respuestas.values() for lib in r["libros"]}
+        sin_respuesta = {json.dumps(c) for k in fallidas for c in pedidos[k]["book_codes"]}
+        libros, no_encontrados, pendientes = [], [], []
+        for c in codigos:
+            if isinstance(c, str) and c in encontrados:
+                libros.append(encontrados[c])
+            elif json.dumps(c) in sin_respuesta:
+                pendientes.append(c)
+            else:
+                no_encontrados.append(c)
+        combinada = {"estado": "ok", "total": len(libros), "libros": libros, "no_encontrados": no_encontrados}
+        if pendientes:
+            combinada["sin_respuesta"] = pendientes
+    elif operacion == "consulta_usuario":
+        prestamos = sorted((p for r in respuestas.values() for p in r["prestamos"]),
+                           key=lambda p: p["book_code"])
+        combinada = {"estado": "ok", "user_id": next(iter(respuestas.values()))["user_id"],
+                     "total": len(prestamos), "prestamos": prestamos}
+    else:   # consulta_vencimientos
+        limite = int(carga.get("limite", 1000))
+        vencimientos = sorted((v for r in respuestas.values() for v in r["vencimientos"]),
+                              key=lambda v: clave_due(v["due"]))[:limite]
+        primera = next(iter(respuestas.values()))
+        combinada = {"estado": "ok", "desde": primera["desde"], "hasta": primera["hasta"],
+                     "total": sum(r["total"] for r in respuestas.values()), "vencimientos": vencimientos}
+    if fallidas:
+        combinada["parcial"] = True
+        combinada["particiones_sin_respuesta"] = sorted(fallidas)
+    return json.dumps(combinada)
+
 def publicar_topico(topico: str, carga: dict):
     # Publica a un tópico con la convención "TOPICO {json}" (1 frame string).
     try:
@@ -124,6 +267,15 @@ OPERACIONES_VALIDAS = {
     "devolucion": "Devolucion",
     "renovacion": "Renovacion",
     "prestamo": "Prestamo",
+    "consulta": "Consulta",                  # lectura: REQ directo al GA, no se publica
+    "consulta_usuario": "ConsultaUsuario",   # ídem
+    "consulta_vencimientos": "ConsultaVencimientos",   # ídem
+}
+# Campos de la solicitud que se reenvían al GA en cada consulta.
+CONSULTAS_GA = {
+    "consulta": ("book_code", "book_codes"),
+    "consulta_usuario": ("user_id",),
+    "consulta_vencimientos": ("horas", "desde", "hasta", "limite"),
 }
 
 # ---------- Manejo de señales ----------
@@ -136,173 +288,230 @@ def manejar_senal(sig, frame):
 signal.signal(signal.SIGINT, manejar_senal)   # Ctrl+C
 signal.signal(signal.SIGTERM, manejar_senal)  # kill
 
+def responder(sobre, texto: str):
+    # Respuesta al PS (REQ) por el ROUTER: sobre = [identidad, b""].
+    socket_rep.send_multipart(sobre + [texto.encode("utf-8")])
+
+def resolver_consulta(sobre, carga, operacion, codigo_libro, id_usuario, recibido_ts):
+    # En un hilo del pool: REQ al GA (puede tardar) y respuesta al bucle por inproc
+    # como [operacion, *sobre, respuesta] (el bucle libera la admisión).
+    try:
+        respuesta_ga = consultar_particiones(carga)
+        topico = f"{OPERACIONES_VALIDAS[operacion]} (REQ->GA)"
+    except Exception as e:
+        print(f"[{iso()}] Error consultando GA:\n  {e}\n", file=sys.stderr)
+        respuesta_ga = construir_respuesta(
+            estado="error",
+            mensaje="Error comunicando con GA",
+            informacion={"detalle": str(e)},
+        )
+        topico = f"{OPERACIONES_VALIDAS[operacion]} (REQ->GA) - ERROR"
+    push = getattr(local_hilos, "push", None)
+    if push is None:
+        push = local_hilos.push = contexto.socket(zmq.PUSH)
+        push.connect("inproc://gc-consultas")
+        sockets_push.append(push)
+    push.send_multipart([operacion.encode()] + sobre + [respuesta_ga.encode("utf-8")])
+    print_bloque_solicitud(
+        operacion=operacion,
+        codigo_libro=codigo_libro,
+        id_usuario=id_usuario,
+        recibido_ts=recibido_ts,
+        topico=topico,
+    )
+
+def despachar_consultas():
+    # Descarta por edad las consultas que esperan hilo y entrega las demás al
+    # pool mientras haya hilos libres (así la espera queda en esta cola, a la vista).
+    global consultas_activas
+    ahora = time.monotonic()
+    while consultas_pendientes and admision.vencida(consultas_pendientes[0][0], ahora):
+        llegada, operacion, args = consultas_pendientes.popleft()
+        responder(args[0], admision.busy(operacion, "edad_cola", llegada))
+        admision.liberar(operacion, descartada=True)
+    while consultas_pendientes and consultas_activas < CONSULTAS_HILOS:
+        _, _, args = consultas_pendientes.popleft()
+        pool_consultas.submit(resolver_consulta, *args)
+        consultas_activas += 1
+
+def espera_poll_ms(maximo):
+    # Timeout del poll: próximo vencimiento de préstamo o de consulta en cola.
+    espera = actor.espera_ms(maximo)
+    if consultas_pendientes and admision.edad_max_s:
+        restante = admision.edad_max_s - (time.monotonic() - consultas_pendientes[0][0])
+        espera = max(0, min(espera, int(restante * 1000) + 1))
+    return espera
+
+def enviar_prestamo(sobre, solicitud, recibido_ts):
+    # Reenvía el préstamo al actor sin esperar: la respuesta llega por
+    # la conexión persistente con el mismo id (el REP del actor conserva el sobre).
+    # recv_ts viaja hasta el GA: el vencimiento del préstamo se cuenta desde ahí.
+    if not actor.enviar(dict(solicitud, recv_ts=recibido_ts), (sobre, solicitud, recibido_ts)):
+        # Cola hacia el actor llena: error inmediato al PS.
+        print(f"[{iso()}] Cola hacia el actor de prestamo llena\n", file=sys.stderr)
+        admision.liberar("prestamo")
+        responder(sobre, construir_respuesta(
+            estado="error",
+            mensaje="Error comunicando con actor de prestamo",
+            informacion={"detalle": "cola hacia el actor llena"},
+        ))
+
+def atender_respuestas_actor():
+    # Respuestas del actor: se entregan al PS que las pidió.
+    for (sobre, solicitud, recibido_ts), respuesta in actor.recibir():
+        admision.liberar("prestamo")
+        # Asumimos que el actor devuelve una cadena JSON: se reenvía tal cual.
+        socket_rep.send_multipart(sobre + [respuesta])
+        print_bloque_solicitud(
+            operacion="prestamo",
+            codigo_libro=solicitud.get("book_code"),
+            id_usuario=solicitud.get("user_id"),
+            recibido_ts=recibido_ts,
+            topico="Prestamo (REQ->GA)",
+        )
+
+def vencer_prestamos():
+    # Préstamos sin respuesta del actor a tiempo: error al PS (el bucle sigue).
+    for sobre, solicitud, recibido_ts in actor.vencidos():
+        admision.liberar("prestamo")
+        print(f"[{iso()}] Timeout ({ACTOR_TIMEOUT_MS} ms) esperando al actor de prestamo\n", file=sys.stderr)
+        responder(sobre, construir_respuesta(
+            estado="error",
+            mensaje="Error comunicando con actor de prestamo",
+            informacion={"detalle": "Resource temporarily unavailable"},
+        ))
+        print_bloque_solicitud(
+            operacion="prestamo",
+            codigo_libro=solicitud.get("book_code"),
+            id_usuario=solicitud.get("user_id"),
+            recibido_ts=recibido_ts,
+            topico="Prestamo (REQ->GA) - ERROR",
+        )
+
+def atender_solicitud(sobre, raw, llegada):
+    # Una solicitud del PS: se responde ya o queda en vuelo (préstamo/consulta).
+    # llegada: time.monotonic() al recibirla (edad en cola).
+    recibido_ts = iso()
+
+    # Intenta parsear JSON; si falla, interpreta formato simple.
+    solicitud = cargar_json_seguro(raw)
+    if not isinstance(solicitud, dict):
+        partes = raw.split("|")
+        oper = partes[0].strip().lower() if len(partes) >= 1 else ""
+        codigo_libro = partes[1].strip() if len(partes) > 1 else None
+        id_usuario = partes[2].strip() if len(partes) > 2 else None
+        solicitud = {
+            "operation": oper,
+            "book_code": codigo_libro,
+            "user_id": id_usuario,
+        }
+
+    # Normaliza campos.
+    operacion = (solicitud.get("operation") or "").strip().lower()
+    codigo_libro = solicitud.get("book_code")
+    id_usuario = solicitud.get("user_id")
+
+    # Valida operación soportada.
+    if operacion not in OPERACIONES_VALIDAS:
+        responder(sobre, construir_respuesta(
+            estado="error",
+            mensaje="Operacion no soportada",
+            informacion={"operacion_recibida": operacion},
+        ))
+        print_bloque_error_operacion(operacion_raw=operacion)
+        return  # No publica nada
+
+    # ---------- Admisión: lo que queda en vuelo tiene límite por operación ----------
+    if (operacion in CONSULTAS_GA or operacion == "prestamo") and not admision.admitir(operacion):
+        responder(sobre, admision.busy(operacion, "en_vuelo"))
+        return
+
+    # ---------- Consultas de solo lectura (REQ directo al GA, en el pool) ----------
+    if operacion in CONSULTAS_GA:
+        carga = {"operacion": operacion, "recv_ts": recibido_ts}
+        for campo in CONSULTAS_GA[operacion]:
+            if solicitud.get(campo) is not None:
+                carga[campo] = solicitud[campo]
+        consultas_pendientes.append(
+            (llegada, operacion, (sobre, carga, operacion, codigo_libro, id_usuario, recibido_ts)))
+        return
+
+    # ---------- PRESTAMO: en vuelo hacia el actor, la respuesta llega después ----------
+    if operacion == "prestamo":
+        enviar_prestamo(sobre, solicitud, recibido_ts)
+        return
+
+    # ---------- Caso general: devolucion / renovacion ----------
+    # Respuesta inmediata al PS (aceptada).
+    responder(sobre, construir_respuesta(
+        estado="ok",
+        mensaje="Operacion aceptada",
+        informacion={
+            "operacion": operacion,
+            "book_code": codigo_libro,
+            "user_id": id_usuario,
+            "recv_ts": recibido_ts,
+        },
+    ))
+
+    # Prepara carga a publicar a actores.
+    topico = OPERACIONES_VALIDAS[operacion]  # "Devolucion" | "Renovacion"
+    payload_publicacion = {
+        "operacion": operacion,
+        "book_code": codigo_libro,
+        "user_id": id_usuario,
+        "published_ts": iso(),
+        "origen": "GC",
+        "recv_ts": recibido_ts,
+        # clave de idempotencia del PS: el GA no aplica dos veces un reintento
+        "request_id": solicitud.get("request_id"),
+    }
+
+    # Publica en el tópico correspondiente.
+    publicar_topico(topico, payload_publicacion)
+
+    # Reporte legible por consola.
+    print_bloque_solicitud(
+        operacion=operacion,
+        codigo_libro=codigo_libro,
+        id_usuario=id_usuario,
+        recibido_ts=recibido_ts,
+        topico=topico,
+    )
+
 # ---------- Bucle principal ----------
 banner_inicio()
 
 while EJECUTANDO:
     try:
-        # Espera hasta 500 ms por actividad en REP.
-        eventos = dict(poller.poll(500))
+        # Espera por actividad en ROUTER, actor o pool (o hasta el próximo vencimiento,
+        # de préstamo en vuelo o de consulta en cola).
+        eventos = dict(poller.poll(espera_poll_ms(500)))
+
+        # Respuestas ya listas primero: liberan a los PS que más esperan.
+        if actor.socket in eventos:
+            atender_respuestas_actor()
+        if socket_consultas in eventos:
+            while True:
+                try:
+                    operacion, *tramas = socket_consultas.recv_multipart(flags=zmq.NOBLOCK)
+                except zmq.Again:
+                    break
+                consultas_activas -= 1
+                admision.liberar(operacion.decode())
+                socket_rep.send_multipart(tramas)
+
         if socket_rep in eventos:
-            # Recibe una cadena: puede ser JSON o "op|codigo|usuario".
-            raw = socket_rep.recv_string()
-            recibido_ts = iso()
-
-            # Intenta parsear JSON; si falla, interpreta formato simple.
-            solicitud = cargar_json_seguro(raw)
-            if solicitud is None:
-                partes = raw.split("|")
-                oper = partes[0].strip().lower() if len(partes) >= 1 else ""
-                codigo_libro = partes[1].strip() if len(partes) > 1 else None
-                id_usuario = partes[2].strip() if len(partes) > 2 else None
-                solicitud = {
-                    "operation": oper,
-                    "book_code": codigo_libro,
-                    "user_id": id_usuario,
-                }
-
-            # Normaliza campos.
-            operacion = (solicitud.get("operation") or "").strip().lower()
-            codigo_libro = solicitud.get("book_code")
-            id_usuario = solicitud.get("user_id")
-
-            # Valida operación soportada.
-            if operacion not in OPERACIONES_VALIDAS:
-                socket_rep.send_string(construir_respuesta(
-                    estado="error",
-                    mensaje="Operacion no soportada",
-                    informacion={"operacion_recibida": operacion},
-                ))
-                print_bloque_error_operacion(operacion_raw=operacion)
-                continue  # No publica nada
-
-            # ---------- Manejo especial: PRESTAMO (síncrono con actor) ----------
-            if operacion == "prestamo":
-                # No enviar respuesta inmediata "Operacion aceptada".
-                # Crear socket REQ temporal, conectarlo al actor de prestamo,
-                # enviar la carga JSON y esperar respuesta. Luego reenviar
-                # la respuesta del actor al PS. En caso de error/timeouts,
-                # responder con un mensaje de error JSON y continuar.
-                req_socket = None
+            # Se drena lo que haya llegado: [identidad, b"", solicitud].
+            for _ in range(1000):
                 try:
-                    req_socket = contexto.socket(zmq.REQ)
-                    # Timeouts razonables para no bloquear indefinidamente.
-                    req_socket.setsockopt(zmq.RCVTIMEO, 5000)  # 5s recv timeout
-                    req_socket.setsockopt(zmq.SNDTIMEO, 5000)  # 5s send timeout
-                    req_socket.connect(ACTOR_PRESTAMO)
-
-                    # Enviar al actor de prestamo la carga como JSON string.
-                    # Usamos la versión dict -> JSON aqui.
-                    payload_al_actor = json.dumps(solicitud)
-                    req_socket.send_string(payload_al_actor)
-
-                    # Esperar respuesta del actor.
-                    try:
-                        respuesta_actor = req_socket.recv_string()
-                    except zmq.ZMQError as e_recv:
-                        # Timeout o error de recv
-                        error_msg = f"Timeout/recv error al contactar actor de prestamo: {e_recv}"
-                        print(f"[{iso()}] {error_msg}\n", file=sys.stderr)
-                        socket_rep.send_string(construir_respuesta(
-                            estado="error",
-                            mensaje="Error comunicando con actor de prestamo",
-                            informacion={"detalle": str(e_recv)},
-                        ))
-                        # Log legible
-                        print_bloque_solicitud(
-                            operacion=operacion,
-                            codigo_libro=codigo_libro,
-                            id_usuario=id_usuario,
-                            recibido_ts=recibido_ts,
-                            topico="Prestamo (REQ->GA) - ERROR",
-                        )
-                        continue  # seguir loop principal
-
-                    # Si llegamos aquí, tenemos una respuesta del actor.
-                    # Reenviarla tal cual al PS como respuesta final.
-                    # Asumimos que el actor devuelve una cadena JSON.
-                    socket_rep.send_string(respuesta_actor)
-
-                    # Reporte legible por consola.
-                    print_bloque_solicitud(
-                        operacion=operacion,
-                        codigo_libro=codigo_libro,
-                        id_usuario=id_usuario,
-                        recibido_ts=recibido_ts,
-                        topico="Prestamo (REQ->GA)",
-                    )
-
-                except zmq.ZMQError as e:
-                    # Errores de conexión o send de ZMQ.
-                    print(f"[{iso()}] ZMQError al manejar prestamo:\n  {e}\n", file=sys.stderr)
-                    try:
-                        socket_rep.send_string(construir_respuesta(
-                            estado="error",
-                            mensaje="Error comunicando con actor de prestamo",
-                            informacion={"detalle": str(e)},
-                        ))
-                    except Exception:
-                        # Si enviar la respuesta falla, imprimir y continuar.
-                        print(f"[{iso()}] No se pudo enviar respuesta de error al PS.\n", file=sys.stderr)
-
-                except Exception as e:
-                    # Error genérico.
-                    print(f"[{iso()}] ERROR inesperado manejando prestamo:\n  {e}\n", file=sys.stderr)
-                    try:
-                        socket_rep.send_string(construir_respuesta(
-                            estado="error",
-                            mensaje="Error inesperado en GC durante prestamo",
-                            informacion={"detalle": str(e)},
-                        ))
-                    except Exception:
-                        print(f"[{iso()}] No se pudo enviar respuesta de error al PS.\n", file=sys.stderr)
-
-                finally:
-                    # Cerrar el socket REQ temporal correctamente.
-                    try:
-                        if req_socket is not None:
-                            req_socket.close(linger=0)
-                    except Exception:
-                        pass
-
-                # Después de atender "prestamo", continuar con el loop principal.
-                continue
-
-            # ---------- Caso general: devolucion / renovacion ----------
-            # Respuesta inmediata al PS (aceptada).
-            socket_rep.send_string(construir_respuesta(
-                estado="ok",
-                mensaje="Operacion aceptada",
-                informacion={
-                    "operacion": operacion,
-                    "book_code": codigo_libro,
-                    "user_id": id_usuario,
-                    "recv_ts": recibido_ts,
-                },
-            ))
-
-            # Prepara carga a publicar a actores.
-            topico = OPERACIONES_VALIDAS[operacion]  # "Devolucion" | "Renovacion"
-            payload_publicacion = {
-                "operacion": operacion,
-                "book_code": codigo_libro,
-                "user_id": id_usuario,
-                "published_ts": iso(),
-                "origen": "GC",
-                "recv_ts": recibido_ts,
-            }
-
-            # Publica en el tópico correspondiente.
-            publicar_topico(topico, payload_publicacion)
-
-            # Reporte legible por consola.
-            print_bloque_solicitud(
-                operacion=operacion,
-                codigo_libro=codigo_libro,
-                id_usuario=id_usuario,
-                recibido_ts=recibido_ts,
-                topico=topico,
-            )
+                    *sobre, raw = socket_rep.recv_multipart(flags=zmq.NOBLOCK)
+                except zmq.Again:
+                    break
+                atender_solicitud(sobre, raw.decode("utf-8", "replace"), time.monotonic())
+
+        vencer_prestamos()
+        despachar_consultas()
 
     except zmq.ZMQError as e:
         # Errores de ZeroMQ (sockets, etc.) → espera breve y continúa.
@@ -316,8 +525,15 @@ while EJECUTANDO:
 
 # ---------- Cierre ordenado ----------
 try:
-    socket_rep.close(linger=0)   # Cierra REP sin esperar colas
+    pool_consultas.shutdown(wait=True, cancel_futures=True)
+    for push in sockets_push:
+        push.close(linger=0)
+    socket_rep.close(linger=0)   # Cierra ROUTER sin esperar colas
     socket_pub.close(linger=0)   # Cierra PUB
+    actor.cerrar()
+    print(f"[{iso()}] Actor de prestamo stats: {actor.stats}")
+    print(f"[{iso()}] Admisión: {admision.resumen()}")
+    socket_consultas.close(linger=0)
     contexto.term()              # Libera el contexto ZMQ
     print(f"[{iso()}] GC detenido correctamente.\n")
 except Exception:
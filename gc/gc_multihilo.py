@@ -13,9 +13,32 @@
 #   Mantiene la misma lógica de negocio que gc.py pero con concurrencia.
 #
 # Diferencias con gc.py serial:
-#   - Pool de workers (threads) para procesar solicitudes REQ/REP
+#   - Pool de workers (threads) para procesar solicitudes
 #   - Cada thread maneja una solicitud completa (recv -> process -> send)
-#   - Socket PUB es thread-safe en ZeroMQ (puede compartirse)
+#   - Frontend con control de admisión (broker(), en lugar de zmq.proxy):
+#       PS (REQ) -> ROUTER -> cola del broker -> ROUTER inproc -> worker (REQ)
+#     Los workers avisan LISTO y cada respuesta los vuelve a dejar libres,
+#     así una solicitud solo sale hacia un worker desocupado y la espera
+#     ocurre en la cola del broker, donde se mide su edad. Sobre el límite
+#     en vuelo por operación (GC_MAX_EN_VUELO) o con más de GC_EDAD_MAX_MS
+#     en cola, el PS recibe al instante {"estado":"busy",...} con
+#     retry_after_ms (gc/admision.py) en vez de esperar hasta su timeout.
+#     El broker no parsea la solicitud: solo busca la operación en los bytes
+#     (operacion_rapida); el JSON completo lo lee el worker.
+#     Sin admisión (GC_MAX_EN_VUELO="" y GC_EDAD_MAX_MS=0) el frontend es
+#     zmq.proxy hacia un DEALER inproc y los workers son REP: el reenvío
+#     queda en C, sin pasar por Python
+#   - Los sockets ZMQ NO son thread-safe: el PUB es de un hilo publicador
+#     dedicado. Cada worker tiene su PUSH hacia inproc://gc-publicar y el
+#     publicador drena ese PULL (fan-in) en lotes hacia el PUB, así
+#     publicar no pasa por ningún lock en el camino de la solicitud
+#   - Cada worker tiene su conexión DEALER persistente al actor de préstamo
+#     (gc/cliente_actor.py): un préstamo cuesta un viaje de mensaje, sin abrir
+#     y cerrar un REQ por solicitud
+#
+# Variables de entorno del publicador:
+#   GC_PUB_LOTE       máximo de mensajes por tanda del publicador (default 256)
+#   GC_PUB_REPORTE_S  cada cuánto reporta publicadas y profundidad de cola (default 10; 0 = nunca)
 #
 # Uso:
 #   python gc/gc_multihilo.py
@@ -23,27 +46,54 @@
 import zmq
 import json
 import os
+import re
 import time
 import signal
 import sys
 import threading
+from collections import deque
 from datetime import datetime
 from queue import Queue, Empty
 
+from cliente_actor import ClienteActor
+from admision import Admision
+
 # Configuración de IPs/puertos (igual que gc.py)
 ENLACE_REP = os.getenv("GC_REP_BIND", "tcp://0.0.0.0:5555")
 ENLACE_PUB = os.getenv("GC_PUB_BIND", "tcp://0.0.0.0:5556")
 ACTOR_PRESTAMO = os.getenv("GC_ACTOR_PRESTAMO", "tcp://localhost:5560")
+ACTOR_TIMEOUT_MS = int(os.getenv("GC_ACTOR_TIMEOUT_MS", "5000"))
 
 # Configuración de workers
 NUM_WORKERS = int(os.getenv("GC_NUM_WORKERS", "10"))
 
+# Configuración del publicador
+ENTRADA_PUB = "inproc://gc-publicar"
+PUB_LOTE = max(int(os.getenv("GC_PUB_LOTE", "256")), 1)
+PUB_REPORTE_S = float(os.getenv("GC_PUB_REPORTE_S", "10"))
+
+# Backend inproc entre el broker y los workers
+ENLACE_BACKEND = "inproc://backend"
+LISTO = b"LISTO"        # primer mensaje de cada worker: queda libre en el broker
+
 # Estado global y sincronización
 EJECUTANDO = True
-lock_pub = threading.Lock()  # Lock para publicaciones (aunque ZMQ es thread-safe, por precaución)
+admision = Admision()   # GC_MAX_EN_VUELO, GC_EDAD_MAX_MS, GC_RETRY_AFTER_MS (solo la usa el broker)
+
+# Sin admisión: zmq.proxy -> DEALER -> workers REP; con admisión: broker -> ROUTER -> workers REQ
+PROXY = not admision.activa()
+SOCKET_BACKEND = zmq.DEALER if PROXY else zmq.ROUTER
+SOCKET_WORKER = zmq.REP if PROXY else zmq.REQ
+_OPERACION = re.compile(rb'"operation"\s*:\s*"([^"]*)"')
 stats_lock = threading.Lock()
 stats = {"procesadas": 0, "errores": 0, "por_operacion": {}}
 
+# Profundidad de la cola de publicación sin lock: cada worker suma solo en
+# su propia clave de `encoladas` y solo el publicador escribe pub_stats;
+# cola = sum(encoladas) - publicadas (lectura aproximada, para reportes)
+encoladas = {}
+pub_stats = {"publicadas": 0, "tandas": 0, "tanda_max": 0, "cola_max": 0}
+
 # Operaciones válidas (mapa de entrada -> tópico)
 OPERACIONES_VALIDAS = {
     "devolucion": "Devolucion",
@@ -63,6 +113,10 @@ def banner_inicio():
     print(f"  REP (escucha) : {ENLACE_REP}")
     print(f"  PUB (publica) : {ENLACE_PUB}")
     print(f"  Num Workers   : {NUM_WORKERS}")
+    limites = ", ".join(f"{op}={n}" for op, n in admision.limites.items()) or "sin límite"
+    print(f"  Máx en vuelo  : {limites}")
+    print(f"  Edad máx cola : {int(admision.edad_max_s * 1000)} ms (retry-after {admision.retry_after_ms} ms)")
+    print(f"  Frontend      : {'zmq.proxy (sin admisión)' if PROXY else 'broker con admisión'}")
     print("=" * 72 + "\n")
 
 def cargar_json_seguro(s: str):
@@ -72,6 +126,35 @@ def cargar_json_seguro(s: str):
     except Exception:
         return None
 
+def leer_solicitud(raw: str):
+    """Solicitud del PS (JSON o "op|codigo|usuario") -> (dict, operacion normalizada)."""
+    solicitud = cargar_json_seguro(raw)
+    if not isinstance(solicitud, dict):
+        partes = raw.split("|")
+        oper = partes[0].strip().lower() if len(partes) >= 1 else ""
+        codigo_libro = partes[1].strip() if len(partes) > 1 else None
+        id_usuario = partes[2].strip() if len(partes) > 2 else None
+        solicitud = {
+            "operation": oper,
+            "book_code": codigo_libro,
+            "user_id": id_usuario,
+        }
+    return solicitud, str(solicitud.get("operation") or "").strip().lower()
+
+def operacion_rapida(raw: bytes):
+    """
+    Operación de la solicitud sin parsear el JSON (para el broker): el primer
+    "operation":"..." de los bytes, o lo anterior al primer "|" en el formato
+    simple. La cuenta de admisión usa la misma operación al admitir y al
+    liberar, así que un caso raro mal leído no la desbalancea.
+    """
+    encontrada = _OPERACION.search(raw)
+    if encontrada is not None:
+        return encontrada.group(1).decode("utf-8", "replace").strip().lower()
+    if raw.lstrip()[:1] == b"{":
+        return ""
+    return raw.split(b"|", 1)[0].decode("utf-8", "replace").strip().lower()
+
 def construir_respuesta(estado="ok", mensaje="ok", informacion=None):
     """Construye respuesta JSON para PS."""
     carga = {"estado": estado, "mensaje": mensaje, "ts": iso()}
@@ -79,14 +162,72 @@ def construir_respuesta(estado="ok", mensaje="ok", informacion=None):
         carga["info"] = informacion
     return json.dumps(carga)
 
-def publicar_topico(socket_pub, topico: str, carga: dict):
-    """Publica a un tópico con la convención TOPICO {json}."""
+def publicar_topico(socket_pub, topico: str, carga: dict, thread_id=0):
+    """
+    Publica a un tópico con la convención TOPICO {json}.
+    socket_pub es el PUSH propio del worker: el envío solo encola hacia el
+    publicador (o espera si su cola llegó al HWM), sin lock entre workers.
+    """
     try:
-        with lock_pub:
-            socket_pub.send_string(f"{topico} {json.dumps(carga)}")
+        socket_pub.send_string(f"{topico} {json.dumps(carga)}")
+        encoladas[thread_id] = encoladas.get(thread_id, 0) + 1
     except Exception as e:
         print(f"[{iso()}] ERROR publicando tópico '{topico}': {e}", file=sys.stderr)
 
+def profundidad_cola():
+    """Publicaciones encoladas por los workers que el publicador aún no envió."""
+    return max(sum(list(encoladas.values())) - pub_stats["publicadas"], 0)
+
+def hilo_publicador(contexto, listo, fin):
+    """
+    Hilo publicador: único dueño del PUB.
+    Drena el PULL inproc (fan-in de los PUSH de los workers) por tandas de
+    hasta PUB_LOTE mensajes por despertar, y reporta cada PUB_REPORTE_S la
+    profundidad de la cola. Al activarse `fin` (workers ya detenidos)
+    vacía lo pendiente y cierra.
+    """
+    socket_pull = contexto.socket(zmq.PULL)
+    socket_pull.bind(ENTRADA_PUB)
+    socket_pub = contexto.socket(zmq.PUB)
+    socket_pub.bind(ENLACE_PUB)
+    listo.set()
+
+    proximo_reporte = time.monotonic() + PUB_REPORTE_S
+    ultimo_reporte = 0
+    while True:
+        terminando = fin.is_set()
+        if not terminando and not socket_pull.poll(500):
+            continue
+        # Tanda: lo acumulado se recibe de una vez y se envía seguido
+        tanda = []
+        for _ in range(PUB_LOTE):
+            try:
+                tanda.append(socket_pull.recv(flags=zmq.NOBLOCK))
+            except zmq.Again:
+                break
+        if tanda:
+            # pendientes al despertar (la tanda incluida), antes de enviarla
+            cola = profundidad_cola()
+            for mensaje in tanda:
+                socket_pub.send(mensaje, copy=False)
+            pub_stats["publicadas"] += len(tanda)
+            pub_stats["tandas"] += 1
+            pub_stats["tanda_max"] = max(pub_stats["tanda_max"], len(tanda))
+            pub_stats["cola_max"] = max(pub_stats["cola_max"], cola)
+        elif terminando:
+            break
+
+        if PUB_REPORTE_S > 0 and time.monotonic() >= proximo_reporte:
+            if pub_stats["publicadas"] != ultimo_reporte:
+                print(f"[{iso()}] Publicador: publicadas={pub_stats['publicadas']} "
+                      f"cola={profundidad_cola()} cola_max={pub_stats['cola_max']} "
+                      f"tanda_max={pub_stats['tanda_max']}")
+                ultimo_reporte = pub_stats["publicadas"]
+            proximo_reporte = time.monotonic() + PUB_REPORTE_S
+
+    socket_pull.close(linger=0)
+    socket_pub.close(linger=1000)
+
 def actualizar_stats(operacion: str, exito: bool):
     """Actualiza estadísticas de forma thread-safe."""
     with stats_lock:
@@ -114,39 +255,35 @@ def print_bloque_solicitud(operacion, codigo_libro, id_usuario, thread_id):
     print(f"  Timestamp : {iso()}")
     print("-" * 72 + "\n")
 
-def procesar_solicitud(socket_rep, socket_pub, contexto, thread_id):
+def responder(socket_rep, sobre, texto: str):
+    """Respuesta al PS: sobre = [identidad del PS, b""] con REQ; [] con REP (proxy)."""
+    socket_rep.send_multipart(sobre + [texto.encode("utf-8")])
+
+def procesar_solicitud(socket_rep, socket_pub, actor, thread_id):
     """
     Función ejecutada por cada worker thread.
-    Recibe solicitud, la procesa y envía respuesta.
+    socket_rep es un REQ hacia el broker: avisa LISTO, recibe
+    [sobre..., solicitud] y cada respuesta lo deja libre para la siguiente.
+    Con zmq.proxy es un REP y recibe solo [solicitud].
     """
+    if socket_rep.socket_type == zmq.REQ:
+        socket_rep.send(LISTO)
+    sobre = None        # solicitud recibida y aún sin responder
     while EJECUTANDO:
         try:
             # Recibir solicitud (blocking con timeout)
             if socket_rep.poll(500, zmq.POLLIN):
-                raw = socket_rep.recv_string()
+                *sobre, raw = socket_rep.recv_multipart()
                 recibido_ts = iso()
 
-                # Parsear JSON o formato simple
-                solicitud = cargar_json_seguro(raw)
-                if solicitud is None:
-                    partes = raw.split("|")
-                    oper = partes[0].strip().lower() if len(partes) >= 1 else ""
-                    codigo_libro = partes[1].strip() if len(partes) > 1 else None
-                    id_usuario = partes[2].strip() if len(partes) > 2 else None
-                    solicitud = {
-                        "operation": oper,
-                        "book_code": codigo_libro,
-                        "user_id": id_usuario,
-                    }
-
-                # Normalizar campos
-                operacion = (solicitud.get("operation") or "").strip().lower()
+                # Parsear JSON o formato simple y normalizar campos
+                solicitud, operacion = leer_solicitud(raw.decode("utf-8", "replace"))
                 codigo_libro = solicitud.get("book_code")
                 id_usuario = solicitud.get("user_id")
 
                 # Validar operación soportada
                 if operacion not in OPERACIONES_VALIDAS:
-                    socket_rep.send_string(construir_respuesta(
+                    responder(socket_rep, sobre, construir_respuesta(
                         estado="error",
                         mensaje="Operacion no soportada",
                         informacion={"operacion_recibida": operacion},
@@ -156,20 +293,12 @@ def procesar_solicitud(socket_rep, socket_pub, contexto, thread_id):
 
                 # Manejo especial: PRESTAMO (síncrono con actor)
                 if operacion == "prestamo":
-                    req_socket = None
                     try:
-                        req_socket = contexto.socket(zmq.REQ)
-                        req_socket.setsockopt(zmq.RCVTIMEO, 5000)
-                        req_socket.setsockopt(zmq.SNDTIMEO, 5000)
-                        req_socket.connect(ACTOR_PRESTAMO)
-
-                        payload_al_actor = json.dumps(solicitud)
-                        req_socket.send_string(payload_al_actor)
-
                         try:
-                            respuesta_actor = req_socket.recv_string()
+                            # recv_ts llega al GA: el vencimiento se cuenta desde ahí
+                            respuesta_actor = actor.pedir(dict(solicitud, recv_ts=recibido_ts))
                         except zmq.ZMQError as e_recv:
-                            socket_rep.send_string(construir_respuesta(
+                            responder(socket_rep, sobre, construir_respuesta(
                                 estado="error",
                                 mensaje="Error comunicando con actor de prestamo",
                                 informacion={"detalle": str(e_recv)},
@@ -177,29 +306,22 @@ def procesar_solicitud(socket_rep, socket_pub, contexto, thread_id):
                             actualizar_stats(operacion, False)
                             continue
 
-                        socket_rep.send_string(respuesta_actor)
+                        responder(socket_rep, sobre, respuesta_actor)
                         actualizar_stats(operacion, True)
                         print_bloque_solicitud(operacion, codigo_libro, id_usuario, thread_id)
 
                     except Exception as e:
-                        socket_rep.send_string(construir_respuesta(
+                        responder(socket_rep, sobre, construir_respuesta(
                             estado="error",
                             mensaje="Error inesperado en GC durante prestamo",
                             informacion={"detalle": str(e)},
                         ))
                         actualizar_stats(operacion, False)
 
-                    finally:
-                        if req_socket is not None:
-                            try:
-                                req_socket.close(linger=0)
-                            except Exception:
-                                pass
-                    
                     continue
 
                 # Caso general: devolucion / renovacion
-                socket_rep.send_string(construir_respuesta(
+                responder(socket_rep, sobre, construir_respuesta(
                     estado="ok",
                     mensaje="Operacion aceptada",
                     informacion={
@@ -219,12 +341,16 @@ def procesar_solicitud(socket_rep, socket_pub, contexto, thread_id):
                     "published_ts": iso(),
                     "origen": "GC",
                     "recv_ts": recibido_ts,
+                    # clave de idempotencia del PS: el GA no aplica dos veces un reintento
+                    "request_id": solicitud.get("request_id"),
                 }
 
-                publicar_topico(socket_pub, topico, payload_publicacion)
+                publicar_topico(socket_pub, topico, payload_publicacion, thread_id)
                 actualizar_stats(operacion, True)
                 print_bloque_solicitud(operacion, codigo_libro, id_usuario, thread_id)
 
+            sobre = None
+
         except zmq.ZMQError as e:
             if EJECUTANDO:
                 print(f"[{iso()}] Thread-{thread_id} ZMQError: {e}", file=sys.stderr)
@@ -233,26 +359,117 @@ def procesar_solicitud(socket_rep, socket_pub, contexto, thread_id):
         except Exception as e:
             if EJECUTANDO:
                 print(f"[{iso()}] Thread-{thread_id} ERROR: {e}", file=sys.stderr)
+                if sobre is not None:
+                    # El REQ espera una respuesta antes de volver a recibir:
+                    # sin ella el worker quedaría fuera del broker para siempre
+                    try:
+                        responder(socket_rep, sobre, construir_respuesta(
+                            estado="error",
+                            mensaje="Error inesperado en GC",
+                            informacion={"detalle": str(e)},
+                        ))
+                    except zmq.ZMQError:
+                        pass
+            sobre = None
             time.sleep(0.1)
 
-def worker_thread(contexto_compartido, socket_pub, thread_id):
+def broker(frontend, backend):
+    """
+    Frontend con control de admisión (en lugar de zmq.proxy).
+    frontend: ROUTER de los PS; backend: ROUTER de los workers (REQ).
+    Cada solicitud pasa por admision.admitir (límite en vuelo por operación)
+    y espera en `pendientes` hasta que haya un worker libre; si antes supera
+    la edad máxima se descarta con busy. Corre hasta EJECUTANDO = False o
+    KeyboardInterrupt (señal).
+    """
+    libres = deque()        # workers que avisaron LISTO o ya respondieron
+    ocupados = {}           # worker -> operación que está atendiendo
+    pendientes = deque()    # (llegada, sobre, raw, operacion), en orden de llegada
+    poller = zmq.Poller()
+    poller.register(frontend, zmq.POLLIN)
+    poller.register(backend, zmq.POLLIN)
+
+    while EJECUTANDO:
+        espera = 500
+        if pendientes and admision.edad_max_s:
+            # despertar a tiempo para descartar la más vieja
+            restante = admision.edad_max_s - (time.monotonic() - pendientes[0][0])
+            espera = max(0, min(espera, int(restante * 1000) + 1))
+        eventos = dict(poller.poll(espera))
+
+        # Respuestas de workers primero: liberan workers para lo pendiente
+        if backend in eventos:
+            for _ in range(1000):
+                try:
+                    worker, _, *resto = backend.recv_multipart(flags=zmq.NOBLOCK)
+                except zmq.Again:
+                    break
+                operacion = ocupados.pop(worker, None)
+                if operacion is not None:
+                    admision.liberar(operacion)
+                    frontend.send_multipart(resto)
+                libres.append(worker)
+
+        if frontend in eventos:
+            for _ in range(1000):
+                try:
+                    *sobre, raw = frontend.recv_multipart(flags=zmq.NOBLOCK)
+                except zmq.Again:
+                    break
+                operacion = operacion_rapida(raw)
+                if not admision.admitir(operacion):
+                    frontend.send_multipart(sobre + [admision.busy(operacion, "en_vuelo").encode("utf-8")])
+                    continue
+                pendientes.append((time.monotonic(), sobre, raw, operacion))
+
+        # Descarte por edad (la cola está en orden de llegada: basta mirar la cabeza)
+        ahora = time.monotonic()
+        while pendientes and admision.vencida(pendientes[0][0], ahora):
+            llegada, sobre, _, operacion = pendientes.popleft()
+            frontend.send_multipart(sobre + [admision.busy(operacion, "edad_cola", llegada).encode("utf-8")])
+            admision.liberar(operacion, descartada=True)
+
+        # Despacho: solo a workers libres
+        while pendientes and libres:
+            _, sobre, raw, operacion = pendientes.popleft()
+            worker = libres.popleft()
+            ocupados[worker] = operacion
+            backend.send_multipart([worker, b""] + sobre + [raw])
+
+def enrutar(frontend, backend):
+    """Frontend -> workers: broker con admisión, o zmq.proxy (en C) si no hay admisión."""
+    if PROXY:
+        zmq.proxy(frontend, backend)
+    else:
+        broker(frontend, backend)
+
+def worker_thread(contexto_compartido, thread_id):
     """
     Thread worker que maneja solicitudes.
-    Cada worker tiene su propio socket REP conectado al mismo endpoint.
+    Cada worker tiene su propio socket REQ conectado al broker (REP con zmq.proxy),
+    su PUSH hacia el publicador y su propia conexión persistente al actor
+    de préstamo: ningún socket se comparte entre hilos.
     """
-    socket_rep_worker = contexto_compartido.socket(zmq.REP)
-    socket_rep_worker.connect("inproc://backend")
+    socket_rep_worker = contexto_compartido.socket(SOCKET_WORKER)
+    socket_rep_worker.connect(ENLACE_BACKEND)
+    socket_pub = contexto_compartido.socket(zmq.PUSH)
+    socket_pub.connect(ENTRADA_PUB)
+    actor = ClienteActor(contexto_compartido, ACTOR_PRESTAMO, ACTOR_TIMEOUT_MS)
     
     try:
-        procesar_solicitud(socket_rep_worker, socket_pub, contexto_compartido, thread_id)
+        procesar_solicitud(socket_rep_worker, socket_pub, actor, thread_id)
     finally:
         socket_rep_worker.close(linger=0)
+        socket_pub.close(linger=1000)   # lo ya encolado llega al publicador
+        actor.cerrar()
 
 def manejar_senal(sig, frame):
     """Maneja señales para cierre ordenado."""
     global EJECUTANDO
     print(f"\n[{iso()}] Señal recibida ({sig}). Deteniendo GC multihilo...\n")
-    EJECUTANDO = False
+    EJECUTANDO = False          # el broker lo revisa en cada vuelta (poll <= 500 ms)
+    if PROXY:
+        raise KeyboardInterrupt     # zmq.proxy reintenta ante EINTR: hay que cortarlo
 
 def print_stats_final():
     """Imprime estadísticas finales."""
@@ -264,6 +481,12 @@ def print_stats_final():
     print("\n  Por operación:")
     for op, counts in stats["por_operacion"].items():
         print(f"    {op:12} : OK={counts['ok']:>5}  ERROR={counts['error']:>5}")
+    print("\n  Publicador:")
+    print(f"    Publicadas     : {pub_stats['publicadas']} en {pub_stats['tandas']} tandas "
+          f"(máx {pub_stats['tanda_max']} por tanda)")
+    print(f"    Cola máx/final : {pub_stats['cola_max']} / {profundidad_cola()}")
+    print("\n  Admisión:")
+    print(f"    {admision.resumen()}")
     print("=" * 72 + "\n")
 
 def main():
@@ -277,24 +500,30 @@ def main():
     
     contexto = zmq.Context.instance()
     
-    # Socket REP (frontend) que recibe del PS
-    socket_rep_frontend = contexto.socket(zmq.REP)
+    # Socket ROUTER (frontend) que recibe del PS: el sobre de cada PS viaja
+    # con la solicitud hasta el worker y vuelve con la respuesta
+    socket_rep_frontend = contexto.socket(zmq.ROUTER)
     socket_rep_frontend.bind(ENLACE_REP)
     
-    # Socket PUB compartido por todos los workers
-    socket_pub = contexto.socket(zmq.PUB)
-    socket_pub.bind(ENLACE_PUB)
+    # Hilo publicador (dueño del PUB); listo antes de que los workers conecten
+    listo_pub = threading.Event()
+    fin_pub = threading.Event()
+    publicador = threading.Thread(target=hilo_publicador, args=(contexto, listo_pub, fin_pub),
+                                  name="gc-publicador", daemon=True)
+    publicador.start()
+    listo_pub.wait()
     
-    # Backend inproc para distribuir trabajo a workers
-    socket_backend = contexto.socket(zmq.DEALER)
-    socket_backend.bind("inproc://backend")
+    # Backend inproc: ROUTER para elegir a qué worker libre va cada solicitud
+    # (DEALER si no hay admisión: zmq.proxy reparte entre los REP)
+    socket_backend = contexto.socket(SOCKET_BACKEND)
+    socket_backend.bind(ENLACE_BACKEND)
     
     # Crear pool de workers
     workers = []
     for i in range(NUM_WORKERS):
         t = threading.Thread(
             target=worker_thread,
-            args=(contexto, socket_pub, i+1),
+            args=(contexto, i+1),
             daemon=True
         )
         t.start()
@@ -303,23 +532,26 @@ def main():
     print(f"[{iso()}] {NUM_WORKERS} workers iniciados\n")
     
     try:
-        # Proxy entre frontend y backend
-        zmq.proxy(socket_rep_frontend, socket_backend)
+        enrutar(socket_rep_frontend, socket_backend)
+    except KeyboardInterrupt:
+        EJECUTANDO = False
     except zmq.ZMQError:
         pass  # Interrupción normal por señal
     except Exception as e:
-        print(f"[{iso()}] ERROR en proxy: {e}", file=sys.stderr)
+        print(f"[{iso()}] ERROR en broker: {e}", file=sys.stderr)
     
     # Esperar a que los workers terminen
     print(f"[{iso()}] Esperando a que los workers terminen...")
     for t in workers:
         t.join(timeout=2)
+    # Después de los workers: el publicador vacía lo que encolaron
+    fin_pub.set()
+    publicador.join(timeout=5)
     
     # Cerrar sockets
     try:
         socket_rep_frontend.close(linger=0)
         socket_backend.close(linger=0)
-        socket_pub.close(linger=0)
         contexto.term()
     except Exception:
         pass
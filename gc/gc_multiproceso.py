@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# archivo: gc/gc_multiproceso.py
+#
+# Universidad: Pontificia Universidad Javeriana
+# Materia: INTRODUCCIÓN A SISTEMAS DISTRIBUIDOS
+# Profesor: Rafael Páez Méndez
+# Integrantes: Thomas Arévalo, Santiago Mesa, Diego Castrillón
+#
+# Qué hace:
+#   Versión MULTIPROCESO del Gestor de Carga (GC). Misma lógica de negocio
+#   que gc_multihilo.py (procesar_solicitud), pero cada worker es un proceso
+#   con su propio intérprete: el parseo y armado de JSON no comparten el GIL.
+#
+#   Procesos:
+#     - frontend (este): ROUTER (PS) <-> ROUTER ipc://, con el broker de
+#       gc_multihilo.py (control de admisión de gc/admision.py: límite en
+#       vuelo por operación, descarte por edad en cola, respuesta busy);
+#       sin admisión, zmq.proxy hacia un DEALER ipc:// y workers REP
+#     - GC_PROCESOS workers: REQ conectado al broker, conexión persistente
+#       al actor de préstamo (gc/cliente_actor.py) y PUSH hacia el publicador
+#     - publicador: PULL ipc:// -> PUB (GC_PUB_BIND), el único dueño del PUB
+#
+#   Los endpoints ipc:// van en GC_IPC_DIR (default: directorio temporal),
+#   con el pid del frontend en el nombre para no chocar con otro GC.
+#
+# Uso:
+#   python gc/gc_multiproceso.py
+#   GC_PROCESOS=4 python gc/gc_multiproceso.py
+
+import os
+import sys
+import signal
+import tempfile
+import multiprocessing as mp
+from datetime import datetime
+
+import zmq
+
+import gc_multihilo as base
+
+ENLACE_REP = base.ENLACE_REP
+ENLACE_PUB = base.ENLACE_PUB
+NUM_PROCESOS = max(int(os.getenv("GC_PROCESOS", str(os.cpu_count() or 1))), 1)
+IPC_DIR = os.getenv("GC_IPC_DIR", tempfile.gettempdir())
+
+def iso():
+    """Retorna timestamp ISO-8601 (UTC) con sufijo Z."""
+    return datetime.utcnow().isoformat() + "Z"
+
+def endpoints(pid):
+    """Endpoints ipc:// del frontend `pid`: (backend de workers, entrada del publicador)."""
+    return (f"ipc://{IPC_DIR}/gc-{pid}-backend", f"ipc://{IPC_DIR}/gc-{pid}-pub")
+
+def banner_inicio(backend, entrada_pub):
+    """Imprime banner de inicio con configuración."""
+    print("\n" + "=" * 72)
+    print(" GESTOR DE CARGA MULTIPROCESO (GC) — ROUTER/DEALER + PUB/SUB ".center(72, " "))
+    print("-" * 72)
+    print(f"  ROUTER (escucha) : {ENLACE_REP}")
+    print(f"  PUB (publica)    : {ENLACE_PUB}")
+    print(f"  Procesos worker  : {NUM_PROCESOS}")
+    print(f"  Backend          : {backend}")
+    print(f"  Publicador       : {entrada_pub}")
+    limites = ", ".join(f"{op}={n}" for op, n in base.admision.limites.items()) or "sin límite"
+    print(f"  Máx en vuelo     : {limites}")
+    print(f"  Edad máx en cola : {int(base.admision.edad_max_s * 1000)} ms")
+    print(f"  Frontend         : {'zmq.proxy (sin admisión)' if base.PROXY else 'broker con admisión'}")
+    print("=" * 72 + "\n")
+
+def _detener_worker(sig, frame):
+    """En un worker: termina el bucle de procesar_solicitud."""
+    base.EJECUTANDO = False
+
+def proceso_worker(backend, entrada_pub, worker_id):
+    """
+    Worker: el mismo procesar_solicitud que un hilo de gc_multihilo.py, con
+    su PUSH hacia el proceso publicador (ipc:// en lugar de inproc://).
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)     # lo detiene el frontend
+    signal.signal(signal.SIGTERM, _detener_worker)
+    contexto = zmq.Context()
+    socket_rep = contexto.socket(base.SOCKET_WORKER)
+    socket_rep.connect(backend)
+    socket_pub = contexto.socket(zmq.PUSH)
+    socket_pub.connect(entrada_pub)
+    actor = base.ClienteActor(contexto, base.ACTOR_PRESTAMO, base.ACTOR_TIMEOUT_MS)
+    try:
+        base.procesar_solicitud(socket_rep, socket_pub, actor, worker_id)
+    finally:
+        socket_rep.close(linger=0)
+        socket_pub.close(linger=1000)   # lo ya aceptado llega al publicador
+        actor.cerrar()
+        contexto.term()
+        s = base.stats
+        print(f"[{iso()}] Worker-{worker_id} (pid {os.getpid()}): procesadas={s['procesadas']} "
+              f"errores={s['errores']}")
+
+def proceso_publicador(entrada_pub):
+    """Publicador: único dueño del PUB; reenvía lo que publican los workers."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _detener_worker)
+    contexto = zmq.Context()
+    socket_pull = contexto.socket(zmq.PULL)
+    socket_pull.bind(entrada_pub)
+    socket_pub = contexto.socket(zmq.PUB)
+    socket_pub.bind(ENLACE_PUB)
+    publicadas = 0
+    while True:
+        # SIGTERM llega con los workers ya detenidos: se sigue vaciando el PULL
+        # (lo que aceptaron sus PUSH al cerrar) hasta 100 ms sin mensajes
+        terminando = not base.EJECUTANDO
+        if not socket_pull.poll(100 if terminando else 500):
+            if terminando:
+                break
+            continue
+        # se drena lo acumulado antes de volver al poll
+        for _ in range(1000):
+            try:
+                socket_pub.send(socket_pull.recv(flags=zmq.NOBLOCK))
+            except zmq.Again:
+                break
+            publicadas += 1
+    socket_pull.close(linger=0)
+    socket_pub.close(linger=1000)
+    contexto.term()
+    print(f"[{iso()}] Publicador (pid {os.getpid()}): {publicadas} publicaciones")
+
+def _detener_frontend(sig, frame):
+    """Termina el broker (lo revisa en cada vuelta) o corta zmq.proxy, para el cierre ordenado."""
+    print(f"\n[{iso()}] Señal recibida ({sig}). Deteniendo GC multiproceso...\n")
+    base.EJECUTANDO = False
+    if base.PROXY:
+        raise KeyboardInterrupt     # zmq.proxy reintenta ante EINTR
+
+def main():
+    """Arranca publicador y workers, y hace de frontend hasta una señal."""
+    backend, entrada_pub = endpoints(os.getpid())
+    banner_inicio(backend, entrada_pub)
+
+    publicador = mp.Process(target=proceso_publicador, args=(entrada_pub,), name="gc-publicador")
+    publicador.start()
+    workers = [mp.Process(target=proceso_worker, args=(backend, entrada_pub, i + 1), name=f"gc-worker-{i + 1}")
+               for i in range(NUM_PROCESOS)]
+    for p in workers:
+        p.start()
+    print(f"[{iso()}] {NUM_PROCESOS} procesos worker iniciados\n")
+
+    signal.signal(signal.SIGINT, _detener_frontend)
+    signal.signal(signal.SIGTERM, _detener_frontend)
+    contexto = zmq.Context()
+    socket_frontend = contexto.socket(zmq.ROUTER)
+    socket_frontend.bind(ENLACE_REP)
+    socket_backend = contexto.socket(base.SOCKET_BACKEND)
+    socket_backend.bind(backend)
+    try:
+        base.enrutar(socket_frontend, socket_backend)
+    except KeyboardInterrupt:
+        pass
+    except zmq.ZMQError as e:
+        print(f"[{iso()}] ERROR en broker: {e}", file=sys.stderr)
+
+    # Workers primero (terminan lo que tienen y publican), después el publicador
+    print(f"[{iso()}] Esperando a que los procesos terminen...")
+    for p in workers:
+        p.terminate()
+    for p in workers:
+        p.join(timeout=5)
+    publicador.terminate()
+    publicador.join(timeout=5)
+    socket_frontend.close(linger=0)
+    socket_backend.close(linger=0)
+    contexto.term()
+    print(f"[{iso()}] Admisión: {base.admision.resumen()}")
+    for endpoint in (backend, entrada_pub):
+        try:
+            os.remove(endpoint[len("ipc://"):])
+        except OSError:
+            pass
+    print(f"[{iso()}] GC multiproceso detenido correctamente.\n")
+
+if __name__ == "__main__":
+    main()
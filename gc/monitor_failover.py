@@ -5,6 +5,9 @@
 # - Envía "ping" al GA primario cada 2 segundos (REQ/REP).
 # - Si el primario falla 3 pings consecutivos escribe "secondary" en gc/ga_activo.txt.
 # - Si el primario vuelve a responder escribe "primary" en gc/ga_activo.txt.
+#   Un primario que vuelve responde "failback" mientras incorpora las
+#   escrituras que atendió el secundario (ver ga/replicacion.py): está vivo,
+#   pero no se conmuta hasta que responda "pong".
 # - Registra cambios en consola y en logs/monitor_failover.log con timestamps ISO.
 #
 # Uso:
@@ -23,7 +26,8 @@ from datetime import datetime
 # Por defecto: primary en M1 (10.43.101.220:6000), secondary local o en M2
 GA_PRIMARY_ADDR = os.getenv("GA_PRIMARY_ADDR", "tcp://10.43.101.220:6000")
 GA_SECONDARY_ADDR = os.getenv("GA_SECONDARY_ADDR", "tcp://localhost:6001")
-FILE_STATUS = "gc/ga_activo.txt"
+# Con GA particionado (ga/ruteo.py) hay un monitor por partición: gc/ga_activo_{k}.txt
+FILE_STATUS = os.getenv("GA_STATUS_FILE", "gc/ga_activo.txt")
 LOG_DIR = "logs"
 LOG_FILE = os.path.join(LOG_DIR, "monitor_failover.log")
 
@@ -143,7 +147,8 @@ def _primary_candidates():
 def ping_primary_once(logger):
     """
     Intenta enviar 'ping' al GA primario y recibir 'pong'.
-    Retorna True si recibió 'pong', False en caso contrario.
+    Retorna True si recibió 'pong', None si respondió 'failback' (vivo pero
+    todavía sin las escrituras del secundario) y False en otro caso.
     Intenta también un fallback a 127.0.0.1 si la dirección es localhost.
     """
     ctx = zmq.Context.instance()
@@ -168,6 +173,9 @@ def ping_primary_once(logger):
             if isinstance(reply, str) and reply.strip().lower() == "pong":
                 logger.info(f"{iso()} Pong recibido desde {addr}")
                 return True
+            elif isinstance(reply, str) and reply.strip().lower() == "failback":
+                logger.info(f"{iso()} GA primario en failback ({addr}): se mantiene el estado actual")
+                return None
             else:
                 logger.warning(f"{iso()} Respuesta inesperada desde {addr}: {reply!r}")
         except Exception as e:
@@ -230,7 +238,10 @@ def main():
     while running:
         try:
             ok = ping_primary_once(logger)
-            if ok:
+            if ok is None:
+                # Primario vivo pero en failback: ni cuenta como fallo ni se vuelve a él
+                consecutive_failures = 0 if currently_primary else consecutive_failures
+            elif ok:
                 # Se recibió pong
                 if not currently_primary:
                     # Si estábamos en secundario, restauramos a primary
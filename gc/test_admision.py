@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# archivo: gc/test_admision.py
+#
+# Pruebas del control de admisión del GC (gc/admision.py):
+# - GC_MAX_EN_VUELO: formato, 0 = sin límite, error si está mal escrito
+# - admitir/liberar: cuenta en vuelo por operación, rechazo al límite y
+#   lugar de nuevo al liberar; descartadas por edad cuentan aparte
+# - vencida: edad en cola contra GC_EDAD_MAX_MS (0 = nunca)
+# - busy: respuesta JSON para el PS, sin modificar el estado
+# - operacion_rapida (gc/gc_multihilo.py): la operación que cuenta el broker
+#
+# Uso:
+#   python -m pytest -q gc/test_admision.py
+#   python gc/test_admision.py
+
+import sys
+import json
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from admision import Admision, parsear_limites   # noqa: E402
+
+def test_parsear_limites():
+    assert parsear_limites("prestamo=2, Consulta=5,,devolucion=0") == {"prestamo": 2, "consulta": 5}
+    assert parsear_limites("") == {} and parsear_limites(None) == {}
+    try:
+        parsear_limites("prestamo=muchos")
+        assert False, "debía fallar"
+    except ValueError as e:
+        assert "prestamo=muchos" in str(e)
+
+def test_admitir_y_liberar():
+    a = Admision({"prestamo": 2}, edad_max_ms=0, retry_after_ms=50)
+    assert a.activa()
+    assert a.admitir("prestamo") and a.admitir("prestamo")
+    assert not a.admitir("prestamo")            # al límite
+    assert a.en_vuelo["prestamo"] == 2
+    # sin límite propio: siempre entra, pero se cuenta
+    for _ in range(5):
+        assert a.admitir("devolucion")
+    assert a.en_vuelo["devolucion"] == 5
+
+    a.liberar("prestamo")
+    assert a.admitir("prestamo")                # el lugar liberado se reusa
+    a.liberar("prestamo", descartada=True)
+    a.liberar("prestamo")
+    a.liberar("prestamo")                       # de más: no baja de 0
+    assert a.en_vuelo["prestamo"] == 0
+    assert a.stats == {"admitidas": 8, "en_vuelo": 1, "edad_cola": 1}
+    assert a.resumen() == "admitidas=8 rechazadas_en_vuelo=1 descartadas_edad=1"
+
+def test_vencida():
+    a = Admision({}, edad_max_ms=100, retry_after_ms=0)
+    assert a.activa()
+    llegada = time.monotonic()
+    assert not a.vencida(llegada, llegada + 0.099)
+    assert a.vencida(llegada, llegada + 0.102)
+    assert not a.vencida(llegada)               # ahora por defecto: recién llegada
+    # sin límites ni edad máxima la admisión está apagada (zmq.proxy)
+    b = Admision({}, edad_max_ms=0, retry_after_ms=0)
+    assert not b.activa() and not b.vencida(llegada, llegada + 3600)
+
+def test_busy():
+    a = Admision({"prestamo": 1}, edad_max_ms=1000, retry_after_ms=250)
+    assert a.admitir("prestamo")
+    r = json.loads(a.busy("prestamo", "en_vuelo"))
+    assert r["estado"] == "busy" and r["retry_after_ms"] == 250 and r["ts"].endswith("Z")
+    assert r["info"] == {"operacion": "prestamo", "motivo": "en_vuelo", "en_vuelo": 1, "limite": 1}
+
+    r = json.loads(a.busy("prestamo", "edad_cola", time.monotonic() - 0.3))
+    assert r["info"]["motivo"] == "edad_cola" and "limite" not in r["info"]
+    assert 300 <= r["info"]["edad_ms"] < 1000
+    # busy no cambia la cuenta ni las estadísticas
+    assert a.en_vuelo == {"prestamo": 1} and a.stats["en_vuelo"] == 0
+
+def test_operacion_rapida():
+    from gc_multihilo import operacion_rapida
+    assert operacion_rapida(b'{"book_code": "B1", "operation" : " Prestamo "}') == "prestamo"
+    assert operacion_rapida("devolucion|B1|7".encode()) == "devolucion"
+    assert operacion_rapida(b'{"book_code": "B1"}') == ""
+    assert operacion_rapida(b"") == ""
+
+if __name__ == "__main__":
+    for nombre, fn in list(globals().items()):
+        if nombre.startswith("test_") and callable(fn):
+            fn()
+            print(f"PASS {nombre}")
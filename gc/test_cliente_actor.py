@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# archivo: gc/test_cliente_actor.py
+#
+# Pruebas de la conexión persistente del GC al actor de préstamo
+# (gc/cliente_actor.py), con un actor falso (ROUTER, como lo ve el DEALER
+# a través del REP) sobre inproc:
+# - varias solicitudes en vuelo: cada respuesta vuelve con su dato aunque
+#   lleguen en otro orden
+# - una respuesta que llega después de vencer se descarta (tardía)
+# - vence una solicitud sin ninguna respuesta desde que se abrió el socket:
+#   se reabre la conexión y la siguiente solicitud sale por el socket nuevo
+# - pedir(): bloqueante, respuesta o zmq.Again al vencer
+#
+# Uso:
+#   python -m pytest -q gc/test_cliente_actor.py
+#   python gc/test_cliente_actor.py
+
+import sys
+import json
+import time
+import threading
+from pathlib import Path
+
+import zmq
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from cliente_actor import ClienteActor   # noqa: E402
+
+def _actor(ctx, nombre):
+    actor = ctx.socket(zmq.ROUTER)
+    actor.setsockopt(zmq.LINGER, 0)
+    actor.bind(f"inproc://{nombre}")
+    return actor
+
+def _leer(actor, n):
+    # n solicitudes: [(tramas de ruteo, carga)]
+    out = []
+    for _ in range(n):
+        assert actor.poll(2000), "el actor no recibió la solicitud"
+        *sobre, raw = actor.recv_multipart()
+        out.append((sobre, json.loads(raw)))
+    return out
+
+def _responder(actor, sobre, carga):
+    actor.send_multipart(sobre + [json.dumps(carga).encode("utf-8")])
+
+def _recibir(cliente, n):
+    out = []
+    while len(out) < n:
+        assert cliente.socket.poll(2000), "sin respuesta del actor"
+        out.extend(cliente.recibir())
+    return out
+
+def test_correlacion_de_sobres():
+    ctx = zmq.Context()
+    actor = _actor(ctx, "actor-corr")
+    cliente = ClienteActor(ctx, "inproc://actor-corr", timeout_ms=2000)
+    try:
+        for i in range(3):
+            assert cliente.enviar({"book_code": f"B{i}"}, f"dato-{i}")
+        pedidos = _leer(actor, 3)
+        # el sobre lleva el id propio del cliente antes del delimitador
+        assert [len(sobre) for sobre, _ in pedidos] == [3, 3, 3]
+        for sobre, carga in reversed(pedidos):
+            _responder(actor, sobre, {"libro": carga["book_code"]})
+        listas = _recibir(cliente, 3)
+        assert [(dato, json.loads(r)["libro"]) for dato, r in listas] == [
+            ("dato-2", "B2"), ("dato-1", "B1"), ("dato-0", "B0")]
+        assert cliente.en_vuelo == {} and cliente.stats["respuestas"] == 3
+    finally:
+        cliente.cerrar()
+        actor.close()
+        ctx.term()
+
+def test_respuesta_tardia_descartada():
+    ctx = zmq.Context()
+    actor = _actor(ctx, "actor-tarde")
+    cliente = ClienteActor(ctx, "inproc://actor-tarde", timeout_ms=50)
+    try:
+        # una respuesta a tiempo: el actor está vivo, vencer no reconecta
+        cliente.enviar({"n": 0}, "a-tiempo")
+        sobre, _ = _leer(actor, 1)[0]
+        _responder(actor, sobre, {"ok": 0})
+        assert [d for d, _ in _recibir(cliente, 1)] == ["a-tiempo"]
+
+        cliente.enviar({"n": 1}, "lenta")
+        sobre, _ = _leer(actor, 1)[0]
+        time.sleep(0.08)
+        assert cliente.espera_ms(500) == 0
+        assert cliente.vencidos() == ["lenta"]
+        socket = cliente.socket
+        _responder(actor, sobre, {"ok": 1})
+        assert socket.poll(2000)
+        assert cliente.recibir() == []
+        assert cliente.socket is socket
+        assert cliente.stats["tardias"] == 1 and cliente.stats["reconexiones"] == 0
+    finally:
+        cliente.cerrar()
+        actor.close()
+        ctx.term()
+
+def test_reconecta_si_el_actor_no_responde():
+    ctx = zmq.Context()
+    actor = _actor(ctx, "actor-mudo")
+    poller = zmq.Poller()
+    cliente = ClienteActor(ctx, "inproc://actor-mudo", timeout_ms=50, poller=poller)
+    try:
+        cliente.enviar({"n": 1}, "perdida")
+        _leer(actor, 1)                     # llega, pero el actor nunca contesta
+        viejo = cliente.socket
+        time.sleep(0.08)
+        assert cliente.vencidos() == ["perdida"]
+        assert cliente.socket is not viejo and cliente.stats["reconexiones"] == 1
+        # el poller del dueño ahora mira el socket nuevo
+        registrados = [s for s, _ in poller.sockets]
+        assert cliente.socket in registrados and viejo not in registrados
+
+        # la siguiente sale por la conexión nueva y se responde normalmente
+        cliente.enviar({"n": 2}, "nueva")
+        sobre, carga = _leer(actor, 1)[0]
+        assert carga == {"n": 2}
+        _responder(actor, sobre, {"ok": 2})
+        assert [d for d, _ in _recibir(cliente, 1)] == ["nueva"]
+    finally:
+        cliente.cerrar()
+        actor.close()
+        ctx.term()
+
+def test_pedir_bloqueante():
+    ctx = zmq.Context()
+    actor = _actor(ctx, "actor-pedir")
+    cliente = ClienteActor(ctx, "inproc://actor-pedir", timeout_ms=200)
+
+    def contestar():
+        sobre, carga = _leer(actor, 1)[0]
+        _responder(actor, sobre, {"eco": carga["n"]})
+    try:
+        hilo = threading.Thread(target=contestar)
+        hilo.start()
+        assert json.loads(cliente.pedir({"n": 7})) == {"eco": 7}
+        hilo.join()
+
+        inicio = time.monotonic()
+        try:
+            cliente.pedir({"n": 8})         # el actor no contesta
+            assert False, "pedir debía vencer"
+        except zmq.Again:
+            pass
+        assert 0.15 <= time.monotonic() - inicio < 2
+        assert cliente.en_vuelo == {}
+    finally:
+        cliente.cerrar()
+        actor.close()
+        ctx.term()
+
+if __name__ == "__main__":
+    for nombre, fn in list(globals().items()):
+        if nombre.startswith("test_") and callable(fn):
+            fn()
+            print(f"PASS {nombre}")
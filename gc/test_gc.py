@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# archivo: gc/test_gc.py
+#
+# Prueba de integración del GC serial por eventos (gc/gc.py): levanta gc.py
+# en un directorio temporal con un actor de préstamo y un GA falsos (REP,
+# lentos a propósito) y verifica que:
+# - un préstamo lento no frena una devolución que llegó después: la
+#   devolución se responde y se publica ("Devolucion {...}") mientras el
+#   préstamo sigue en el actor
+# - el préstamo llega al actor con recv_ts (de ahí sale su vencimiento en el GA)
+# - con el límite en vuelo lleno (GC_MAX_EN_VUELO=prestamo=1) el siguiente
+#   préstamo recibe busy al instante, y una consulta la resuelve el GA
+#
+# Uso:
+#   python -m pytest -q gc/test_gc.py
+#   python gc/test_gc.py
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+import zmq
+
+GC_PY = str(Path(__file__).resolve().parent / "gc.py")
+DEMORA_S = 0.3
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _servidor_lento(ctx, direccion, recibidas, respuesta, fin):
+    # REP falso: guarda cada solicitud y responde después de DEMORA_S
+    s = ctx.socket(zmq.REP)
+    s.setsockopt(zmq.LINGER, 0)
+    s.bind(direccion)
+    while not fin.is_set():
+        if not s.poll(100):
+            continue
+        recibidas.append(json.loads(s.recv()))
+        time.sleep(DEMORA_S)
+        s.send_string(json.dumps(respuesta))
+    s.close()
+
+def _pedir(ps, carga):
+    ps.send_multipart([b"", json.dumps(carga).encode("utf-8")])
+
+def _respuesta(ps, timeout_ms=3000):
+    assert ps.poll(timeout_ms), "sin respuesta del GC"
+    return json.loads(ps.recv_multipart()[-1]), time.monotonic()
+
+def test_gc_por_eventos():
+    d = tempfile.mkdtemp(prefix="test_gc_")
+    os.makedirs(os.path.join(d, "gc"))
+    rep, pub, actor, ga = (f"tcp://127.0.0.1:{_puerto_libre()}" for _ in range(4))
+    ctx = zmq.Context()
+    fin = threading.Event()
+    al_actor, al_ga = [], []
+    servidores = [
+        threading.Thread(target=_servidor_lento, args=(ctx, actor, al_actor,
+                         {"estado": "ok", "mensaje": "prestamo aplicado"}, fin)),
+        threading.Thread(target=_servidor_lento, args=(ctx, ga, al_ga,
+                         {"estado": "ok", "total": 0, "libros": [], "no_encontrados": ["B9"]}, fin)),
+    ]
+    for t in servidores:
+        t.start()
+    env = dict(os.environ, GC_REP_BIND=rep, GC_PUB_BIND=pub, GC_ACTOR_PRESTAMO=actor,
+               GC_GA_PRIMARY=ga, GC_GA_SECONDARY=ga, GC_MAX_EN_VUELO="prestamo=1",
+               GC_EDAD_MAX_MS="2000", GC_RETRY_AFTER_MS="150")
+    log = open(os.path.join(d, "gc.out"), "wb")
+    gc = subprocess.Popen([sys.executable, GC_PY], cwd=d, env=env, stdout=log, stderr=subprocess.STDOUT)
+    sub = ctx.socket(zmq.SUB)
+    sub.setsockopt(zmq.LINGER, 0)
+    sub.setsockopt_string(zmq.SUBSCRIBE, "Devolucion")
+    sub.connect(pub)
+    clientes = [ctx.socket(zmq.DEALER) for _ in range(4)]
+    try:
+        for ps in clientes:
+            ps.setsockopt(zmq.LINGER, 0)
+            ps.connect(rep)
+        prestamo, devolucion, otro, consulta = clientes
+        # listo cuando responde (y el SUB ya está suscripto)
+        for _ in range(50):
+            _pedir(devolucion, {"operation": "devolucion", "book_code": "B0", "user_id": 1})
+            if devolucion.poll(200):
+                devolucion.recv_multipart()
+                break
+        else:
+            raise AssertionError("el GC no arrancó")
+        while sub.poll(200):
+            sub.recv()
+
+        inicio = time.monotonic()
+        _pedir(prestamo, {"operation": "prestamo", "book_code": "B1", "user_id": 7})
+        time.sleep(0.05)
+        _pedir(devolucion, {"operation": "devolucion", "book_code": "B2", "user_id": 7})
+        _pedir(otro, {"operation": "prestamo", "book_code": "B3", "user_id": 8})
+
+        r_dev, t_dev = _respuesta(devolucion)
+        assert r_dev["estado"] == "ok"
+        assert t_dev - inicio < DEMORA_S, "la devolución esperó al préstamo"
+        assert sub.poll(2000)
+        topico, carga = sub.recv_string().split(" ", 1)
+        assert topico == "Devolucion" and json.loads(carga)["book_code"] == "B2"
+
+        r_busy, t_busy = _respuesta(otro)
+        assert r_busy["estado"] == "busy" and r_busy["retry_after_ms"] == 150
+        assert r_busy["info"]["motivo"] == "en_vuelo" and r_busy["info"]["limite"] == 1
+        assert t_busy - inicio < DEMORA_S
+
+        r_pre, t_pre = _respuesta(prestamo)
+        assert r_pre["estado"] == "ok" and t_pre - inicio >= DEMORA_S
+        assert [(m["book_code"], bool(m.get("recv_ts"))) for m in al_actor] == [("B1", True)]
+
+        # con el préstamo respondido hay lugar otra vez; la consulta va al GA
+        _pedir(consulta, {"operation": "consulta", "book_code": "B9"})
+        r_con, _ = _respuesta(consulta)
+        assert r_con["estado"] == "ok" and len(al_ga) == 1
+    finally:
+        for ps in clientes:
+            ps.close()
+        sub.close()
+        gc.terminate()
+        try:
+            gc.wait(10)
+        except subprocess.TimeoutExpired:
+            gc.kill()
+        fin.set()
+        for t in servidores:
+            t.join()
+        ctx.term()
+        log.close()
+        shutil.rmtree(d)
+
+if __name__ == "__main__":
+    for nombre, fn in list(globals().items()):
+        if nombre.startswith("test_") and callable(fn):
+            fn()
+            print(f"PASS {nombre}")
@@ -65,6 +65,9 @@ def send_request_with_timeout(ctx, payload, timeout_ms):
                 estado = resp_obj.get("estado", resp_obj.get("status", "UNKNOWN"))
                 if estado.upper() in ("OK", "OKAY"):
                     estado = "OK"
+                elif estado.upper() == "BUSY":
+                    # control de admisión del GC: rechazo rápido en vez de timeout
+                    estado = "BUSY"
             except:
                 estado = "OK" if respuesta else "ERROR"
         except zmq.ZMQError:
@@ -109,6 +112,7 @@ def test_with_timeout(ctx, timeout_ms, num_requests=NUM_REQUESTS):
     ok = sum(1 for r in resultados if r["estado"] == "OK")
     timeouts = sum(1 for r in resultados if r["estado"] == "TIMEOUT")
     errores = sum(1 for r in resultados if r["estado"] == "ERROR")
+    busy = sum(1 for r in resultados if r["estado"] == "BUSY")
 
     latencias = [r["latencia_s"] for r in resultados if r["estado"] == "OK"]
 
@@ -128,6 +132,7 @@ def test_with_timeout(ctx, timeout_ms, num_requests=NUM_REQUESTS):
         "ok": ok,
         "timeouts": timeouts,
         "errores": errores,
+        "busy": busy,
         "latencia_min_s": lat_min,
         "latencia_mean_s": lat_mean,
         "latencia_p50_s": lat_p50,
@@ -171,6 +176,7 @@ def test_latency_impact():
         print(f"    OK       : {metricas['ok']} ({metricas['ok']/metricas['total']*100:.1f}%)")
         print(f"    TIMEOUT  : {metricas['timeouts']} ({metricas['timeouts']/metricas['total']*100:.1f}%)")
         print(f"    ERROR    : {metricas['errores']}")
+        print(f"    BUSY     : {metricas['busy']}")
 
         if metricas['ok'] > 0:
             print(f"\n  Latencias (solo OK):")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# archivo: scripts/bench_consulta_usuario.py
+#
+# Universidad: Pontificia Universidad Javeriana
+# Materia: INTRODUCCIÓN A SISTEMAS DISTRIBUIDOS
+# Profesor: Rafael Páez Méndez
+# Integrantes: Thomas Arévalo, Santiago Mesa, Diego Castrillón
+#
+# Benchmark de consulta_usuario (préstamos de un usuario) en el GA:
+#   - recorrido completo del catálogo (dict por libro, como antes)
+#   - índice user_id -> {book_code} del Catalogo (ga/catalogo.py)
+# Ambos sobre el mismo catálogo generado con scripts/generate_db.py.
+#
+# Uso:
+#   python scripts/bench_consulta_usuario.py --num-libros 200000 --consultas 200
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ga"))
+
+from generate_db import generar_db       # noqa: E402
+from catalogo import Catalogo             # noqa: E402
+from db_ops import consulta_usuario       # noqa: E402
+
+def iso():
+    """Retorna timestamp ISO-8601."""
+    return datetime.utcnow().isoformat() + "Z"
+
+def print_banner():
+    """Imprime banner de inicio."""
+    print("\n" + "=" * 72)
+    print(" BENCHMARK: CONSULTA DE PRÉSTAMOS POR USUARIO ".center(72, " "))
+    print("=" * 72 + "\n")
+
+def medir(db, usuarios):
+    """Devuelve (segundos por consulta, respuestas)."""
+    inicio = time.perf_counter()
+    respuestas = [consulta_usuario(db, {"user_id": u}) for u in usuarios]
+    return (time.perf_counter() - inicio) / len(usuarios), respuestas
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de consulta_usuario")
+    parser.add_argument("--num-libros", type=int, default=200000,
+                        help="Número de libros (default: 200000)")
+    parser.add_argument("--prestados", type=int, default=40000,
+                        help="Libros con préstamo (default: 40000)")
+    parser.add_argument("--consultas", type=int, default=200,
+                        help="Consultas por modelo (default: 200)")
+    parser.add_argument("--seed", type=int, default=42,
+                        help="Semilla (default: 42)")
+    args = parser.parse_args()
+
+    print_banner()
+    print(f"[{iso()}] Generando {args.num_libros} libros ({args.prestados} con préstamo)...")
+    catalogo = generar_db(args.num_libros, args.prestados // 4, args.prestados - args.prestados // 4,
+                          args.seed, db=Catalogo())
+    plano = dict(catalogo.items())
+
+    random.seed(args.seed)
+    usuarios = [str(random.randint(1, 100)) for _ in range(args.consultas)]
+    print(f"[{iso()}] {args.consultas} consultas de usuarios 1-100...\n")
+
+    t_scan, r_scan = medir(plano, usuarios)
+    t_idx, r_idx = medir(catalogo, usuarios)
+    iguales = r_scan == r_idx
+    promedio = sum(r["total"] for r in r_idx) / len(r_idx)
+
+    print("-" * 72)
+    print(f"  Préstamos por usuario (prom.) : {promedio:.1f}")
+    print(f"  Recorrido del catálogo        : {t_scan * 1000:10.3f} ms/consulta")
+    print(f"  Índice por usuario            : {t_idx * 1000:10.3f} ms/consulta")
+    if t_idx:
+        print(f"  Aceleración                   : x{t_scan / t_idx:.0f}")
+    print(f"  Mismas respuestas             : {'sí' if iguales else 'NO'}")
+    print("-" * 72 + "\n")
+    return 0 if iguales else 1
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Interrumpido por el usuario\n")
+        sys.exit(2)
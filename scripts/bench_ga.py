@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# archivo: scripts/bench_ga.py
+#
+# Universidad: Pontificia Universidad Javeriana
+# Materia: INTRODUCCIÓN A SISTEMAS DISTRIBUIDOS
+# Profesor: Rafael Páez Méndez
+# Integrantes: Thomas Arévalo, Santiago Mesa, Diego Castrillón
+#
+# Benchmark de throughput del GA: N clientes REQ concurrentes (como los
+# actores) envían prestamo/devolucion alternados sobre libros distintos a un
+# GA ya levantado y se mide ops/s y latencia por operación. Con --ruteo cada
+# cliente va al GA de la partición de su libro (gc/ga_shards.json). Con
+# --lote K cada mensaje lleva K operaciones en un lote ({"operacion":"lote"});
+# las latencias son por mensaje y el throughput, por operación.
+#
+# Uso:
+#   python ga/ga.py                      # en otra terminal
+#   python scripts/bench_ga.py --addr tcp://localhost:6000 --clientes 32 --ops 200
+#   python scripts/bench_ga.py --ruteo gc/ga_shards.json --clientes 32 --ops 200
+#   python scripts/bench_ga.py --clientes 32 --ops 200 --lote 20
+
+import sys
+import json
+import time
+import threading
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+import zmq
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ga"))
+
+from ruteo import TablaRuteo   # noqa: E402
+
+def iso():
+    """Retorna timestamp ISO-8601."""
+    return datetime.utcnow().isoformat() + "Z"
+
+def print_banner():
+    """Imprime banner de inicio."""
+    print("\n" + "=" * 72)
+    print(" BENCHMARK: THROUGHPUT DEL GA ".center(72, " "))
+    print("=" * 72 + "\n")
+
+def cliente(ctx, addr, n, libro, usuario, timeout_ms, latencias, errores, lote=1):
+    """Un actor: n operaciones secuenciales (REQ) sobre su propio libro, de a `lote`."""
+    sock = ctx.socket(zmq.REQ)
+    sock.setsockopt(zmq.RCVTIMEO, timeout_ms)
+    sock.setsockopt(zmq.LINGER, 0)
+    sock.connect(addr)
+    propias = []
+    try:
+        for i in range(0, n, lote):
+            ops = [{"operacion": "devolucion" if j % 2 else "prestamo",
+                    "book_code": libro, "user_id": usuario} for j in range(i, min(i + lote, n))]
+            mensaje = ops[0] if lote == 1 else {"operacion": "lote", "operaciones": ops}
+            inicio = time.perf_counter()
+            sock.send_string(json.dumps(mensaje))
+            resp = json.loads(sock.recv_string())
+            propias.append(time.perf_counter() - inicio)
+            for r in resp.get("resultados", [resp]) if resp.get("estado") == "ok" else [resp]:
+                if r.get("estado") != "ok":
+                    errores.append(r)
+    except zmq.Again:
+        errores.append({"estado": "timeout", "libro": libro})
+    finally:
+        sock.close()
+        latencias.extend(propias)
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(int(len(valores) * p), len(valores) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de throughput del GA")
+    parser.add_argument("--addr", default="tcp://localhost:6000", help="Dirección del GA")
+    parser.add_argument("--clientes", type=int, default=32, help="Clientes concurrentes (default: 32)")
+    parser.add_argument("--ops", type=int, default=200, help="Operaciones por cliente (default: 200)")
+    parser.add_argument("--prefijo", default="BOOK-", help="Prefijo de book_code (default: BOOK-)")
+    parser.add_argument("--timeout-ms", type=int, default=10000, help="Timeout por respuesta")
+    parser.add_argument("--ruteo", default=None, help="Tabla de particiones (gc/ga_shards.json)")
+    parser.add_argument("--lote", type=int, default=1, help="Operaciones por mensaje (default: 1)")
+    args = parser.parse_args()
+
+    print_banner()
+    ruteo = TablaRuteo(args.addr, args.addr, path=args.ruteo) if args.ruteo else None
+    destino = f"{ruteo.n} particiones ({args.ruteo})" if ruteo else args.addr
+    lote = max(args.lote, 1)
+    print(f"[{iso()}] {args.clientes} clientes x {args.ops} ops contra {destino}"
+          + (f" (lotes de {lote})" if lote > 1 else ""))
+    ctx = zmq.Context()
+    latencias, errores = [], []
+    libros = [f"{args.prefijo}{i + 1:03d}" for i in range(args.clientes)]
+    hilos = [threading.Thread(target=cliente, args=(ctx, ruteo.direccion(libro) if ruteo else args.addr,
+                                                      args.ops, libro, f"bench-{i}", args.timeout_ms,
+                                                      latencias, errores, lote))
+             for i, libro in enumerate(libros)]
+    inicio = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    total = time.perf_counter() - inicio
+    ctx.term()
+
+    print("-" * 72)
+    operaciones = min(len(latencias) * lote, args.clientes * args.ops)
+    print(f"  Operaciones      : {operaciones} en {total:.2f} s ({len(latencias)} mensajes)")
+    print(f"  Throughput       : {operaciones / total:10.0f} ops/s")
+    print(f"  Latencia p50     : {percentil(latencias, 0.50) * 1000:10.2f} ms")
+    print(f"  Latencia p99     : {percentil(latencias, 0.99) * 1000:10.2f} ms")
+    print(f"  Errores          : {len(errores)}")
+    print("-" * 72 + "\n")
+    return 0 if not errores else 1
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Interrumpido por el usuario\n")
+        sys.exit(2)
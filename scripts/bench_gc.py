@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# archivo: scripts/bench_gc.py
+#
+# Universidad: Pontificia Universidad Javeriana
+# Materia: INTRODUCCIÓN A SISTEMAS DISTRIBUIDOS
+# Profesor: Rafael Páez Méndez
+# Integrantes: Thomas Arévalo, Santiago Mesa, Diego Castrillón
+#
+# Benchmark del GC en sus tres modos bajo la misma carga:
+#   serial     gc/gc.py            (un bucle ROUTER/DEALER)
+#   hilos      gc/gc_multihilo.py  (GC_NUM_WORKERS hilos detrás del broker con admisión)
+#   procesos   gc/gc_multiproceso.py (GC_PROCESOS procesos detrás del broker con admisión)
+# Con --sin-admision el GC arranca sin límites ni edad máxima en cola y los
+# modos hilos/procesos usan zmq.proxy: la diferencia es el costo del broker.
+#
+# Para cada modo levanta el GC en puertos propios, un actor de préstamo de
+# prueba (ROUTER que responde al instante, para medir al GC y no al GA) y
+# --procesos-cliente procesos con --clientes PS (REQ) en total, que envían
+# --ops solicitudes cada uno: prestamo/devolucion/renovacion alternados.
+# Los clientes van en procesos para que el generador de carga no quede
+# limitado por su propio GIL.
+#
+# Uso:
+#   python scripts/bench_gc.py
+#   python scripts/bench_gc.py --modos hilos,procesos --clientes 64 --ops 500 --workers 4
+#   python scripts/bench_gc.py --modos hilos,procesos --sin-admision
+
+import os
+import sys
+import json
+import time
+import signal
+import threading
+import argparse
+import subprocess
+import multiprocessing as mp
+from pathlib import Path
+from datetime import datetime
+
+import zmq
+
+RAIZ = Path(__file__).resolve().parent.parent
+MODOS = {
+    "serial": "gc/gc.py",
+    "hilos": "gc/gc_multihilo.py",
+    "procesos": "gc/gc_multiproceso.py",
+}
+OPERACIONES = ("prestamo", "devolucion", "renovacion")
+
+def iso():
+    """Retorna timestamp ISO-8601."""
+    return datetime.utcnow().isoformat() + "Z"
+
+def print_banner():
+    """Imprime banner de inicio."""
+    print("\n" + "=" * 72)
+    print(" BENCHMARK: GC SERIAL / MULTIHILO / MULTIPROCESO ".center(72, " "))
+    print("=" * 72 + "\n")
+
+def actor_prueba(addr):
+    """Actor de préstamo de prueba: responde cada solicitud al instante (conserva el sobre)."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ctx = zmq.Context()
+    sock = ctx.socket(zmq.ROUTER)
+    sock.bind(addr)
+    respuesta = json.dumps({"estado": "ok", "mensaje": "prestamo aplicado"}).encode()
+    while True:
+        tramas = sock.recv_multipart()
+        sock.send_multipart(tramas[:-1] + [respuesta])
+
+def cliente(ctx, addr, n, k, timeout_ms, latencias, errores):
+    """Un PS: n solicitudes secuenciales (REQ)."""
+    sock = ctx.socket(zmq.REQ)
+    sock.setsockopt(zmq.RCVTIMEO, timeout_ms)
+    sock.setsockopt(zmq.LINGER, 0)
+    sock.connect(addr)
+    propias = []
+    try:
+        for i in range(n):
+            mensaje = {"operation": OPERACIONES[(i + k) % 3], "book_code": f"BOOK-{k % 1000 + 1:03d}",
+                       "user_id": k, "request_id": f"bench-{k}-{i}"}
+            inicio = time.perf_counter()
+            sock.send_string(json.dumps(mensaje))
+            resp = json.loads(sock.recv_string())
+            propias.append(time.perf_counter() - inicio)
+            if resp.get("estado") != "ok":
+                errores.append(resp.get("mensaje"))
+    except zmq.Again:
+        errores.append("timeout")
+    finally:
+        sock.close()
+        latencias.extend(propias)
+
+def proceso_clientes(addr, ids, n, timeout_ms, cola):
+    """Un proceso de carga con un hilo por PS; devuelve latencias y errores por la cola."""
+    ctx = zmq.Context()
+    latencias, errores = [], []
+    hilos = [threading.Thread(target=cliente, args=(ctx, addr, n, k, timeout_ms, latencias, errores))
+             for k in ids]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    ctx.term()
+    cola.put((latencias, errores))
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(int(len(valores) * p), len(valores) - 1)]
+
+def medir(modo, args, puerto):
+    """Levanta el GC del modo, aplica la carga y devuelve (ops, segundos, latencias, errores)."""
+    rep, pub, actor_addr = (f"tcp://127.0.0.1:{puerto}", f"tcp://127.0.0.1:{puerto + 1}",
+                            f"tcp://127.0.0.1:{puerto + 2}")
+    env = dict(os.environ, GC_REP_BIND=rep, GC_PUB_BIND=pub, GC_ACTOR_PRESTAMO=actor_addr,
+               GC_NUM_WORKERS=str(args.workers), GC_PROCESOS=str(args.workers))
+    if args.sin_admision:
+        env.update(GC_MAX_EN_VUELO="", GC_EDAD_MAX_MS="0")
+    actor = mp.Process(target=actor_prueba, args=(actor_addr,), daemon=True)
+    actor.start()
+    gc = subprocess.Popen([sys.executable, str(RAIZ / MODOS[modo])], cwd=str(RAIZ), env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        time.sleep(args.arranque)
+        cola = mp.Queue()
+        grupos = [list(range(i, args.clientes, args.procesos_cliente)) for i in range(args.procesos_cliente)]
+        procesos = [mp.Process(target=proceso_clientes, args=(rep, ids, args.ops, args.timeout_ms, cola))
+                    for ids in grupos if ids]
+        inicio = time.perf_counter()
+        for p in procesos:
+            p.start()
+        latencias, errores = [], []
+        for _ in procesos:
+            lat, err = cola.get()
+            latencias.extend(lat)
+            errores.extend(err)
+        total = time.perf_counter() - inicio
+        for p in procesos:
+            p.join()
+        return len(latencias), total, latencias, errores
+    finally:
+        gc.send_signal(signal.SIGTERM)
+        try:
+            gc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            gc.kill()
+            gc.wait()
+        actor.terminate()
+        actor.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del GC: serial, multihilo y multiproceso")
+    parser.add_argument("--modos", default="serial,hilos,procesos", help="Modos a medir (default: los tres)")
+    parser.add_argument("--clientes", type=int, default=32, help="PS concurrentes (default: 32)")
+    parser.add_argument("--ops", type=int, default=300, help="Solicitudes por PS (default: 300)")
+    parser.add_argument("--procesos-cliente", type=int, default=4, help="Procesos generadores de carga (default: 4)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Hilos (multihilo) o procesos (multiproceso) del GC (default: núcleos)")
+    parser.add_argument("--puerto", type=int, default=25555, help="Primer puerto libre (3 por modo)")
+    parser.add_argument("--timeout-ms", type=int, default=10000, help="Timeout por respuesta")
+    parser.add_argument("--arranque", type=float, default=1.5, help="Espera al arranque del GC (s)")
+    parser.add_argument("--sin-admision", action="store_true",
+                        help="GC sin control de admisión (hilos/procesos con zmq.proxy)")
+    args = parser.parse_args()
+
+    print_banner()
+    print(f"[{iso()}] {args.clientes} PS x {args.ops} solicitudes, {args.workers} workers, "
+          f"{os.cpu_count()} núcleos, {'sin' if args.sin_admision else 'con'} admisión\n")
+    resultados = []
+    for i, modo in enumerate(m.strip() for m in args.modos.split(",")):
+        if modo not in MODOS:
+            print(f"  Modo desconocido: {modo} (válidos: {', '.join(MODOS)})", file=sys.stderr)
+            return 2
+        ops, total, latencias, errores = medir(modo, args, args.puerto + 3 * i)
+        resultados.append((modo, ops, total, latencias, errores))
+        print(f"[{iso()}] {modo}: {ops} solicitudes en {total:.2f} s")
+
+    print("\n" + "-" * 72)
+    print(f"  {'Modo':10} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errores':>10}")
+    for modo, ops, total, latencias, errores in resultados:
+        print(f"  {modo:10} {ops / total:10.0f} {percentil(latencias, 0.50) * 1000:10.2f} "
+              f"{percentil(latencias, 0.99) * 1000:10.2f} {len(errores):10}")
+    print("-" * 72 + "\n")
+    return 0 if not any(r[4] for r in resultados) else 1
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Interrumpido por el usuario\n")
+        sys.exit(2)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# archivo: scripts/convert_wal.py
+#
+# Universidad: Pontificia Universidad Javeriana
+# Materia: INTRODUCCIÓN A SISTEMAS DISTRIBUIDOS
+# Profesor: Rafael Páez Méndez
+# Integrantes: Thomas Arévalo, Santiago Mesa, Diego Castrillón
+#
+# Convierte el WAL del GA entre formato JSON y binario (ver ga/wal_format.py).
+# Convierte el segmento activo y todos los segmentos rotados, y muestra el
+# tamaño y el tiempo de lectura de ambos formatos.
+#
+# Qué esperar del binario: ocupa varias veces menos y el replay acotado (las
+# entradas ya cubiertas por el checkpoint se saltan sin decodificarlas) es
+# mucho más rápido; la decodificación completa cuesta más o menos lo mismo
+# que JSON (json.loads está en C), así que "Lectura completa" sale ~x1.
+#
+# Uso:
+#   python scripts/convert_wal.py gc/ga_wal_primary.log --to binary
+#   python scripts/convert_wal.py gc/ga_wal_primary.log --to json --output /tmp/wal_json
+#
+# Importante: detener el GA antes de convertir su WAL en sitio.
+
+import os
+import sys
+import time
+import shutil
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ga"))
+
+from wal import archived_segments, segment_path   # noqa: E402
+from wal_format import convert_file, iter_file, detect   # noqa: E402
+
+def iso():
+    """Retorna timestamp ISO-8601."""
+    return datetime.utcnow().isoformat() + "Z"
+
+def print_banner():
+    """Imprime banner de inicio."""
+    print("\n" + "=" * 72)
+    print(" CONVERSOR DE WAL (JSON <-> BINARIO) ".center(72, " "))
+    print("=" * 72 + "\n")
+
+def archivos_wal(base):
+    """[(lsn inicial | None para el activo, path)] rotados + activo, en orden de LSN."""
+    archivos = archived_segments(base)
+    if os.path.exists(base):
+        archivos.append((None, base))
+    return archivos
+
+def medir_lectura(paths, after_lsn=0):
+    """Tiempo de lectura (entradas con lsn > after_lsn) y número de entradas."""
+    inicio = time.perf_counter()
+    n = ultimo = 0
+    for p in paths:
+        for lsn, _ in iter_file(p, after_lsn=after_lsn):
+            n += 1
+            ultimo = lsn or ultimo
+    return n, time.perf_counter() - inicio, ultimo
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversor de formato del WAL del GA")
+    parser.add_argument("wal", help="Ruta base del WAL (p.ej. gc/ga_wal_primary.log)")
+    parser.add_argument("--to", choices=["json", "binary"], required=True,
+                        help="Formato destino")
+    parser.add_argument("--output",
+                        help="Ruta base de salida (default: convierte en sitio)")
+    args = parser.parse_args()
+
+    print_banner()
+
+    origen = archivos_wal(args.wal)
+    if not origen:
+        print(f"⚠️  No hay WAL en {args.wal}")
+        return 1
+
+    destino_base = args.output or args.wal
+    en_sitio = destino_base == args.wal
+    if not en_sitio:
+        os.makedirs(os.path.dirname(destino_base) or ".", exist_ok=True)
+
+    paths_orig = [p for _, p in origen]
+    n_orig, t_orig, ultimo = medir_lectura(paths_orig)
+    _, s_orig, _ = medir_lectura(paths_orig, after_lsn=ultimo)
+    bytes_orig = sum(os.path.getsize(p) for p in paths_orig)
+
+    print(f"[{iso()}] Convirtiendo {len(origen)} archivo(s) a {args.to}...")
+    destino = []
+    for primer_lsn, p in origen:
+        # mismo nombre de segmento (lsn inicial) bajo la nueva base
+        out = destino_base if primer_lsn is None else segment_path(destino_base, primer_lsn)
+        if detect(p) == args.to and not en_sitio:
+            shutil.copy2(p, out)
+        elif detect(p) is None:
+            open(out, "wb").close()
+        elif detect(p) != args.to:
+            n = convert_file(p, out, args.to)
+            print(f"  ✓ {p} -> {out} ({n} entradas)")
+        destino.append(out)
+
+    n_dest, t_dest, _ = medir_lectura(destino)
+    _, s_dest, _ = medir_lectura(destino, after_lsn=ultimo)
+    bytes_dest = sum(os.path.getsize(p) for p in destino)
+
+    print("\n" + "-" * 72)
+    print(f"  Entradas            : {n_orig} -> {n_dest}")
+    ratio_bytes = f" (x{bytes_orig / bytes_dest:.2f})" if bytes_dest else ""
+    ratio_t = f" (x{t_orig / t_dest:.2f})" if t_dest else ""
+    print(f"  Tamaño              : {bytes_orig} B -> {bytes_dest} B{ratio_bytes}")
+    ratio_s = f" (x{s_orig / s_dest:.2f})" if s_dest else ""
+    print(f"  Lectura completa    : {t_orig * 1000:.1f} ms -> {t_dest * 1000:.1f} ms{ratio_t}")
+    print(f"  Salto hasta lsn {ultimo:<4}: {s_orig * 1000:.1f} ms -> {s_dest * 1000:.1f} ms{ratio_s}"
+          "  (replay con todo cubierto por el checkpoint)")
+    print("-" * 72 + "\n")
+
+    return 0 if n_orig == n_dest else 1
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Interrumpido por el usuario\n")
+        sys.exit(2)
+    except ValueError as e:
+        print(f"\n❌ {e}\n")
+        sys.exit(1)
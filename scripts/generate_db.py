@@ -18,6 +18,10 @@ import argparse
 from pathlib import Path
 from datetime import datetime, timedelta
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ga"))
+
+from catalogo import Catalogo   # noqa: E402
+
 def iso():
     """Retorna timestamp ISO-8601."""
     return datetime.utcnow().isoformat() + "Z"
@@ -56,7 +60,7 @@ def generar_titulo(book_id):
 
     return titulo
 
-def generar_db(num_libros, prestados_sede1, prestados_sede2, seed=None):
+def generar_db(num_libros, prestados_sede1, prestados_sede2, seed=None, db=None):
     """
     Genera base de datos con libros.
 
@@ -65,6 +69,8 @@ def generar_db(num_libros, prestados_sede1, prestados_sede2, seed=None):
     - prestados_sede1: Número de libros prestados en Sede 1
     - prestados_sede2: Número de libros prestados en Sede 2
     - seed: Semilla para reproducibilidad
+    - db: Catálogo destino (default: Catalogo compacto de ga/catalogo.py;
+      un dict {} genera el modelo anterior, ver scripts/memory_report.py)
 
     Estructura de cada libro:
     {
@@ -82,7 +88,8 @@ def generar_db(num_libros, prestados_sede1, prestados_sede2, seed=None):
     if seed is not None:
         random.seed(seed)
 
-    db = {}
+    if db is None:
+        db = Catalogo()
 
     # Generar todos los libros
     for i in range(1, num_libros + 1):
@@ -117,15 +124,17 @@ def generar_db(num_libros, prestados_sede1, prestados_sede2, seed=None):
         # Número de renovaciones (0-2)
         renovaciones = random.randint(0, 2)
 
-        # Reducir copias disponibles
-        if db[book_code]["available"] > 0:
-            db[book_code]["available"] -= 1
+        # Reducir copias disponibles (db[code] es una copia en el modelo compacto)
+        libro = db[book_code]
+        if libro["available"] > 0:
+            libro["available"] -= 1
 
         # Registrar préstamo
-        db[book_code]["loans"][str(user_id)] = {
+        libro["loans"][str(user_id)] = {
             "due": due_date.isoformat() + "Z",
             "renovations": renovaciones
         }
+        db[book_code] = libro
 
     # Asignar préstamos a Sede 2
     for i in range(prestados_sede1, min(prestados_sede1 + prestados_sede2, num_libros)):
@@ -140,13 +149,15 @@ def generar_db(num_libros, prestados_sede1, prestados_sede2, seed=None):
 
         renovaciones = random.randint(0, 2)
 
-        if db[book_code]["available"] > 0:
-            db[book_code]["available"] -= 1
+        libro = db[book_code]
+        if libro["available"] > 0:
+            libro["available"] -= 1
 
-        db[book_code]["loans"][str(user_id)] = {
+        libro["loans"][str(user_id)] = {
             "due": due_date.isoformat() + "Z",
             "renovations": renovaciones
         }
+        db[book_code] = libro
 
     return db
 
@@ -155,8 +166,9 @@ def guardar_db(db, output_path):
     # Crear directorio si no existe
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
+    # en disco dict-of-dicts (lo que leen el GA y las herramientas)
     with open(output_path, "wb") as f:
-        pickle.dump(db, f)
+        pickle.dump(dict(db.items()), f)
 
     print(f"✓ DB guardada: {output_path}")
 
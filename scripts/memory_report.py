@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# archivo: scripts/memory_report.py
+#
+# Universidad: Pontificia Universidad Javeriana
+# Materia: INTRODUCCIÓN A SISTEMAS DISTRIBUIDOS
+# Profesor: Rafael Páez Méndez
+# Integrantes: Thomas Arévalo, Santiago Mesa, Diego Castrillón
+#
+# Reporte de memoria del catálogo del GA: bytes por libro con el modelo
+# anterior (dict por libro + dict por préstamo) y con el modelo compacto
+# (ga/catalogo.py). Ambos se generan con scripts/generate_db.py y se miden
+# con tracemalloc.
+#
+# Uso:
+#   python scripts/memory_report.py --num-libros 1000000 --prestados 200000
+
+import gc
+import sys
+import time
+import argparse
+import tracemalloc
+from pathlib import Path
+from datetime import datetime
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ga"))
+
+from generate_db import generar_db   # noqa: E402
+from catalogo import Catalogo         # noqa: E402
+
+def iso():
+    """Retorna timestamp ISO-8601."""
+    return datetime.utcnow().isoformat() + "Z"
+
+def print_banner():
+    """Imprime banner de inicio."""
+    print("\n" + "=" * 72)
+    print(" REPORTE DE MEMORIA DEL CATÁLOGO ".center(72, " "))
+    print("=" * 72 + "\n")
+
+def medir(num_libros, prestados, seed, db):
+    """Genera el catálogo sobre db y devuelve (bytes retenidos, segundos, catálogo)."""
+    gc.collect()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    db = generar_db(num_libros, prestados // 4, prestados - prestados // 4, seed, db=db)
+    segundos = time.perf_counter() - inicio
+    gc.collect()
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return actual, segundos, db
+
+def main():
+    parser = argparse.ArgumentParser(description="Reporte de memoria del catálogo")
+    parser.add_argument("--num-libros", type=int, default=200000,
+                        help="Número de libros (default: 200000)")
+    parser.add_argument("--prestados", type=int, default=40000,
+                        help="Libros con préstamo (default: 40000)")
+    parser.add_argument("--seed", type=int, default=42,
+                        help="Semilla (default: 42)")
+    args = parser.parse_args()
+
+    print_banner()
+    print(f"[{iso()}] Generando {args.num_libros} libros ({args.prestados} con préstamo)...\n")
+
+    antes, t_antes, db = medir(args.num_libros, args.prestados, args.seed, {})
+    del db
+    despues, t_despues, db = medir(args.num_libros, args.prestados, args.seed, Catalogo())
+    prestamos = db.prestamos
+    del db
+
+    n = args.num_libros
+    print("-" * 72)
+    print(f"  {'Modelo':<28}{'Total':>14}{'Bytes/libro':>14}{'Generación':>14}")
+    print(f"  {'dict por libro (anterior)':<28}{antes / 2**20:>11.1f} MiB{antes / n:>14.0f}{t_antes:>12.2f} s")
+    print(f"  {'Catalogo compacto':<28}{despues / 2**20:>11.1f} MiB{despues / n:>14.0f}{t_despues:>12.2f} s")
+    print("-" * 72)
+    if despues:
+        print(f"  Reducción           : x{antes / despues:.2f}")
+    print(f"  Préstamos           : {prestamos}")
+    print("-" * 72 + "\n")
+    return 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Interrumpido por el usuario\n")
+        sys.exit(2)
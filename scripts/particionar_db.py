@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# archivo: scripts/particionar_db.py
+#
+# Universidad: Pontificia Universidad Javeriana
+# Materia: INTRODUCCIÓN A SISTEMAS DISTRIBUIDOS
+# Profesor: Rafael Páez Méndez
+# Integrantes: Thomas Arévalo, Santiago Mesa, Diego Castrillón
+#
+# Parte el catálogo del GA en N particiones por hash de book_code
+# (ruteo.shard_de: blake2b(code) % N) y escribe la tabla de ruteo:
+#   gc/ga_db_primary_s{k}.pkl, gc/ga_db_secondary_s{k}.pkl  (k = 0..N-1)
+#   gc/ga_shards.json
+# Cada partición k se levanta con GA_SHARDS=N GA_SHARD=k (puertos por
+# defecto + 10*k) y su propio monitor de failover (GA_STATUS_FILE).
+#
+# Uso:
+#   python scripts/particionar_db.py --shards 4
+#   python scripts/particionar_db.py --shards 4 --host-primary 10.43.101.220 --host-secondary 10.43.102.248
+
+import os
+import sys
+import json
+import pickle
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ga"))
+
+from ruteo import shard_de, archivo_estado, SALTO_PUERTOS   # noqa: E402
+
+def iso():
+    """Retorna timestamp ISO-8601."""
+    return datetime.utcnow().isoformat() + "Z"
+
+def print_banner():
+    """Imprime banner de inicio."""
+    print("\n" + "=" * 72)
+    print(" PARTICIONADO DEL CATÁLOGO DEL GA ".center(72, " "))
+    print("=" * 72 + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Particiona el catálogo del GA por hash de book_code")
+    parser.add_argument("--shards", type=int, required=True, help="Número de particiones")
+    parser.add_argument("--db", default="gc/ga_db_primary.pkl", help="Catálogo completo de origen")
+    parser.add_argument("--dir", default="gc", help="Directorio de salida (default: gc)")
+    parser.add_argument("--host-primary", default="localhost", help="Host de los GA primary")
+    parser.add_argument("--host-secondary", default="localhost", help="Host de los GA secondary")
+    args = parser.parse_args()
+    if args.shards < 1:
+        parser.error("--shards debe ser >= 1")
+
+    print_banner()
+    with open(args.db, "rb") as f:
+        db = pickle.load(f)
+    print(f"[{iso()}] {len(db)} libros desde {args.db}")
+
+    partes = [{} for _ in range(args.shards)]
+    for code, rec in db.items():
+        partes[shard_de(code, args.shards)][code] = rec
+
+    os.makedirs(args.dir, exist_ok=True)
+    tabla = []
+    for k, parte in enumerate(partes):
+        for rol in ("primary", "secondary"):
+            path = os.path.join(args.dir, f"ga_db_{rol}_s{k}.pkl")
+            with open(path, "wb") as f:
+                pickle.dump(parte, f)
+        p = SALTO_PUERTOS * k
+        tabla.append({"primary": f"tcp://{args.host_primary}:{6000 + p}",
+                      "secondary": f"tcp://{args.host_secondary}:{6001 + p}",
+                      "estado": archivo_estado(k)})
+        print(f"  partición {k}: {len(parte):>8} libros -> ga_db_{{primary,secondary}}_s{k}.pkl "
+              f"(GA {6000 + p}/{6001 + p}, replicación {7001 + p})")
+
+    path_tabla = os.path.join(args.dir, "ga_shards.json")
+    tmp = path_tabla + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"shards": tabla}, f, indent=2)
+    os.replace(tmp, path_tabla)
+    print(f"\n✓ Tabla de ruteo: {path_tabla}")
+    print("\nLevantar cada partición k (y su monitor) con:")
+    print(f"  GA_SHARDS={args.shards} GA_SHARD=k GA_ROLE=primary python ga/ga.py")
+    print(f"  GA_SHARDS={args.shards} GA_SHARD=k GA_ROLE=secondary python ga/ga.py")
+    print("  GA_PRIMARY_ADDR=... GA_SECONDARY_ADDR=... GA_STATUS_FILE=gc/ga_activo_k.txt python gc/monitor_failover.py")
+    print("  (la partición 0 usa gc/ga_activo.txt)\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -128,9 +128,9 @@ repl_send=$(grep -c 'REPL SEND' "$M1_DIR/logs/ga_primary.log" 2>/dev/null || ech
 repl_recv=$(grep -c 'REPL RECV' "$M2_DIR/logs/ga_secondary.log" 2>/dev/null || echo 0)
 repl_apply=$(grep -c 'REPL APPLY' "$M2_DIR/logs/ga_secondary.log" 2>/dev/null || echo 0)
 
-echo "  M1 REPL SEND  : $repl_send operaciones enviadas"
-echo "  M2 REPL RECV  : $repl_recv operaciones recibidas"
-echo "  M2 REPL APPLY : $repl_apply operaciones aplicadas"
+echo "  M1 REPL SEND  : $repl_send lotes enviados"
+echo "  M2 REPL RECV  : $repl_recv lotes recibidos"
+echo "  M2 REPL APPLY : $repl_apply lotes aplicados"
 
 if [ "$repl_send" -gt 0 ] && [ "$repl_recv" -gt 0 ]; then
     ratio=$((repl_recv * 100 / repl_send))